@@ -257,6 +257,132 @@ async function getRoles() {
   return apiRequest("/auth/roles");
 }
 
+/**
+ * Sigue el progreso de un trabajo de entrenamiento con Server-Sent Events
+ *
+ * Se usa fetch en lugar de EventSource para poder enviar el token JWT.
+ *
+ * @param {string} jobId - Identificador del trabajo
+ * @param {Function} onProgress - Función que recibe cada estado de progreso
+ * @returns {Promise<Object|null>} - Trabajo terminado o null si el stream se cortó antes
+ */
+async function streamTrainingJob(jobId, onProgress) {
+  const token = localStorage.getItem("accessToken");
+
+  const response = await fetch(`${API_BASE_URL}/api/ml/jobs/${jobId}/events`, {
+    headers: {
+      Authorization: `Bearer ${token}`,
+      Accept: "text/event-stream",
+    },
+  });
+
+  if (!response.ok || !response.body) {
+    throw new Error(`Error HTTP: ${response.status}`);
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) {
+      return null;
+    }
+
+    buffer += decoder.decode(value, { stream: true });
+
+    // Cada evento termina con una línea en blanco
+    let separator;
+    while ((separator = buffer.indexOf("\n\n")) !== -1) {
+      const rawEvent = buffer.slice(0, separator);
+      buffer = buffer.slice(separator + 2);
+
+      let eventName = "message";
+      let data = "";
+      for (const line of rawEvent.split("\n")) {
+        if (line.startsWith("event:")) {
+          eventName = line.slice(6).trim();
+        } else if (line.startsWith("data:")) {
+          data += line.slice(5).trim();
+        }
+      }
+
+      // Los comentarios de keepalive no tienen datos
+      if (!data) {
+        continue;
+      }
+
+      const payload = JSON.parse(data);
+      if (eventName === "done") {
+        reader.cancel();
+        return payload;
+      }
+      onProgress(payload);
+    }
+  }
+}
+
+/**
+ * Espera a que termine un trabajo de entrenamiento en segundo plano
+ *
+ * Los endpoints de entrenamiento responden 202 con el identificador del
+ * trabajo; esta función sigue su progreso por SSE (mostrándolo en el
+ * TrainingBlocker si está disponible) y, si el stream falla, consulta su
+ * estado periódicamente.
+ *
+ * @param {Object} submission - Respuesta del endpoint de entrenamiento
+ * @param {number} intervalMs - Intervalo entre consultas en milisegundos
+ * @returns {Promise<Object>} - Resultado del entrenamiento
+ */
+async function waitForTrainingJob(submission, intervalMs = 2000) {
+  // Respuestas sin trabajo asociado se devuelven tal cual
+  if (!submission || !submission.job_id) {
+    return submission;
+  }
+
+  const onProgress = (progress) => {
+    if (window.trainingBlocker && window.trainingBlocker.updateProgress) {
+      window.trainingBlocker.updateProgress(progress);
+    }
+  };
+
+  let job = null;
+  try {
+    job = await streamTrainingJob(submission.job_id, onProgress);
+  } catch (error) {
+    console.warn("No se pudo seguir el progreso por SSE:", error);
+  }
+
+  const finishedStates = ["succeeded", "failed", "cancelled"];
+  while (!job || !finishedStates.includes(job.status)) {
+    await new Promise((resolve) => setTimeout(resolve, intervalMs));
+
+    ({ job } = await apiRequest(`/api/ml/jobs/${submission.job_id}`));
+    onProgress(job.live || job);
+  }
+
+  if (job.status === "failed") {
+    throw new Error(job.error || "Error al entrenar modelo");
+  }
+  if (job.status === "cancelled") {
+    throw new Error("El entrenamiento fue cancelado");
+  }
+  return job.result;
+}
+
+/**
+ * Cancela un trabajo de entrenamiento
+ *
+ * @param {string} jobId - Identificador del trabajo
+ * @returns {Promise<Object>} - Respuesta con el estado del trabajo
+ */
+async function cancelTrainingJob(jobId) {
+  return apiRequest(`/api/ml/jobs/${jobId}`, {
+    method: "DELETE",
+  });
+}
+
 /**
  * Entrena un modelo CNN con datos de prueba (rol Testing)
  *
@@ -264,10 +390,12 @@ async function getRoles() {
  * @returns {Promise<Object>} - Respuesta con el modelo entrenado
  */
 async function trainCnnWithTestData(trainingData) {
-  return apiRequest("/api/ml/cnn/train/test", {
+  const submission = await apiRequest("/api/ml/cnn/train/test", {
     method: "POST",
     body: JSON.stringify(trainingData),
   });
+
+  return waitForTrainingJob(submission);
 }
 
 /**
@@ -279,7 +407,12 @@ async function trainCnnWithTestData(trainingData) {
 async function predictCnnWithTestData(modelName) {
   return apiRequest("/api/ml/cnn/predict/test", {
     method: "POST",
-    body: JSON.stringify({ model_name: modelName }),
+    body: JSON.stringify({
+      model_name: modelName,
+      // Respuesta compacta más la imagen de prueba codificada como PNG
+      fields: ["model_name", "prediction", "model", "image"],
+      image_encoding: "png",
+    }),
   });
 }
 
@@ -306,7 +439,7 @@ async function trainTabularWithTestData(trainingData) {
       );
     }
 
-    return response;
+    return waitForTrainingJob(response);
   } catch (error) {
     console.error("Error en trainTabularWithTestData:", error);
     throw error;
@@ -408,8 +541,8 @@ async function trainCnnWithRealData(formData) {
       throw new Error(errorData.error || "Error al entrenar modelo");
     }
 
-    // Devolver datos de respuesta
-    return await response.json();
+    // Esperar a que termine el entrenamiento en segundo plano
+    return waitForTrainingJob(await response.json());
   } catch (error) {
     console.error("Error en trainCnnWithRealData:", error);
     throw error;
@@ -512,8 +645,8 @@ async function trainTabularWithRealData(formData) {
       throw new Error(errorData.error || "Error al entrenar modelo");
     }
 
-    // Devolver datos de respuesta
-    return await response.json();
+    // Esperar a que termine el entrenamiento en segundo plano
+    return waitForTrainingJob(await response.json());
   } catch (error) {
     console.error("Error en trainTabularWithRealData:", error);
     throw error;
@@ -578,7 +711,16 @@ async function predictTabularWithTestData(modelName) {
           Authorization: `Bearer ${token}`,
           "Content-Type": "application/json",
         },
-        body: JSON.stringify({ model_name: modelName }),
+        body: JSON.stringify({
+          model_name: modelName,
+          fields: [
+            "model_name",
+            "prediction",
+            "features_used",
+            "model",
+            "feature_importance",
+          ],
+        }),
       }
     );
 
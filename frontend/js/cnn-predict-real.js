@@ -197,8 +197,8 @@ function setupPredictionForm() {
         // Realizar predicción
         const response = await predictCnnWithRealData(formData);
 
-        // Mostrar resultados
-        displayPredictionResults(response);
+        // Mostrar resultados con la imagen local (la API no la devuelve)
+        displayPredictionResults(response, URL.createObjectURL(file));
 
         // Quitar estado de carga
         predictBtn.disabled = false;
@@ -257,19 +257,20 @@ async function predictCnnWithRealData(formData) {
  * Muestra los resultados de la predicción
  *
  * @param {Object} results - Resultados de la predicción
+ * @param {string} imageUrl - URL local de la imagen analizada
  */
-function displayPredictionResults(results) {
+function displayPredictionResults(results, imageUrl) {
   const imageContainer = document.getElementById("image-container");
   const predictionDetails = document.getElementById("prediction-details");
   const resultsCard = document.getElementById("prediction-results");
 
   if (imageContainer && predictionDetails && resultsCard) {
     // Mostrar imagen
-    if (results.image) {
+    if (imageUrl) {
       imageContainer.innerHTML = `
                 <h3>Imagen Analizada</h3>
                 <div class="image-preview">
-                    <img src="data:image/jpeg;base64,${results.image}" alt="Imagen analizada" style="max-width: 100%; max-height: 300px;">
+                    <img src="${imageUrl}" alt="Imagen analizada" style="max-width: 100%; max-height: 300px;">
                 </div>
             `;
     }
@@ -279,8 +280,8 @@ function displayPredictionResults(results) {
     const numClasses = prediction.probabilities.length;
 
     // Obtener mapeo de clases y nombres
-    const classMapping = results.metadata?.class_mapping || {};
-    const classNames = results.metadata?.class_names || [];
+    const classMapping = results.model?.class_mapping || {};
+    const classNames = results.model?.class_names || [];
 
     // Usar el nombre de clase proporcionado en la predicción o construirlo
     const predictedClassName =
@@ -172,43 +172,11 @@ function displayPredictionResults(results) {
     const resultsCard = document.getElementById('prediction-results');
     
     if (imageContainer && predictionDetails && resultsCard) {
-        // Mostrar imagen
-        const imageData = results.image;
-        const canvas = document.createElement('canvas');
-        const ctx = canvas.getContext('2d');
-        
-        // Configurar tamaño del canvas
-        const imgHeight = imageData.length;
-        const imgWidth = imageData[0].length;
-        canvas.width = imgWidth;
-        canvas.height = imgHeight;
-        
-        // Crear imagen
-        const imgData = ctx.createImageData(imgWidth, imgHeight);
-        let pixelIndex = 0;
-        
-        for (let y = 0; y < imgHeight; y++) {
-            for (let x = 0; x < imgWidth; x++) {
-                // Convertir valores [0,1] a [0,255]
-                const r = Math.floor(imageData[y][x][0] * 255);
-                const g = Math.floor(imageData[y][x][1] * 255);
-                const b = Math.floor(imageData[y][x][2] * 255);
-                
-                imgData.data[pixelIndex++] = r;
-                imgData.data[pixelIndex++] = g;
-                imgData.data[pixelIndex++] = b;
-                imgData.data[pixelIndex++] = 255; // Alpha
-            }
-        }
-        
-        // Pintar imagen en canvas
-        ctx.putImageData(imgData, 0, 0);
-        
-        // Mostrar canvas
+        // Mostrar imagen (codificada como PNG en base64)
         imageContainer.innerHTML = `
             <h3>Imagen de Prueba</h3>
             <div class="image-preview">
-                ${canvas.outerHTML}
+                <img src="data:image/png;base64,${results.image.data}" alt="Imagen de prueba">
             </div>
             <p class="mt-2">Imagen generada aleatoriamente para pruebas</p>
         `;
@@ -240,8 +208,8 @@ function displayPredictionResults(results) {
             <div class="model-info mt-4">
                 <h4>Información del Modelo</h4>
                 <p><strong>Nombre:</strong> ${results.model_name}</p>
-                <p><strong>Arquitectura:</strong> ${results.metadata.model_params?.architecture || 'Personalizada'}</p>
-                <p><strong>Precisión:</strong> ${(results.metadata.accuracy * 100).toFixed(2)}%</p>
+                <p><strong>Arquitectura:</strong> ${results.model?.architecture || 'Personalizada'}</p>
+                <p><strong>Precisión:</strong> ${(results.model?.accuracy * 100).toFixed(2)}%</p>
             </div>
         `;
         
@@ -276,6 +276,7 @@ function setupPredictionForm() {
         const predictionData = {
           model_name: selectedModel,
           features: featureValues,
+          fields: ["model_name", "prediction", "model", "feature_importance"],
         };
 
         const response = await predictTabularWithRealData(predictionData);
@@ -444,10 +445,10 @@ function displayPredictionResults(results, inputFeatures) {
                   results.model_name || "Sin nombre"
                 }</p>
                 <p><strong>Algoritmo:</strong> ${formatAlgorithmName(
-                  results.metadata?.algorithm || ""
+                  results.model?.algorithm || ""
                 )}</p>
                 <p><strong>Tipo:</strong> ${
-                  results.metadata?.problem_type === "classification"
+                  results.model?.problem_type === "classification"
                     ? "Clasificación"
                     : "Regresión"
                 }</p>
@@ -230,7 +230,7 @@ function displayPredictionResults(results) {
 
     // Mostrar detalles de predicción
     const prediction = results.prediction;
-    const problemType = results.metadata?.problem_type || "classification";
+    const problemType = results.model?.problem_type || "classification";
     const isProbabilistic = prediction.probabilities !== undefined;
 
     let predictionsHtml = `
@@ -239,7 +239,7 @@ function displayPredictionResults(results) {
                 <p>
                     <strong>Modelo:</strong> ${results.model_name}<br>
                     <strong>Algoritmo:</strong> ${formatAlgorithmName(
-                      results.metadata?.algorithm || "Desconocido"
+                      results.model?.algorithm || "Desconocido"
                     )}<br>
                     <strong>Tipo:</strong> ${
                       problemType === "classification"
@@ -318,8 +318,8 @@ function displayPredictionResults(results) {
     }
 
     // Mostrar importancia de características si está disponible
-    if (results.metadata?.feature_importance) {
-      const featureImportance = results.metadata.feature_importance;
+    if (results.feature_importance) {
+      const featureImportance = results.feature_importance;
 
       predictionsHtml += `
                 <h4 class="mt-4">Importancia de Características</h4>
@@ -584,10 +584,10 @@ function displayPredictionResults(results) {
         <h4>Información del Modelo</h4>
         <p><strong>Nombre:</strong> ${results.model_name || "Sin nombre"}</p>
         <p><strong>Algoritmo:</strong> ${formatAlgorithmName(
-          results.metadata?.algorithm || ""
+          results.model?.algorithm || ""
         )}</p>
         <p><strong>Tipo:</strong> ${
-          results.metadata?.problem_type === "classification"
+          results.model?.problem_type === "classification"
             ? "Clasificación"
             : "Regresión"
         }</p>
@@ -595,7 +595,7 @@ function displayPredictionResults(results) {
     `;
 
     // Mostrar importancia de características si está disponible
-    if (results.metadata?.feature_importance) {
+    if (results.feature_importance) {
       predictionHtml += `
         <div class="feature-importance mt-4">
           <h4>Importancia de Características</h4>
@@ -603,7 +603,7 @@ function displayPredictionResults(results) {
       `;
 
       // Ordenar características por importancia
-      const sortedFeatures = Object.entries(results.metadata.feature_importance)
+      const sortedFeatures = Object.entries(results.feature_importance)
         .sort(([, a], [, b]) => b - a)
         .slice(0, 10); // Mostrar solo las 10 más importantes
 
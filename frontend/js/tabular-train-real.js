@@ -688,8 +688,8 @@ async function trainTabularWithRealData(formData) {
       throw new Error(errorData.error || "Error al entrenar modelo");
     }
 
-    // Devolver datos de respuesta
-    return await response.json();
+    // Esperar a que termine el entrenamiento en segundo plano (api.js)
+    return waitForTrainingJob(await response.json());
   } catch (error) {
     console.error("Error en trainTabularWithRealData:", error);
     throw error;
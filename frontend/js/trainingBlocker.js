@@ -11,6 +11,7 @@ class TrainingBlocker {
   constructor() {
     this.isTraining = false;
     this.blockOverlay = null;
+    this.progressElement = null;
     this.originalBeforeUnloadHandler = null;
 
     // Crear overlay de bloqueo al inicializar
@@ -24,6 +25,7 @@ class TrainingBlocker {
     // Si ya existe, no crear otro
     if (document.getElementById("training-block-overlay")) {
       this.blockOverlay = document.getElementById("training-block-overlay");
+      this.progressElement = this.blockOverlay.querySelector(".training-progress");
       return;
     }
 
@@ -42,9 +44,14 @@ class TrainingBlocker {
     message.innerText =
       "Entrenamiento en progreso. Por favor no cierre ni refresque la página.";
 
+    // Progreso publicado por el servidor (fase, época, métricas y tiempo restante)
+    this.progressElement = document.createElement("p");
+    this.progressElement.classList.add("training-progress");
+
     // Añadir elementos al DOM
     messageContainer.appendChild(spinner);
     messageContainer.appendChild(message);
+    messageContainer.appendChild(this.progressElement);
     this.blockOverlay.appendChild(messageContainer);
     document.body.appendChild(this.blockOverlay);
 
@@ -92,6 +99,13 @@ class TrainingBlocker {
         animation: spin 1s linear infinite;
       }
       
+      .training-progress {
+        margin-top: 15px;
+        font-size: 0.9em;
+        color: #555;
+        white-space: pre-line;
+      }
+      
       @keyframes spin {
         0% { transform: rotate(0deg); }
         100% { transform: rotate(360deg); }
@@ -177,13 +191,63 @@ class TrainingBlocker {
       submitButton.classList.remove("loading");
     }
 
-    // Ocultar overlay
+    // Ocultar overlay y limpiar el progreso
     this.blockOverlay.classList.remove("active");
+    if (this.progressElement) {
+      this.progressElement.innerText = "";
+    }
 
     // Restaurar controlador original de beforeunload
     this.restoreBeforeUnloadHandler();
   }
 
+  /**
+   * Muestra el progreso de un trabajo de entrenamiento
+   *
+   * @param {Object} progress - Estado publicado por /api/ml/jobs/{id}/events
+   */
+  updateProgress(progress) {
+    if (!this.progressElement || !progress) {
+      return;
+    }
+
+    const lines = [];
+    if (progress.message) {
+      lines.push(progress.message);
+    }
+    if (progress.epoch && progress.epochs) {
+      let line = `Época ${progress.epoch}/${progress.epochs}`;
+      if (progress.step && progress.steps) {
+        line += ` · lote ${progress.step}/${progress.steps}`;
+      }
+      lines.push(line);
+    }
+
+    const metrics = [];
+    if (typeof progress.loss === "number") {
+      metrics.push(`pérdida ${progress.loss.toFixed(4)}`);
+    }
+    if (typeof progress.accuracy === "number") {
+      metrics.push(`precisión ${(progress.accuracy * 100).toFixed(1)}%`);
+    }
+    if (typeof progress.samples_per_sec === "number") {
+      metrics.push(`${progress.samples_per_sec.toFixed(1)} muestras/s`);
+    }
+    if (metrics.length) {
+      lines.push(metrics.join(" · "));
+    }
+
+    if (typeof progress.progress === "number") {
+      let line = `${Math.round(progress.progress * 100)}%`;
+      if (typeof progress.eta_seconds === "number") {
+        line += ` · restante ~${Math.ceil(progress.eta_seconds)} s`;
+      }
+      lines.push(line);
+    }
+
+    this.progressElement.innerText = lines.join("\n");
+  }
+
   /**
    * Verifica si hay un entrenamiento en curso
    *
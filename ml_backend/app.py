@@ -6,6 +6,22 @@ from flask_cors import CORS
 from config import get_config
 from auth.models import db, bcrypt, create_initial_data
 from auth.routes import auth_bp
+from ml.common.model_cache import model_cache
+from ml.common.result_cache import prediction_cache
+from ml.common.dataset_cache import dataset_cache
+from ml.cnn.embeddings import embedding_cache
+from ml.cnn.weights import weights_store
+from ml.cnn.runs import run_store
+from ml.cnn.inference import inference_dispatcher
+from ml.cnn.model import configure_serving
+from ml.cnn.dataset import configure_input_pipeline
+from ml.common.data import configure_image_loading
+from ml.common.registry import ensure_registry_schema, sync_registry
+from ml.common.warmup import start_warmup, warmup_state
+from ml.jobs.manager import job_manager
+from ml.jobs.models import ensure_jobs_schema
+from ml.jobs.resources import resource_scheduler
+from ml.jobs.routes import jobs_bp
 from ml.cnn.routes import cnn_bp
 from ml.tabular.routes import tabular_bp
 from dashboard.routes import dashboard_bp
@@ -41,6 +57,31 @@ def create_app(config=None):
     # Inicializar Bcrypt
     bcrypt.init_app(app)
     
+    # Inicializar caché de modelos
+    model_cache.init_app(app)
+    
+    # Inicializar caché de resultados de predicción
+    prediction_cache.init_app(app)
+    
+    # Inicializar caché de conjuntos de imágenes decodificados
+    dataset_cache.init_app(app)
+    embedding_cache.init_app(app)
+    
+    # Inicializar almacén local de pesos preentrenados
+    weights_store.init_app(app)
+    
+    # Inicializar agrupación de predicciones CNN
+    inference_dispatcher.init_app(app)
+    configure_serving(app.config['CNN_COMPILED_MAX_BATCH'], app.config['CNN_XLA_COMPILE'])
+    configure_input_pipeline(app.config['CNN_STREAM_SHUFFLE_BUFFER'], app.config['CNN_STREAM_CACHE'])
+    configure_image_loading(app.config['IMAGE_LOAD_WORKERS'], app.config['IMAGE_LOAD_CHUNK_SIZE'])
+    
+    # Inicializar el gestor de trabajos de entrenamiento y su control de admisión
+    job_manager.init_app(app)
+    resource_scheduler.init_app(app)
+    resource_scheduler.configure_tensorflow()
+    run_store.init_app(app)
+    
     # Crear directorios necesarios
     os.makedirs(app.config['IMAGE_UPLOAD_FOLDER'], exist_ok=True)
     os.makedirs(app.config['TABULAR_UPLOAD_FOLDER'], exist_ok=True)
@@ -52,6 +93,7 @@ def create_app(config=None):
     app.register_blueprint(cnn_bp)
     app.register_blueprint(tabular_bp)
     app.register_blueprint(dashboard_bp)
+    app.register_blueprint(jobs_bp)
     
     # Ruta raíz redirige al frontend
     @app.route('/', methods=['GET'])
@@ -69,9 +111,16 @@ def create_app(config=None):
         return jsonify({
             'message': 'API de ML Backend',
             'version': '1.0.0',
-            'status': 'operational'
+            'status': 'operational',
+            'ready': warmup_state.ready
         })
     
+    # Ruta de disponibilidad: responde 503 hasta que termina la precarga de modelos
+    @app.route('/api/ready', methods=['GET'])
+    def api_ready():
+        state = warmup_state.to_dict()
+        return jsonify(state), 200 if state['ready'] else 503
+    
     # Manejador de errores 404
     @app.errorhandler(404)
     def not_found(error):
@@ -90,6 +139,21 @@ def create_app(config=None):
     with app.app_context():
         db.create_all()
         create_initial_data()
+        
+        # Los entrenamientos no sobreviven a un reinicio del servicio; sus
+        # ejecuciones quedan interrumpidas y se pueden reanudar
+        ensure_jobs_schema()
+        job_manager.recover_interrupted()
+        run_store.recover_interrupted()
+        run_store.enforce_retention()
+        
+        # Sincronizar el registro de modelos con los archivos en disco
+        ensure_registry_schema()
+        sync_registry(app.config['CNN_MODELS_FOLDER'])
+        sync_registry(app.config['TABULAR_MODELS_FOLDER'])
+    
+    # Precargar y calentar los modelos más usados en segundo plano
+    start_warmup(app)
     
     return app
 
@@ -0,0 +1,416 @@
+"""
+Pruebas de rendimiento del backend de ML
+
+Uso:
+    python benchmark.py inference [--model RUTA] [--batch-sizes 1,4,16,64] [--repeats 50]
+    python benchmark.py forest [--model RUTA] [--rows 1,100,10000] [--repeats 20]
+    python benchmark.py pipeline --images RUTA [--mode both] [--size 224] [--epochs 2]
+    python benchmark.py augmentation [--images 2048] [--size 224] [--batch-size 32]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import resource
+import tempfile
+import subprocess
+
+import numpy as np
+
+def _time_calls(fn, repeats):
+    """
+    Mide el tiempo medio de una función en milisegundos
+
+    Args:
+        fn: Función sin argumentos a medir
+        repeats: Número de repeticiones
+
+    Returns:
+        Diccionario con la media y la mediana en milisegundos
+    """
+    # Una llamada previa para excluir trazado y compilación de la medición
+    fn()
+
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000.0)
+
+    return {
+        'mean_ms': float(np.mean(timings)),
+        'median_ms': float(np.median(timings))
+    }
+
+def _load_or_build_cnn(model_path, input_size):
+    """Carga un modelo guardado o crea un modelo CNN personalizado sin entrenar"""
+    if model_path:
+        from ml.common.model_storage import load_tensorflow_model
+        model, _ = load_tensorflow_model(model_path)
+        return model
+
+    from ml.cnn.model import create_cnn_model
+    return create_cnn_model(input_shape=(input_size, input_size, 3), num_classes=2)
+
+def benchmark_inference(args):
+    """
+    Compara model.predict con la función de inferencia compilada para lotes pequeños
+
+    Args:
+        args: Argumentos de la línea de comandos
+
+    Returns:
+        Lista de resultados por tamaño de lote
+    """
+    from ml.cnn.model import configure_serving, get_serving_function
+    import tensorflow as tf
+
+    configure_serving(max_batch_size=max(args.batch_sizes), jit_compile=args.xla)
+    model = _load_or_build_cnn(args.model, args.input_size)
+    input_shape = tuple(model.input_shape[1:])
+
+    results = []
+    for batch_size in args.batch_sizes:
+        images = np.random.rand(batch_size, *input_shape).astype('float32')
+        serving_function = get_serving_function(model)
+
+        predict_timing = _time_calls(lambda: model.predict(images, verbose=0), args.repeats)
+        compiled_timing = _time_calls(
+            lambda: serving_function(tf.convert_to_tensor(images)).numpy(), args.repeats
+        )
+
+        results.append({
+            'batch_size': batch_size,
+            'predict': predict_timing,
+            'compiled': compiled_timing,
+            'speedup': predict_timing['median_ms'] / compiled_timing['median_ms']
+        })
+
+        print(
+            f"lote={batch_size:4d}  predict={predict_timing['median_ms']:8.2f} ms  "
+            f"compilado={compiled_timing['median_ms']:8.2f} ms  "
+            f"aceleración={results[-1]['speedup']:.2f}x"
+        )
+
+    return results
+
+def benchmark_forest(args):
+    """
+    Compara el Random Forest de scikit-learn con el bosque compacto: tamaño,
+    tiempo de carga y latencia de predicción
+
+    Args:
+        args: Argumentos de la línea de comandos
+
+    Returns:
+        Diccionario con los resultados
+    """
+    import joblib
+    import tempfile
+    from ml.tabular.forest import FOREST_EXTENSION, export_compact_forest, load_compact_forest
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        if args.model:
+            model_path = args.model
+            model = joblib.load(f"{model_path}.pkl")
+        else:
+            from sklearn.datasets import make_classification
+            from ml.tabular.models import create_random_forest_model
+
+            X, y = make_classification(n_samples=args.samples, n_features=args.features, random_state=0)
+            model = create_random_forest_model().fit(X, y)
+            model_path = os.path.join(temp_dir, 'forest')
+            joblib.dump(model, f"{model_path}.pkl")
+
+        # Usar el bosque compacto ya exportado o exportarlo a un directorio temporal
+        compact_path = model_path
+        if not os.path.exists(f"{model_path}{FOREST_EXTENSION}"):
+            compact_path = os.path.join(temp_dir, 'compact')
+            export_compact_forest(model, compact_path)
+
+        def load_pickle():
+            return joblib.load(f"{model_path}.pkl")
+
+        results = {
+            'pickle_bytes': os.path.getsize(f"{model_path}.pkl"),
+            'compact_bytes': os.path.getsize(f"{compact_path}{FOREST_EXTENSION}"),
+            'load': {
+                'pickle': _time_calls(load_pickle, args.repeats),
+                'compact': _time_calls(lambda: load_compact_forest(compact_path), args.repeats)
+            },
+            'predict': []
+        }
+
+        compact = load_compact_forest(compact_path)
+        for rows in args.rows:
+            X = np.random.rand(rows, model.n_features_in_)
+            pickle_timing = _time_calls(lambda: model.predict(X), args.repeats)
+            compact_timing = _time_calls(lambda: compact.predict(X), args.repeats)
+            results['predict'].append({
+                'rows': rows,
+                'pickle': pickle_timing,
+                'compact': compact_timing,
+                'agreement': float(np.mean(model.predict(X) == compact.predict(X)))
+            })
+            print(
+                f"filas={rows:6d}  sklearn={pickle_timing['median_ms']:8.2f} ms  "
+                f"compacto={compact_timing['median_ms']:8.2f} ms  "
+                f"coincidencia={results['predict'][-1]['agreement']:.4f}"
+            )
+
+        print(
+            f"tamaño: pkl={results['pickle_bytes']} B  npz={results['compact_bytes']} B  "
+            f"carga: pkl={results['load']['pickle']['median_ms']:.2f} ms  "
+            f"npz={results['load']['compact']['median_ms']:.2f} ms"
+        )
+
+    return results
+
+def _list_training_images(images_path, extract_dir):
+    """
+    Obtiene las imágenes y etiquetas de un ZIP o de un directorio con una carpeta por clase
+
+    Returns:
+        Tupla (rutas, etiquetas)
+    """
+    from ml.common.data import extract_zip_images_with_classes
+
+    if os.path.isfile(images_path) and images_path.lower().endswith('.zip'):
+        image_paths, labels, _ = extract_zip_images_with_classes(images_path, extract_dir)
+        return image_paths, labels
+
+    image_paths, labels, classes = [], [], {}
+    for root, _, files in sorted(os.walk(images_path)):
+        for file in sorted(files):
+            if os.path.splitext(file.lower())[1] not in ('.jpg', '.jpeg', '.png'):
+                continue
+            class_name = os.path.relpath(root, images_path).split(os.sep)[0]
+            image_paths.append(os.path.join(root, file))
+            labels.append(classes.setdefault(class_name, len(classes)))
+    return image_paths, labels
+
+def _peak_rss_bytes():
+    # ru_maxrss está en kilobytes en Linux y en bytes en macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+def _run_pipeline_mode(args):
+    """
+    Entrena un modelo CNN pequeño con un modo de entrada y mide el rendimiento
+
+    Returns:
+        Diccionario con el tiempo de carga, los tiempos por época, las imágenes
+        por segundo y la memoria residente máxima del proceso
+    """
+    from keras import callbacks
+    from ml.cnn.model import create_cnn_model, train_cnn_model
+    from ml.cnn.dataset import build_image_dataset
+    from ml.common.data import prepare_image_data, configure_image_loading
+
+    class EpochTimer(callbacks.Callback):
+        def on_train_begin(self, logs=None):
+            self.epoch_seconds = []
+
+        def on_epoch_begin(self, epoch, logs=None):
+            self.start = time.perf_counter()
+
+        def on_epoch_end(self, epoch, logs=None):
+            self.epoch_seconds.append(time.perf_counter() - self.start)
+
+    configure_image_loading(workers=args.load_workers)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        image_paths, labels = _list_training_images(args.images, os.path.join(temp_dir, 'images'))
+        if args.limit:
+            image_paths, labels = image_paths[:args.limit], labels[:args.limit]
+
+        model = create_cnn_model(input_shape=(args.size, args.size, 3), num_classes=max(labels) + 1)
+        timer = EpochTimer()
+
+        start = time.perf_counter()
+        if args.mode == 'stream':
+            X = build_image_dataset(
+                image_paths, labels, args.size, args.size,
+                batch_size=args.batch_size, training=True,
+                data_augmentation=args.augmentation,
+                cache_path=os.path.join(temp_dir, 'cache', 'train')
+            )
+            y = None
+        else:
+            X, y = prepare_image_data(image_paths, args.size, args.size, labels)
+        load_seconds = time.perf_counter() - start
+
+        train_cnn_model(
+            model, X, y,
+            batch_size=args.batch_size,
+            epochs=args.epochs,
+            data_augmentation=args.augmentation,
+            callbacks=[timer]
+        )
+
+    return {
+        'mode': args.mode,
+        'images': len(image_paths),
+        'load_seconds': load_seconds,
+        'epoch_seconds': timer.epoch_seconds,
+        'images_per_second': [len(image_paths) / seconds for seconds in timer.epoch_seconds],
+        'total_seconds': load_seconds + sum(timer.epoch_seconds),
+        'peak_rss_bytes': _peak_rss_bytes()
+    }
+
+def benchmark_pipeline(args):
+    """
+    Compara la carga completa en memoria con la entrada en streaming (tf.data)
+
+    Cada modo se ejecuta en un proceso propio para que la memoria residente
+    máxima de uno no afecte a la del otro.
+
+    Args:
+        args: Argumentos de la línea de comandos
+
+    Returns:
+        Lista de resultados por modo
+    """
+    if args.mode != 'both':
+        result = _run_pipeline_mode(args)
+        _print_pipeline_result(result)
+        return [result]
+
+    results = []
+    for mode in ('memory', 'stream'):
+        with tempfile.NamedTemporaryFile(suffix='.json') as output:
+            command = [
+                sys.executable, os.path.abspath(__file__), '--output', output.name, 'pipeline',
+                '--images', args.images, '--mode', mode, '--size', str(args.size),
+                '--batch-size', str(args.batch_size), '--epochs', str(args.epochs),
+                '--limit', str(args.limit), '--load-workers', str(args.load_workers)
+            ]
+            if args.augmentation:
+                command.append('--augmentation')
+            subprocess.run(command, check=True)
+            with open(output.name) as f:
+                results.append(json.load(f)['results'][0])
+
+    return results
+
+def _print_pipeline_result(result):
+    epochs = ' '.join(f"{rate:8.1f}" for rate in result['images_per_second'])
+    print(
+        f"modo={result['mode']:6s}  carga={result['load_seconds']:7.2f} s  "
+        f"imágenes/s por época=[{epochs} ]  "
+        f"RSS máx={result['peak_rss_bytes'] / (1024 * 1024):8.1f} MB"
+    )
+
+def benchmark_augmentation(args):
+    """
+    Compara las muestras aumentadas por segundo de ImageDataGenerator.flow y del
+    aumento de datos con capas de Keras en tf.data
+
+    Ambos motores recorren el mismo arreglo uint8 de imágenes aleatorias con las
+    opciones de aumento por defecto, sin entrenar ningún modelo.
+
+    Args:
+        args: Argumentos de la línea de comandos
+
+    Returns:
+        Diccionario con las muestras por segundo de cada motor
+    """
+    from keras.preprocessing.image import ImageDataGenerator
+    from ml.cnn.dataset import AUGMENTATION_DEFAULTS, build_array_dataset
+
+    images = np.random.randint(0, 256, size=(args.images, args.size, args.size, 3), dtype=np.uint8)
+    labels = np.random.randint(0, 2, size=args.images)
+    num_batches = -(-args.images // args.batch_size)
+
+    def measure(batches):
+        # Una época completa tras descartar el primer lote (inicialización)
+        next(batches)
+        start = time.perf_counter()
+        samples = 0
+        for _ in range(num_batches - 1):
+            samples += len(next(batches)[0])
+        return samples / (time.perf_counter() - start)
+
+    generator = ImageDataGenerator(fill_mode='nearest', dtype='float32', **AUGMENTATION_DEFAULTS)
+    generator_rate = measure(iter(generator.flow(images, labels, batch_size=args.batch_size)))
+
+    dataset = build_array_dataset(
+        images, np.arange(args.images), labels,
+        batch_size=args.batch_size, training=True, data_augmentation=True
+    )
+    dataset_rate = measure(iter(dataset.repeat()))
+
+    results = {
+        'images': args.images,
+        'size': args.size,
+        'batch_size': args.batch_size,
+        'image_data_generator': generator_rate,
+        'tf_data': dataset_rate,
+        'speedup': dataset_rate / generator_rate
+    }
+    print(
+        f"ImageDataGenerator={generator_rate:9.1f} muestras/s  tf.data={dataset_rate:9.1f} muestras/s  "
+        f"aceleración={results['speedup']:.2f}x"
+    )
+    return results
+
+def _parse_int_list(value):
+    return [int(item) for item in value.split(',') if item.strip()]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Pruebas de rendimiento del backend de ML')
+    parser.add_argument('--output', help='Archivo JSON donde guardar los resultados')
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+
+    inference_parser = subparsers.add_parser('inference', help='Inferencia CNN: predict vs función compilada')
+    inference_parser.add_argument('--model', help='Ruta base de un modelo guardado (sin extensión)')
+    inference_parser.add_argument('--input-size', type=int, default=224, help='Tamaño de imagen si no se indica modelo')
+    inference_parser.add_argument('--batch-sizes', type=_parse_int_list, default=[1, 4, 16, 64])
+    inference_parser.add_argument('--repeats', type=int, default=50)
+    inference_parser.add_argument('--xla', action='store_true', help='Compilar la función con XLA')
+    inference_parser.set_defaults(run=benchmark_inference)
+
+    forest_parser = subparsers.add_parser('forest', help='Random Forest: scikit-learn vs bosque compacto')
+    forest_parser.add_argument('--model', help='Ruta base de un modelo Random Forest guardado (sin extensión)')
+    forest_parser.add_argument('--samples', type=int, default=20000, help='Filas de entrenamiento si no se indica modelo')
+    forest_parser.add_argument('--features', type=int, default=20, help='Características si no se indica modelo')
+    forest_parser.add_argument('--rows', type=_parse_int_list, default=[1, 100, 10000])
+    forest_parser.add_argument('--repeats', type=int, default=20)
+    forest_parser.set_defaults(run=benchmark_forest)
+
+    pipeline_parser = subparsers.add_parser('pipeline', help='Entrenamiento CNN: imágenes en memoria vs tf.data')
+    pipeline_parser.add_argument('--images', required=True, help='ZIP o directorio con una carpeta por clase')
+    pipeline_parser.add_argument('--mode', choices=['memory', 'stream', 'both'], default='both')
+    pipeline_parser.add_argument('--size', type=int, default=224, help='Altura y anchura de las imágenes')
+    pipeline_parser.add_argument('--batch-size', type=int, default=32)
+    pipeline_parser.add_argument('--epochs', type=int, default=2)
+    pipeline_parser.add_argument('--limit', type=int, default=0, help='Máximo de imágenes (0 para todas)')
+    pipeline_parser.add_argument('--augmentation', action='store_true', help='Aplicar aumento de datos')
+    pipeline_parser.add_argument(
+        '--load-workers', type=int, default=0,
+        help='Hilos de carga del modo memory (0 para los núcleos disponibles, 1 para carga secuencial)'
+    )
+    pipeline_parser.set_defaults(run=benchmark_pipeline)
+
+    augmentation_parser = subparsers.add_parser(
+        'augmentation', help='Aumento de datos: ImageDataGenerator vs capas de Keras en tf.data'
+    )
+    augmentation_parser.add_argument('--images', type=int, default=2048, help='Imágenes aleatorias a aumentar')
+    augmentation_parser.add_argument('--size', type=int, default=224, help='Altura y anchura de las imágenes')
+    augmentation_parser.add_argument('--batch-size', type=int, default=32)
+    augmentation_parser.set_defaults(run=benchmark_augmentation)
+
+    args = parser.parse_args(argv)
+    results = args.run(args)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'benchmark': args.benchmark, 'results': results}, f, indent=2)
+
+    return 0
+
+if __name__ == '__main__':
+    # Permitir ejecutar el script desde cualquier directorio
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    sys.exit(main())
@@ -38,6 +38,95 @@ class Config:
     ALLOWED_IMAGE_EXTENSIONS = {'png', 'jpg', 'jpeg'}
     ALLOWED_TABULAR_EXTENSIONS = {'csv', 'xlsx', 'xls'}
     
+    # Caché de modelos en memoria para los endpoints de predicción
+    MODEL_CACHE_ENABLED = os.environ.get('MODEL_CACHE_ENABLED', 'True').lower() == 'true'
+    MODEL_CACHE_MAX_BYTES = int(os.environ.get('MODEL_CACHE_MAX_MB', 1024)) * 1024 * 1024
+    
+    # Predicción por lotes con CNN
+    CNN_PREDICT_BATCH_SIZE = int(os.environ.get('CNN_PREDICT_BATCH_SIZE', 32))
+    CNN_BATCH_MAX_IMAGES = int(os.environ.get('CNN_BATCH_MAX_IMAGES', 1000))
+    
+    # Predicción tabular por lotes (filas por bloque)
+    TABULAR_PREDICT_CHUNK_SIZE = int(os.environ.get('TABULAR_PREDICT_CHUNK_SIZE', 10000))
+    # Máximo de filas por bloque que puede solicitar el cliente
+    TABULAR_PREDICT_MAX_CHUNK_SIZE = int(os.environ.get('TABULAR_PREDICT_MAX_CHUNK_SIZE', 100000))
+    
+    # Agrupación dinámica de predicciones CNN concurrentes (micro-batching)
+    CNN_MICROBATCH_ENABLED = os.environ.get('CNN_MICROBATCH_ENABLED', 'True').lower() == 'true'
+    CNN_MICROBATCH_MAX_SIZE = int(os.environ.get('CNN_MICROBATCH_MAX_SIZE', 32))
+    CNN_MICROBATCH_MAX_WAIT_MS = float(os.environ.get('CNN_MICROBATCH_MAX_WAIT_MS', 5))
+    CNN_MICROBATCH_TIMEOUT = float(os.environ.get('CNN_MICROBATCH_TIMEOUT', 30))
+    
+    # Precarga de modelos al iniciar la aplicación
+    MODEL_PRELOAD_ENABLED = os.environ.get('MODEL_PRELOAD_ENABLED', 'True').lower() == 'true'
+    MODEL_PRELOAD_COUNT = int(os.environ.get('MODEL_PRELOAD_COUNT', 3))  # Por cada directorio de modelos
+    MODEL_PRELOAD_PINNED = [name.strip() for name in os.environ.get('MODEL_PRELOAD_PINNED', '').split(',') if name.strip()]
+    
+    # Inferencia CNN compilada (tf.function) para lotes pequeños
+    CNN_COMPILED_MAX_BATCH = int(os.environ.get('CNN_COMPILED_MAX_BATCH', 64))
+    CNN_XLA_COMPILE = os.environ.get('CNN_XLA_COMPILE', 'False').lower() == 'true'
+    
+    # Caché en disco de conjuntos de imágenes decodificados (por hash del ZIP y tamaño)
+    DATASET_CACHE_ENABLED = os.environ.get('DATASET_CACHE_ENABLED', 'True').lower() == 'true'
+    DATASET_CACHE_FOLDER = os.environ.get('DATASET_CACHE_FOLDER', os.path.join(BASE_DIR, 'cache', 'datasets'))
+    DATASET_CACHE_MAX_BYTES = int(os.environ.get('DATASET_CACHE_MAX_MB', 10240)) * 1024 * 1024
+    
+    # Almacén local de pesos preentrenados (MobileNetV2, VGG16, ResNet50). Sin descarga
+    # permitida, los entrenamientos con pesos que no están en el almacén fallan
+    PRETRAINED_WEIGHTS_FOLDER = os.environ.get('PRETRAINED_WEIGHTS_FOLDER', os.path.join(BASE_DIR, 'weights'))
+    PRETRAINED_WEIGHTS_ALLOW_DOWNLOAD = os.environ.get('PRETRAINED_WEIGHTS_ALLOW_DOWNLOAD', 'True').lower() == 'true'
+    
+    # Entrenamiento de la cabeza sobre embeddings de bases congeladas (mobilenet, vgg16, resnet50)
+    CNN_EMBEDDING_TRAINING = os.environ.get('CNN_EMBEDDING_TRAINING', 'True').lower() == 'true'
+    EMBEDDING_CACHE_ENABLED = os.environ.get('EMBEDDING_CACHE_ENABLED', 'True').lower() == 'true'
+    EMBEDDING_CACHE_FOLDER = os.environ.get('EMBEDDING_CACHE_FOLDER', os.path.join(BASE_DIR, 'cache', 'embeddings'))
+    EMBEDDING_CACHE_MAX_BYTES = int(os.environ.get('EMBEDDING_CACHE_MAX_MB', 2048)) * 1024 * 1024
+    
+    # Límites de los ZIP de imágenes para entrenamiento (0 = sin límite)
+    ZIP_MAX_MEMBERS = int(os.environ.get('ZIP_MAX_MEMBERS', 100000))
+    ZIP_MAX_UNCOMPRESSED_MB = int(os.environ.get('ZIP_MAX_UNCOMPRESSED_MB', 4096))
+    ZIP_MAX_COMPRESSION_RATIO = float(os.environ.get('ZIP_MAX_COMPRESSION_RATIO', 50))
+    
+    # Carga paralela de imágenes (0 = núcleos disponibles)
+    IMAGE_LOAD_WORKERS = int(os.environ.get('IMAGE_LOAD_WORKERS', 0))
+    IMAGE_LOAD_CHUNK_SIZE = int(os.environ.get('IMAGE_LOAD_CHUNK_SIZE', 64))
+    
+    # Proporción máxima de imágenes de entrenamiento que pueden fallar al decodificarse
+    # e imágenes que se decodifican de prueba antes de encolar el entrenamiento
+    IMAGE_MAX_FAILED_FRACTION = float(os.environ.get('IMAGE_MAX_FAILED_FRACTION', 0.1))
+    IMAGE_DECODE_PROBE_SAMPLES = int(os.environ.get('IMAGE_DECODE_PROBE_SAMPLES', 32))
+    
+    # Entrada de datos del entrenamiento CNN: 'memory' (arreglo completo) o 'stream' (tf.data)
+    CNN_INPUT_PIPELINE = os.environ.get('CNN_INPUT_PIPELINE', 'memory')
+    CNN_STREAM_SHUFFLE_BUFFER = int(os.environ.get('CNN_STREAM_SHUFFLE_BUFFER', 1024))
+    CNN_STREAM_CACHE = os.environ.get('CNN_STREAM_CACHE', 'True').lower() == 'true'
+    
+    # Ejecuciones de entrenamiento CNN: checkpoints cada N épocas (con el estado del
+    # optimizador, para reanudarlas) y parada temprana sobre val_loss (0 = desactivada)
+    CNN_RUNS_FOLDER = os.environ.get('CNN_RUNS_FOLDER', os.path.join(CNN_MODELS_FOLDER, 'runs'))
+    CNN_CHECKPOINT_EVERY = int(os.environ.get('CNN_CHECKPOINT_EVERY', 1))
+    CNN_EARLY_STOPPING_PATIENCE = int(os.environ.get('CNN_EARLY_STOPPING_PATIENCE', 5))
+    # Retención de los checkpoints y datos de las ejecuciones no completadas (0 = sin límite)
+    CNN_RUN_RETENTION_DAYS = float(os.environ.get('CNN_RUN_RETENTION_DAYS', 7))
+    CNN_RUNS_MAX_BYTES = int(os.environ.get('CNN_RUNS_MAX_MB', 10240)) * 1024 * 1024
+    
+    # Caché de resultados de predicción (desactivada por defecto)
+    PREDICTION_CACHE_ENABLED = os.environ.get('PREDICTION_CACHE_ENABLED', 'False').lower() == 'true'
+    PREDICTION_CACHE_MAX_ENTRIES = int(os.environ.get('PREDICTION_CACHE_MAX_ENTRIES', 10000))
+    PREDICTION_CACHE_TTL = int(os.environ.get('PREDICTION_CACHE_TTL', 300))
+    
+    # Trabajos de entrenamiento en segundo plano (por proceso)
+    TRAINING_MAX_CONCURRENT_JOBS = int(os.environ.get('TRAINING_MAX_CONCURRENT_JOBS', 2))
+    TRAINING_MAX_PENDING_JOBS = int(os.environ.get('TRAINING_MAX_PENDING_JOBS', 10))
+    
+    # Control de admisión de entrenamientos (presupuestos del servidor, 0 = automático)
+    TRAINING_ADMISSION_ENABLED = os.environ.get('TRAINING_ADMISSION_ENABLED', 'True').lower() == 'true'
+    TRAINING_MEMORY_BUDGET_MB = int(os.environ.get('TRAINING_MEMORY_BUDGET_MB', 0))
+    TRAINING_MEMORY_BUDGET_FRACTION = float(os.environ.get('TRAINING_MEMORY_BUDGET_FRACTION', 0.6))
+    TRAINING_CPU_BUDGET = int(os.environ.get('TRAINING_CPU_BUDGET', 0))
+    TRAINING_CNN_CPU_THREADS = int(os.environ.get('TRAINING_CNN_CPU_THREADS', 0))
+    TRAINING_JOB_BASE_MEMORY_MB = int(os.environ.get('TRAINING_JOB_BASE_MEMORY_MB', 256))
+    
     # Datos de prueba
     TEST_IMAGES_FOLDER = os.path.join(BASE_DIR, 'ml', 'cnn', 'test_data')
     TEST_TABULAR_FOLDER = os.path.join(BASE_DIR, 'ml', 'tabular', 'test_data')
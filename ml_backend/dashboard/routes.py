@@ -2,6 +2,15 @@ from flask import Blueprint, jsonify, current_app
 from flask_jwt_extended import jwt_required
 from datetime import datetime, timedelta
 from ml.common.model_storage import list_models
+from ml.common.model_cache import model_cache
+from ml.common.result_cache import prediction_cache
+from ml.cnn.inference import inference_dispatcher
+from ml.jobs.manager import job_manager
+from ml.common.dataset_cache import dataset_cache
+from ml.cnn.embeddings import embedding_cache
+from ml.cnn.weights import weights_store
+from ml.cnn.runs import run_store
+from ml.jobs.resources import resource_scheduler
 
 # Crear blueprint para rutas del dashboard
 dashboard_bp = Blueprint('dashboard', __name__, url_prefix='/api/dashboard')
@@ -100,6 +109,32 @@ def get_dashboard_stats():
             }
         }), 200
     
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@dashboard_bp.route('/metrics', methods=['GET'])
+@jwt_required()
+def get_runtime_metrics():
+    """Endpoint para obtener métricas de ejecución del servicio de predicción"""
+    try:
+        return jsonify({
+            'success': True,
+            'metrics': {
+                'model_cache': model_cache.stats(),
+                'prediction_cache': prediction_cache.stats(),
+                'dataset_cache': dataset_cache.stats(),
+                'embedding_cache': embedding_cache.stats(),
+                'pretrained_weights': weights_store.stats(),
+                'cnn_inference': inference_dispatcher.stats(),
+                'training_jobs': job_manager.stats(),
+                'training_runs': run_store.stats(),
+                'training_resources': resource_scheduler.stats()
+            }
+        }), 200
+    
     except Exception as e:
         return jsonify({
             'success': False,
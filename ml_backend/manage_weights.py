@@ -0,0 +1,94 @@
+"""
+Gestión del almacén local de pesos preentrenados
+
+Uso:
+    python manage_weights.py add ARCHIVO [--architecture vgg16] [--input-size 224] [--sha256 HEX]
+    python manage_weights.py scan [DIRECTORIO]      (por defecto ~/.keras/models)
+    python manage_weights.py list
+    python manage_weights.py verify
+"""
+import os
+import sys
+import argparse
+
+def _open_store(folder):
+    from ml.cnn.weights import weights_store
+
+    if folder is None:
+        from config import get_config
+        folder = get_config().PRETRAINED_WEIGHTS_FOLDER
+    weights_store.folder = folder
+    return weights_store
+
+def command_add(store, args):
+    filename, entry = store.add(args.file, args.architecture, args.input_size, args.sha256)
+    print(f"{filename}  {entry['architecture']}  sha256={entry['sha256']}")
+    return 0
+
+def command_scan(store, args):
+    from ml.cnn.weights import known_weights_files
+
+    added = 0
+    for filename in sorted(known_weights_files()):
+        path = os.path.join(args.directory, filename)
+        if os.path.exists(path):
+            command_add(store, argparse.Namespace(file=path, architecture=None, input_size=None, sha256=None))
+            added += 1
+    print(f"{added} archivos añadidos desde '{args.directory}'")
+    return 0
+
+def command_list(store, args):
+    manifest = store.manifest()
+    for filename, entry in sorted(manifest.items()):
+        print(f"{filename}  {entry['architecture']}  {entry['size_bytes']} B  sha256={entry['sha256']}")
+    print(f"{len(manifest)} archivos en '{store.folder}'")
+    return 0
+
+def command_verify(store, args):
+    results = store.verify()
+    for filename, status in sorted(results.items()):
+        print(f"{filename}  {status}")
+    # Código de salida distinto de cero si algún archivo falta o está dañado
+    return 0 if all(status == 'ok' for status in results.values()) else 1
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Almacén local de pesos preentrenados')
+    parser.add_argument('--folder', help='Directorio del almacén (por defecto PRETRAINED_WEIGHTS_FOLDER)')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    add_parser = subparsers.add_parser('add', help='Añadir un archivo de pesos .h5')
+    add_parser.add_argument('file', help='Archivo de pesos sin capas superiores (notop)')
+    add_parser.add_argument(
+        '--architecture', choices=['mobilenet', 'vgg16', 'resnet50'],
+        help='Arquitectura (se deduce de los nombres de archivo de Keras)'
+    )
+    add_parser.add_argument('--input-size', type=int, help='Tamaño de entrada de los pesos de MobileNetV2')
+    add_parser.add_argument('--sha256', help='SHA-256 esperado del archivo')
+    add_parser.set_defaults(run=command_add)
+
+    scan_parser = subparsers.add_parser('scan', help='Añadir los archivos de pesos conocidos de un directorio')
+    scan_parser.add_argument(
+        'directory', nargs='?', default=os.path.join(os.path.expanduser('~'), '.keras', 'models')
+    )
+    scan_parser.set_defaults(run=command_scan)
+
+    list_parser = subparsers.add_parser('list', help='Listar los archivos del almacén')
+    list_parser.set_defaults(run=command_list)
+
+    verify_parser = subparsers.add_parser('verify', help='Comprobar los checksums del almacén')
+    verify_parser.set_defaults(run=command_verify)
+
+    args = parser.parse_args(argv)
+    store = _open_store(args.folder)
+
+    from ml.cnn.weights import WeightsStoreError
+    try:
+        return args.run(store, args)
+    except WeightsStoreError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+if __name__ == '__main__':
+    # Permitir ejecutar el script desde cualquier directorio
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    sys.exit(main())
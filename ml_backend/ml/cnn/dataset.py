@@ -0,0 +1,238 @@
+import os
+import numpy as np
+import tensorflow as tf
+from keras import layers, models
+
+# Modos de entrada de datos para el entrenamiento CNN:
+# 'memory' carga todas las imágenes en un arreglo antes de entrenar,
+# 'stream' las decodifica en paralelo con tf.data durante el entrenamiento
+INPUT_PIPELINES = ('memory', 'stream')
+
+# Configuración del modo 'stream' (ver configure_input_pipeline)
+_pipeline_config = {
+    'shuffle_buffer': 1024,
+    'cache_to_file': True
+}
+
+def configure_input_pipeline(shuffle_buffer=1024, cache_to_file=True):
+    """
+    Configura el modo de entrada 'stream'
+
+    Args:
+        shuffle_buffer: Imágenes decodificadas que se mezclan en memoria
+        cache_to_file: Si se guardan las imágenes decodificadas en un archivo
+            local tras la primera época (en otro caso se decodifican en cada época)
+    """
+    _pipeline_config['shuffle_buffer'] = max(int(shuffle_buffer), 1)
+    _pipeline_config['cache_to_file'] = bool(cache_to_file)
+
+# Opciones de aumento de datos por defecto (mismos nombres que ImageDataGenerator)
+AUGMENTATION_DEFAULTS = {
+    'rotation_range': 20.0,
+    'width_shift_range': 0.2,
+    'height_shift_range': 0.2,
+    'zoom_range': 0.2,
+    'horizontal_flip': True,
+    'vertical_flip': False
+}
+
+def get_shuffle_buffer():
+    """Devuelve el tamaño configurado del buffer de mezcla"""
+    return _pipeline_config['shuffle_buffer']
+
+def parse_augmentation_options(values):
+    """
+    Lee y valida las opciones de aumento de datos de una solicitud
+
+    Args:
+        values: Diccionario (JSON o form-data) con rotation_range (grados),
+            width_shift_range, height_shift_range y zoom_range (fracciones) y
+            horizontal_flip y vertical_flip; las ausentes toman el valor por defecto
+
+    Returns:
+        Diccionario con las opciones de create_augmentation_model
+
+    Raises:
+        ValueError: Si alguna opción no es válida
+    """
+    options = dict(AUGMENTATION_DEFAULTS)
+    for key in ('rotation_range', 'width_shift_range', 'height_shift_range', 'zoom_range'):
+        if values.get(key) is not None:
+            options[key] = float(values[key])
+    for key in ('horizontal_flip', 'vertical_flip'):
+        value = values.get(key)
+        if value is not None:
+            options[key] = value.lower() == 'true' if isinstance(value, str) else bool(value)
+
+    if not 0 <= options['rotation_range'] <= 180:
+        raise ValueError("rotation_range debe estar entre 0 y 180 grados")
+    for key in ('width_shift_range', 'height_shift_range', 'zoom_range'):
+        if not 0 <= options[key] < 1:
+            raise ValueError(f"{key} debe estar entre 0 y 1")
+    return options
+
+def decode_image_file(path, img_height, img_width):
+    """
+    Lee, decodifica y redimensiona una imagen dentro del grafo de TensorFlow
+
+    Args:
+        path: Tensor con la ruta del archivo
+        img_height: Altura objetivo
+        img_width: Anchura objetivo
+
+    Returns:
+        Tensor uint8 (altura, anchura, 3); la normalización la hace el modelo
+    """
+    image = tf.io.decode_image(tf.io.read_file(path), channels=3, expand_animations=False)
+    return tf.image.resize(image, (img_height, img_width), method='nearest')
+
+def create_augmentation_model(
+    rotation_range=20.0,
+    width_shift_range=0.2,
+    height_shift_range=0.2,
+    zoom_range=0.2,
+    horizontal_flip=True,
+    vertical_flip=False
+):
+    """
+    Crea las capas aleatorias de aumento de datos
+
+    Equivalen a las opciones homónimas de ImageDataGenerator (sin
+    cizallamiento) y se aplican a lotes completos en los hilos de tf.data. Las
+    transformaciones con valor 0 se omiten.
+
+    Args:
+        rotation_range: Rotación máxima en grados
+        width_shift_range: Desplazamiento horizontal máximo (fracción de la anchura)
+        height_shift_range: Desplazamiento vertical máximo (fracción de la altura)
+        zoom_range: Zoom máximo, independiente en cada eje como en ImageDataGenerator
+        horizontal_flip: Si se voltean imágenes horizontalmente al azar
+        vertical_flip: Si se voltean imágenes verticalmente al azar
+
+    Returns:
+        Modelo secuencial de Keras con las capas aleatorias
+    """
+    augmentation = []
+    if rotation_range:
+        augmentation.append(layers.RandomRotation(rotation_range / 360, fill_mode='nearest'))
+    if width_shift_range or height_shift_range:
+        augmentation.append(layers.RandomTranslation(height_shift_range, width_shift_range, fill_mode='nearest'))
+    if zoom_range:
+        augmentation.append(layers.RandomZoom(zoom_range, zoom_range, fill_mode='nearest'))
+    if horizontal_flip or vertical_flip:
+        mode = 'horizontal_and_vertical' if horizontal_flip and vertical_flip else 'horizontal' if horizontal_flip else 'vertical'
+        augmentation.append(layers.RandomFlip(mode))
+    return models.Sequential(augmentation, name='augmentation')
+
+def build_image_dataset(
+    image_paths,
+    labels,
+    img_height,
+    img_width,
+    batch_size=32,
+    training=False,
+    data_augmentation=False,
+    cache_path=None,
+    augmentation=None
+):
+    """
+    Construye un tf.data.Dataset de lotes (imagen, etiqueta) a partir de archivos
+
+    Las imágenes se decodifican y redimensionan en paralelo. Con cache_path, la
+    primera época guarda las imágenes decodificadas (uint8) en ese archivo y las
+    siguientes las leen de él. Las imágenes que no se pueden decodificar se
+    descartan con un aviso en el log.
+
+    Args:
+        image_paths: Lista de rutas a las imágenes
+        labels: Etiquetas correspondientes
+        img_height: Altura objetivo de las imágenes
+        img_width: Anchura objetivo de las imágenes
+        batch_size: Tamaño del lote
+        training: Si se mezclan las imágenes en cada época
+        data_augmentation: Si se aplica aumento de datos (solo con training)
+        cache_path: Prefijo del archivo de caché (None para no usar caché)
+        augmentation: Opciones de create_augmentation_model (None para las de por defecto)
+
+    Returns:
+        tf.data.Dataset con los lotes listos para model.fit o model.evaluate
+    """
+    autotune = tf.data.AUTOTUNE
+
+    dataset = tf.data.Dataset.from_tensor_slices((
+        tf.constant([str(path) for path in image_paths]),
+        tf.constant(labels, dtype=tf.int32)
+    ))
+    dataset = dataset.map(
+        lambda path, label: (decode_image_file(path, img_height, img_width), label),
+        num_parallel_calls=autotune,
+        deterministic=not training
+    )
+    dataset = dataset.ignore_errors(log_warning=True)
+
+    if cache_path and _pipeline_config['cache_to_file']:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        dataset = dataset.cache(cache_path)
+
+    if training:
+        dataset = dataset.shuffle(min(_pipeline_config['shuffle_buffer'], len(image_paths)), reshuffle_each_iteration=True)
+
+    return _finish_dataset(dataset.batch(batch_size), (augmentation or {}) if training and data_augmentation else None)
+
+def build_array_dataset(
+    images,
+    indices,
+    labels,
+    batch_size=32,
+    training=False,
+    data_augmentation=False,
+    augmentation=None
+):
+    """
+    Construye un tf.data.Dataset de lotes (imagen, etiqueta) a partir de un arreglo uint8
+
+    El dataset solo contiene índices (la mezcla es completa y no ocupa
+    memoria) y cada lote se lee del arreglo al prepararlo, sin copiar el
+    conjunto a un tensor. Con un memmap de la caché de conjuntos de imágenes
+    el conjunto nunca se carga entero en memoria.
+
+    Args:
+        images: Arreglo (N, altura, anchura, 3), p. ej. un memmap uint8
+        indices: Posiciones de las imágenes del subconjunto en el arreglo
+        labels: Etiquetas correspondientes a los índices
+        batch_size: Tamaño del lote
+        training: Si se mezclan las imágenes en cada época
+        data_augmentation: Si se aplica aumento de datos (solo con training)
+        augmentation: Opciones de create_augmentation_model (None para las de por defecto)
+
+    Returns:
+        tf.data.Dataset con los lotes listos para model.fit o model.evaluate
+    """
+    image_shape = images.shape[1:]
+    image_dtype = tf.as_dtype(images.dtype)
+
+    dataset = tf.data.Dataset.from_tensor_slices((
+        np.asarray(indices, dtype=np.int64),
+        np.asarray(labels, dtype=np.int32)
+    ))
+    if training:
+        dataset = dataset.shuffle(len(indices), reshuffle_each_iteration=True)
+
+    def load_batch(batch_indices, batch_labels):
+        batch = tf.numpy_function(lambda index: images[index], [batch_indices], image_dtype)
+        batch.set_shape((None,) + tuple(image_shape))
+        return batch, batch_labels
+
+    dataset = dataset.batch(batch_size).map(load_batch, num_parallel_calls=tf.data.AUTOTUNE)
+    return _finish_dataset(dataset, (augmentation or {}) if training and data_augmentation else None)
+
+def _finish_dataset(dataset, augmentation):
+    # Aumento de datos por lotes en paralelo y precarga de los lotes siguientes.
+    # augmentation es None sin aumento de datos; {} usa las opciones por defecto
+    if augmentation is not None:
+        augmentation_model = create_augmentation_model(**{**AUGMENTATION_DEFAULTS, **augmentation})
+        dataset = dataset.map(
+            lambda images, batch_labels: (augmentation_model(images, training=True), batch_labels),
+            num_parallel_calls=tf.data.AUTOTUNE
+        )
+    return dataset.prefetch(tf.data.AUTOTUNE)
@@ -0,0 +1,196 @@
+import os
+import json
+import time
+import logging
+
+import numpy as np
+import tensorflow as tf
+from keras import layers, models
+
+from ml.common.dataset_cache import DatasetCache
+
+# Configurar logging para depuración
+logger = logging.getLogger(__name__)
+
+# Arquitecturas con una base preentrenada congelada (ver create_cnn_model)
+FROZEN_BACKBONES = ('mobilenet', 'vgg16', 'resnet50')
+
+# Archivos de cada entrada de la caché
+EMBEDDINGS_FILE = 'embeddings.npy'
+META_FILE = 'meta.json'
+
+def supports_embedding_training(model_params, train_params):
+    """
+    Indica si un entrenamiento puede hacerse sobre embeddings precalculados
+
+    Solo es posible con una base congelada y sin aumento de datos: con aumento
+    las imágenes cambian en cada época y también sus embeddings.
+
+    Args:
+        model_params: Parámetros de create_cnn_model
+        train_params: Parámetros de train_cnn_model
+
+    Returns:
+        True si solo hace falta entrenar la cabeza densa
+    """
+    return model_params.get('architecture') in FROZEN_BACKBONES and not train_params.get('data_augmentation')
+
+def split_frozen_model(model):
+    """
+    Separa un modelo con base congelada en extractor de embeddings y cabeza densa
+
+    El extractor va de las imágenes a la salida de GlobalAveragePooling2D. La
+    cabeza reutiliza las capas posteriores del modelo (los mismos pesos) y su
+    optimizador, así que entrenarla entrena el modelo completo, que es el que
+    se guarda.
+
+    Args:
+        model: Modelo compilado de create_cnn_model con arquitectura preentrenada
+
+    Returns:
+        Tupla (extractor, cabeza compilada)
+    """
+    pooling_index = next(
+        index for index, layer in enumerate(model.layers)
+        if isinstance(layer, layers.GlobalAveragePooling2D)
+    )
+    pooling = model.layers[pooling_index]
+
+    extractor = models.Model(model.inputs, pooling.output, name='embedding_extractor')
+    head = models.Sequential(
+        [layers.Input(shape=pooling.output_shape[1:])] + model.layers[pooling_index + 1:],
+        name='head'
+    )
+    head.compile(optimizer=model.optimizer, loss=model.loss, metrics=['accuracy'])
+    return extractor, head
+
+def extract_embeddings(extractor, images, labels=None, batch_size=32, indices=None, out=None):
+    """
+    Calcula los embeddings de un conjunto de imágenes por lotes
+
+    Args:
+        extractor: Extractor de split_frozen_model
+        images: Arreglo (N, altura, anchura, 3), p. ej. un memmap, o
+            tf.data.Dataset de lotes (imagen, etiqueta)
+        labels: Etiquetas de las imágenes (se ignoran con un dataset)
+        batch_size: Imágenes por pasada del extractor
+        indices: Posiciones de las imágenes a procesar (None para todas)
+        out: Arreglo float32 de salida ya reservado (opcional)
+
+    Returns:
+        Tupla (embeddings float32 (N, dimensión), etiquetas); con un dataset las
+        etiquetas son las de sus lotes, en el mismo orden que los embeddings
+    """
+    if isinstance(images, tf.data.Dataset):
+        embeddings, dataset_labels = [], []
+        for batch, batch_labels in images:
+            embeddings.append(extractor.predict_on_batch(batch))
+            dataset_labels.append(batch_labels.numpy())
+        return np.concatenate(embeddings).astype(np.float32), np.concatenate(dataset_labels)
+
+    if indices is None:
+        indices = np.arange(len(images))
+    if out is None:
+        out = np.empty((len(indices),) + tuple(extractor.output_shape[1:]), dtype=np.float32)
+
+    for start in range(0, len(indices), batch_size):
+        batch_indices = indices[start:start + batch_size]
+        out[start:start + len(batch_indices)] = extractor.predict_on_batch(images[batch_indices])
+
+    return out, labels
+
+class EmbeddingCache(DatasetCache):
+    """
+    Caché en disco de los embeddings de una base congelada para un conjunto de imágenes.
+
+    Cada entrada guarda los embeddings de GlobalAveragePooling2D de todas las
+    imágenes de una entrada de la caché de conjuntos de imágenes, en el mismo
+    orden, para una arquitectura y unos pesos de la base. Volver a entrenar la cabeza con el mismo ZIP,
+    tamaño y arquitectura no ejecuta la base. Publicación atómica y desalojo
+    LRU como en DatasetCache.
+    """
+
+    CONFIG_PREFIX = 'EMBEDDING_CACHE'
+    ENTRY_DESCRIPTION = 'Embeddings'
+
+    def __init__(self, max_bytes=2 * 1024 * 1024 * 1024):
+        super().__init__(max_bytes)
+
+    def make_key(self, dataset_key, architecture, weights_id):
+        """
+        Construye la clave de los embeddings de un conjunto de imágenes
+
+        Args:
+            dataset_key: Clave del conjunto en la caché de conjuntos de imágenes
+            architecture: Arquitectura de la base congelada
+            weights_id: Identificador de los pesos de la base (ver WeightsStore.fingerprint)
+
+        Returns:
+            Clave o None si la caché está desactivada o el conjunto no tiene clave
+        """
+        if not self.enabled or not self.folder or dataset_key is None:
+            return None
+        return f"{dataset_key}_{architecture}_{weights_id}"
+
+    def build(self, key, extractor, images, batch_size=32):
+        """
+        Calcula los embeddings de todas las imágenes directamente en una nueva entrada
+
+        Args:
+            key: Clave devuelta por make_key
+            extractor: Extractor de split_frozen_model
+            images: Imágenes uint8 de la entrada de la caché de conjuntos
+            batch_size: Imágenes por pasada del extractor
+
+        Returns:
+            Memmap float32 (N, dimensión) de solo lectura
+        """
+        def write_entry(temp_dir):
+            embeddings = np.lib.format.open_memmap(
+                os.path.join(temp_dir, EMBEDDINGS_FILE), mode='w+', dtype=np.float32,
+                shape=(len(images),) + tuple(extractor.output_shape[1:])
+            )
+            extract_embeddings(extractor, images, batch_size=batch_size, out=embeddings)
+            embeddings.flush()
+            num_images, dimension = embeddings.shape
+            del embeddings
+
+            with open(os.path.join(temp_dir, META_FILE), 'w') as f:
+                json.dump({
+                    'num_images': num_images,
+                    'embedding_dim': dimension,
+                    'created_at': time.time()
+                }, f)
+
+        logger.info(f"Calculando embeddings '{key}' de {len(images)} imágenes")
+        return self._publish(key, write_entry)
+
+    def _open(self, entry_dir):
+        # Los metadatos se escriben al final: su ausencia indica una entrada inválida
+        with open(os.path.join(entry_dir, META_FILE)) as f:
+            json.load(f)
+        return np.load(os.path.join(entry_dir, EMBEDDINGS_FILE), mmap_mode='r')
+
+def embed_images(extractor, images, batch_size=32, cache_key=None):
+    """
+    Obtiene los embeddings de todas las imágenes de un arreglo, de la caché si existen
+
+    Args:
+        extractor: Extractor de split_frozen_model
+        images: Imágenes uint8 (N, altura, anchura, 3)
+        batch_size: Imágenes por pasada del extractor
+        cache_key: Clave de EmbeddingCache.make_key (None para no usar la caché)
+
+    Returns:
+        Arreglo o memmap float32 (N, dimensión)
+    """
+    embeddings = embedding_cache.get(cache_key)
+    if embeddings is None:
+        if cache_key is not None:
+            embeddings = embedding_cache.build(cache_key, extractor, images, batch_size)
+        else:
+            embeddings, _ = extract_embeddings(extractor, images, batch_size=batch_size)
+    return embeddings
+
+# Instancia compartida por los endpoints de entrenamiento
+embedding_cache = EmbeddingCache()
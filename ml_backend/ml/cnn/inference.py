@@ -0,0 +1,178 @@
+import time
+import queue
+import threading
+import logging
+from concurrent.futures import Future
+
+import numpy as np
+
+from .model import predict_batch
+
+# Configurar logging para depuración
+logger = logging.getLogger(__name__)
+
+class _ModelWorker:
+    """
+    Hilo que atiende las solicitudes encoladas para un único modelo.
+
+    Toma la primera solicitud disponible y espera como máximo max_wait segundos
+    a que lleguen más (hasta max_batch_size) antes de ejecutar una sola pasada
+    del modelo para todo el lote.
+    """
+
+    def __init__(self, dispatcher, key, model):
+        self.dispatcher = dispatcher
+        self.key = key
+        self.model = model
+        self.queue = queue.Queue()
+        self.alive = True
+        self.thread = threading.Thread(target=self._run, name=f"cnn-microbatch-{key[0]}", daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                first = self.queue.get(timeout=self.dispatcher.idle_timeout)
+            except queue.Empty:
+                # Sin actividad: retirar el hilo si no llegó nada mientras tanto
+                if self.dispatcher._retire(self):
+                    return
+                continue
+
+            batch = [first]
+            deadline = time.perf_counter() + self.dispatcher.max_wait
+            while len(batch) < self.dispatcher.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            self._process(batch)
+
+    def _process(self, batch):
+        images = np.stack([image for image, _ in batch])
+        try:
+            predictions = predict_batch(self.model, images, batch_size=len(batch))
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+        else:
+            for (_, future), prediction in zip(batch, predictions):
+                future.set_result(prediction)
+        finally:
+            self.dispatcher._record_batch(len(batch))
+
+class InferenceDispatcher:
+    """
+    Agrupa en lotes las predicciones concurrentes de una imagen sobre el mismo modelo.
+
+    Las solicitudes que llegan al mismo tiempo se combinan en un único lote
+    (limitado por tamaño máximo y tiempo máximo de espera) y se resuelven con
+    una sola pasada del modelo; cada llamador recibe únicamente su resultado.
+    """
+
+    def __init__(self, max_batch_size=32, max_wait_ms=5, timeout=30, idle_timeout=60):
+        self.enabled = True
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self._workers = {}
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.requests = 0
+        self.batches = 0
+        self.batch_size_histogram = {}
+        self.max_queue_depth = 0
+
+    def init_app(self, app):
+        """
+        Configura el despachador a partir de la configuración de la aplicación
+
+        Args:
+            app: Aplicación Flask
+        """
+        self.enabled = app.config.get('CNN_MICROBATCH_ENABLED', self.enabled)
+        self.max_batch_size = app.config.get('CNN_MICROBATCH_MAX_SIZE', self.max_batch_size)
+        self.max_wait = app.config.get('CNN_MICROBATCH_MAX_WAIT_MS', self.max_wait * 1000.0) / 1000.0
+        self.timeout = app.config.get('CNN_MICROBATCH_TIMEOUT', self.timeout)
+
+    def predict(self, model_path, model, image):
+        """
+        Realiza la predicción de una imagen compartiendo la pasada del modelo
+        con otras solicitudes concurrentes
+
+        Args:
+            model_path: Ruta base del modelo (identifica la cola)
+            model: Modelo CNN cargado
+            image: Imagen preprocesada (altura, anchura, canales)
+
+        Returns:
+            Predicción con la misma forma que predict_image: (1, num_clases)
+        """
+        if not self.enabled:
+            return predict_batch(model, np.expand_dims(image, axis=0), batch_size=1)
+
+        future = Future()
+        key = (model_path, id(model))
+
+        with self._lock:
+            worker = self._workers.get(key)
+            if worker is None or not worker.alive:
+                worker = _ModelWorker(self, key, model)
+                self._workers[key] = worker
+            worker.queue.put((image, future))
+            depth = worker.queue.qsize()
+
+        with self._stats_lock:
+            self.requests += 1
+            self.max_queue_depth = max(self.max_queue_depth, depth)
+
+        return np.expand_dims(future.result(timeout=self.timeout), axis=0)
+
+    def stats(self):
+        """
+        Devuelve métricas del despachador
+
+        Returns:
+            Diccionario con profundidad de colas e histograma de tamaños de lote
+        """
+        with self._lock:
+            queue_depths = {key[0]: worker.queue.qsize() for key, worker in self._workers.items()}
+
+        with self._stats_lock:
+            return {
+                'enabled': self.enabled,
+                'max_batch_size': self.max_batch_size,
+                'max_wait_ms': self.max_wait * 1000.0,
+                'requests': self.requests,
+                'batches': self.batches,
+                'average_batch_size': self.requests / self.batches if self.batches else 0.0,
+                'queue_depth': sum(queue_depths.values()),
+                'max_queue_depth': self.max_queue_depth,
+                'queues': queue_depths,
+                'batch_size_histogram': {str(size): count for size, count in sorted(self.batch_size_histogram.items())}
+            }
+
+    def _record_batch(self, size):
+        with self._stats_lock:
+            self.batches += 1
+            self.batch_size_histogram[size] = self.batch_size_histogram.get(size, 0) + 1
+
+    def _retire(self, worker):
+        # Retirar el hilo solo si no hay solicitudes pendientes; se evalúa bajo el
+        # mismo candado que usa predict() para encolar
+        with self._lock:
+            if not worker.queue.empty():
+                return False
+            worker.alive = False
+            if self._workers.get(worker.key) is worker:
+                del self._workers[worker.key]
+            logger.info(f"Hilo de inferencia inactivo retirado para '{worker.key[0]}'")
+            return True
+
+# Instancia compartida por los blueprints
+inference_dispatcher = InferenceDispatcher()
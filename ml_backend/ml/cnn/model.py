@@ -1,9 +1,95 @@
+import threading
+import weakref
 import numpy as np
+import tensorflow as tf
 from keras import layers, models, optimizers
-from keras.applications import MobileNetV2, VGG16, ResNet50
-from keras.preprocessing.image import ImageDataGenerator
 from sklearn.metrics import classification_report, confusion_matrix
 
+from .tflite import TFLiteModel
+from .preprocessing import create_preprocessing_layer
+from .weights import weights_store
+from .dataset import build_array_dataset
+
+# Configuración del camino de inferencia compilado (ver configure_serving)
+_serving_config = {
+    'max_batch_size': 64,
+    'jit_compile': False
+}
+
+# Funciones de inferencia compiladas por modelo cargado
+_serving_functions = {}
+_serving_lock = threading.Lock()
+
+def configure_serving(max_batch_size=64, jit_compile=False):
+    """
+    Configura el camino de inferencia compilado
+    
+    Args:
+        max_batch_size: Lotes de hasta este tamaño usan la función compilada;
+            los mayores usan model.predict (0 para desactivarla)
+        jit_compile: Si se debe compilar la función con XLA
+    """
+    _serving_config['max_batch_size'] = max_batch_size
+    _serving_config['jit_compile'] = jit_compile
+    with _serving_lock:
+        _serving_functions.clear()
+
+def get_serving_function(model):
+    """
+    Obtiene la función de inferencia compilada de un modelo, creándola si no existe
+    
+    La función se traza una sola vez con una firma de entrada fija (lote variable)
+    y evita el adaptador de datos y el bucle de pasos que model.predict construye
+    en cada llamada, que dominan el tiempo en lotes pequeños.
+    
+    Args:
+        model: Modelo de Keras
+    
+    Returns:
+        tf.function que recibe un tensor float32 (N, altura, anchura, canales)
+    """
+    key = id(model)
+    with _serving_lock:
+        serving_function = _serving_functions.get(key)
+        if serving_function is None:
+            input_spec = tf.TensorSpec(shape=(None,) + tuple(model.input_shape[1:]), dtype=tf.float32)
+            # Referencia débil para que la función no mantenga vivo al modelo
+            model_ref = weakref.ref(model)
+            
+            @tf.function(input_signature=[input_spec], jit_compile=_serving_config['jit_compile'])
+            def serving_function(images):
+                return model_ref()(images, training=False)
+            
+            _serving_functions[key] = serving_function
+            # Descartar la función cuando el modelo se libere de memoria
+            weakref.finalize(model, _serving_functions.pop, key, None)
+    
+    return serving_function
+
+def run_inference(model, images, batch_size=32):
+    """
+    Ejecuta el modelo sobre un lote eligiendo el camino de inferencia más rápido
+    
+    Args:
+        model: Modelo de Keras
+        images: Array (N, altura, anchura, canales)
+        batch_size: Tamaño de paso para model.predict en lotes grandes
+    
+    Returns:
+        Array NumPy con las salidas del modelo
+    """
+    # Modelos exportados a TFLite: el intérprete se invoca por bloques
+    if isinstance(model, TFLiteModel):
+        step = max(batch_size, 1)
+        return np.concatenate([model.predict(images[i:i + step]) for i in range(0, len(images), step)])
+    
+    if 0 < len(images) <= _serving_config['max_batch_size']:
+        serving_function = get_serving_function(model)
+        # Las imágenes uint8 se convierten a float32 ya como tensor
+        return serving_function(tf.cast(tf.convert_to_tensor(images), tf.float32)).numpy()
+    
+    return model.predict(images, batch_size=batch_size, verbose=0)
+
 def create_cnn_model(
     input_shape=(224, 224, 3),
     num_classes=10,
@@ -30,19 +116,19 @@ def create_cnn_model(
         learning_rate: Tasa de aprendizaje para el optimizador
     
     Returns:
-        Modelo de Keras compilado
+        Modelo de Keras compilado, que recibe píxeles en [0,255] (uint8 o float)
+        y aplica el preprocesamiento de la arquitectura en su primera capa
     """
+    # Normalización dentro del grafo: las imágenes viajan en uint8 hasta el modelo
+    inputs = [layers.Input(shape=input_shape), create_preprocessing_layer(architecture)]
+    
     # Opciones de arquitectura
     if architecture == 'mobilenet':
-        # Usar MobileNetV2 preentrenado
-        base_model = MobileNetV2(
-            input_shape=input_shape,
-            include_top=False,
-            weights='imagenet'
-        )
+        # Usar MobileNetV2 preentrenado (pesos del almacén local, ver weights_store)
+        base_model = weights_store.build_backbone('mobilenet', input_shape)
         base_model.trainable = False  # Congelar pesos para transfer learning
         
-        model = models.Sequential([
+        model = models.Sequential(inputs + [
             base_model,
             layers.GlobalAveragePooling2D(),
             layers.Dense(dense_units, activation='relu'),
@@ -51,15 +137,11 @@ def create_cnn_model(
         ])
     
     elif architecture == 'vgg16':
-        # Usar VGG16 preentrenado
-        base_model = VGG16(
-            input_shape=input_shape,
-            include_top=False,
-            weights='imagenet'
-        )
+        # Usar VGG16 preentrenado (pesos del almacén local, ver weights_store)
+        base_model = weights_store.build_backbone('vgg16', input_shape)
         base_model.trainable = False  # Congelar pesos para transfer learning
         
-        model = models.Sequential([
+        model = models.Sequential(inputs + [
             base_model,
             layers.GlobalAveragePooling2D(),
             layers.Dense(dense_units, activation='relu'),
@@ -68,15 +150,11 @@ def create_cnn_model(
         ])
     
     elif architecture == 'resnet50':
-        # Usar ResNet50 preentrenado
-        base_model = ResNet50(
-            input_shape=input_shape,
-            include_top=False,
-            weights='imagenet'
-        )
+        # Usar ResNet50 preentrenado (pesos del almacén local, ver weights_store)
+        base_model = weights_store.build_backbone('resnet50', input_shape)
         base_model.trainable = False  # Congelar pesos para transfer learning
         
-        model = models.Sequential([
+        model = models.Sequential(inputs + [
             base_model,
             layers.GlobalAveragePooling2D(),
             layers.Dense(dense_units, activation='relu'),
@@ -85,10 +163,10 @@ def create_cnn_model(
         ])
     
     else:  # Arquitectura personalizada
-        model = models.Sequential()
+        model = models.Sequential(inputs)
         
         # Primera capa convolucional
-        model.add(layers.Conv2D(filters[0], kernel_size, activation='relu', input_shape=input_shape))
+        model.add(layers.Conv2D(filters[0], kernel_size, activation='relu'))
         model.add(layers.MaxPooling2D(pool_size=pool_size))
         
         # Segunda capa convolucional (si hay suficientes filtros)
@@ -126,25 +204,52 @@ def train_cnn_model(
     batch_size=32,
     epochs=10,
     data_augmentation=True,
-    callbacks=None
+    callbacks=None,
+    augmentation=None,
+    initial_epoch=0
 ):
     """
     Entrena un modelo CNN con los datos proporcionados
     
+    X_train y X_val pueden ser tf.data.Dataset de lotes (imagen, etiqueta),
+    como los de build_image_dataset: en ese caso el lote y el aumento de datos
+    los define el dataset y se ignoran y_train, y_val, batch_size,
+    data_augmentation y augmentation.
+    
+    Con arreglos y aumento de datos, los lotes se preparan con tf.data: las
+    transformaciones aleatorias se aplican por lotes en paralelo mientras el
+    modelo entrena con el lote anterior.
+    
+    Con initial_epoch > 0 el entrenamiento continúa una ejecución reanudada:
+    se entrenan solo las épocas que faltan hasta epochs.
+    
     Args:
         model: Modelo de Keras a entrenar
-        X_train: Datos de entrenamiento
+        X_train: Datos de entrenamiento o dataset de entrenamiento
         y_train: Etiquetas de entrenamiento
-        X_val: Datos de validación (opcional)
+        X_val: Datos o dataset de validación (opcional)
         y_val: Etiquetas de validación (opcional)
         batch_size: Tamaño del lote para entrenamiento
         epochs: Número de épocas para entrenar
         data_augmentation: Si se debe usar aumento de datos
         callbacks: Lista de callbacks para el entrenamiento
+        augmentation: Opciones de aumento de datos (ver parse_augmentation_options;
+            None para las de por defecto)
+        initial_epoch: Épocas ya entrenadas (restauradas de un checkpoint)
     
     Returns:
-        Historial de entrenamiento
+        Historial de entrenamiento (solo de las épocas de esta llamada)
     """
+    # Entrada en streaming: el dataset ya está agrupado en lotes
+    if isinstance(X_train, tf.data.Dataset):
+        return model.fit(
+            X_train,
+            epochs=epochs,
+            initial_epoch=initial_epoch,
+            validation_data=X_val,
+            callbacks=callbacks
+        )
+    
     # Determinar si usar validación
     validation_data = None
     if X_val is not None and y_val is not None:
@@ -152,21 +257,19 @@ def train_cnn_model(
     
     # Configurar aumento de datos si está habilitado
     if data_augmentation:
-        datagen = ImageDataGenerator(
-            rotation_range=20,
-            width_shift_range=0.2,
-            height_shift_range=0.2,
-            shear_range=0.2,
-            zoom_range=0.2,
-            horizontal_flip=True,
-            fill_mode='nearest'
+        # Lotes leídos del arreglo por índices y aumentados en los hilos de tf.data
+        train_dataset = build_array_dataset(
+            X_train, np.arange(len(X_train)), y_train,
+            batch_size=batch_size, training=True,
+            data_augmentation=True, augmentation=augmentation
         )
-        datagen.fit(X_train)
+        if validation_data is not None:
+            validation_data = build_array_dataset(X_val, np.arange(len(X_val)), y_val, batch_size=batch_size)
         
-        # Entrenar con generador de datos
         history = model.fit(
-            datagen.flow(X_train, y_train, batch_size=batch_size),
+            train_dataset,
             epochs=epochs,
+            initial_epoch=initial_epoch,
             validation_data=validation_data,
             callbacks=callbacks
         )
@@ -176,30 +279,42 @@ def train_cnn_model(
             X_train, y_train,
             batch_size=batch_size,
             epochs=epochs,
+            initial_epoch=initial_epoch,
             validation_data=validation_data,
             callbacks=callbacks
         )
     
     return history
 
-def evaluate_cnn_model(model, X_test, y_test):
+def evaluate_cnn_model(model, X_test, y_test=None):
     """
     Evalúa un modelo CNN en datos de prueba
     
     Args:
         model: Modelo de Keras entrenado
-        X_test: Datos de prueba
-        y_test: Etiquetas de prueba
+        X_test: Datos de prueba o tf.data.Dataset de lotes (imagen, etiqueta)
+        y_test: Etiquetas de prueba (se ignoran si X_test es un dataset)
     
     Returns:
         Diccionario con métricas de evaluación
     """
-    # Evaluar el modelo
-    loss, accuracy = model.evaluate(X_test, y_test, verbose=0)
-    
-    # Hacer predicciones
-    y_pred = model.predict(X_test)
-    y_pred_classes = np.argmax(y_pred, axis=1)
+    if isinstance(X_test, tf.data.Dataset):
+        # Evaluar y predecir lote a lote sin materializar las imágenes
+        loss, accuracy = model.evaluate(X_test, verbose=0)
+        predictions = []
+        labels = []
+        for images, batch_labels in X_test:
+            predictions.append(model.predict_on_batch(images))
+            labels.append(batch_labels.numpy())
+        y_test = np.concatenate(labels)
+        y_pred_classes = np.argmax(np.concatenate(predictions), axis=1)
+    else:
+        # Evaluar el modelo
+        loss, accuracy = model.evaluate(X_test, y_test, verbose=0)
+        
+        # Hacer predicciones
+        y_pred = model.predict(X_test)
+        y_pred_classes = np.argmax(y_pred, axis=1)
     
     # Calcular métricas adicionales
     class_report = classification_report(y_test, y_pred_classes, output_dict=True)
@@ -234,6 +349,26 @@ def predict_image(model, image, preprocess_func=None):
         image = preprocess_func(image)
     
     # Realizar predicción
-    prediction = model.predict(image)
+    prediction = run_inference(model, image)
     
-    return prediction
\ No newline at end of file
+    return prediction
+
+def predict_batch(model, images, batch_size=32, preprocess_func=None):
+    """
+    Realiza predicciones sobre un lote de imágenes en una sola pasada por bloques
+    
+    Args:
+        model: Modelo CNN entrenado
+        images: Array de imágenes (N, altura, anchura, canales) ya preprocesadas
+        batch_size: Número de imágenes procesadas en cada paso del modelo
+        preprocess_func: Función de preprocesamiento opcional
+    
+    Returns:
+        Array con las probabilidades de cada clase para cada imagen
+    """
+    # Aplicar preprocesamiento si se proporciona
+    if preprocess_func is not None:
+        images = preprocess_func(images)
+    
+    # Realizar predicción
+    return run_inference(model, images, batch_size=batch_size)
\ No newline at end of file
@@ -0,0 +1,85 @@
+import numpy as np
+import tensorflow as tf
+from keras import layers
+from keras.utils import register_keras_serializable
+
+# Escala de entrada de un modelo guardado (campo 'input_scaling' de los metadatos):
+# 'raw' recibe píxeles uint8 en [0,255] y los normaliza dentro del grafo;
+# los modelos anteriores, sin el campo, esperan imágenes float32 en [0,1]
+INPUT_SCALING_RAW = 'raw'
+INPUT_SCALING_UNIT = 'unit'
+
+# Preprocesamiento de cada arquitectura (el mismo de keras.applications)
+ARCHITECTURE_PREPROCESSING = {
+    'custom': 'rescale',
+    'mobilenet': 'tf',
+    'vgg16': 'caffe',
+    'resnet50': 'caffe'
+}
+
+# Media de ImageNet por canal (BGR) que restan VGG16 y ResNet50
+CAFFE_MEAN_BGR = (103.939, 116.779, 123.68)
+
+@register_keras_serializable(package='ml_backend')
+class PixelPreprocessing(layers.Layer):
+    """
+    Capa que convierte píxeles en bruto al rango que espera cada arquitectura.
+
+    Al formar parte del modelo, los conjuntos de imágenes se mantienen en uint8
+    (una cuarta parte de la memoria de float32) y el modelo guardado en .h5 o
+    exportado a TFLite acepta directamente los píxeles decodificados.
+
+    Modos:
+        'rescale': [0,255] -> [0,1]
+        'tf': [0,255] -> [-1,1] (MobileNetV2)
+        'caffe': RGB -> BGR y resta de la media de ImageNet (VGG16, ResNet50)
+    """
+
+    def __init__(self, mode='rescale', **kwargs):
+        super().__init__(**kwargs)
+        if mode not in ('rescale', 'tf', 'caffe'):
+            raise ValueError(f"Modo de preprocesamiento no soportado: '{mode}'")
+        self.mode = mode
+
+    def call(self, inputs):
+        images = tf.cast(inputs, self.compute_dtype)
+        if self.mode == 'rescale':
+            return images / 255.0
+        if self.mode == 'tf':
+            return images / 127.5 - 1.0
+        return images[..., ::-1] - tf.constant(CAFFE_MEAN_BGR, dtype=images.dtype)
+
+    def get_config(self):
+        config = super().get_config()
+        config['mode'] = self.mode
+        return config
+
+def create_preprocessing_layer(architecture):
+    """
+    Crea la capa de preprocesamiento de una arquitectura
+
+    Args:
+        architecture: 'custom', 'mobilenet', 'vgg16' o 'resnet50'
+
+    Returns:
+        Capa PixelPreprocessing
+    """
+    return PixelPreprocessing(ARCHITECTURE_PREPROCESSING.get(architecture, 'rescale'), name='preprocessing')
+
+def prepare_model_input(images, metadata):
+    """
+    Adapta imágenes uint8 a la escala de entrada de un modelo guardado
+
+    Los modelos con 'input_scaling' igual a 'raw' reciben los píxeles tal cual;
+    los modelos anteriores reciben las imágenes normalizadas a [0,1] en float32.
+
+    Args:
+        images: Arreglo uint8 (altura, anchura, 3) o (N, altura, anchura, 3)
+        metadata: Metadatos del modelo
+
+    Returns:
+        Arreglo listo para el modelo
+    """
+    if (metadata or {}).get('input_scaling') == INPUT_SCALING_RAW:
+        return images
+    return np.true_divide(images, 255.0, dtype=np.float32)
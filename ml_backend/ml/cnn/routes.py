@@ -5,19 +5,558 @@ import numpy as np
 import logging
 import base64
 import shutil
+import time
+import zipfile
 from flask import Blueprint, request, jsonify, current_app
 from werkzeug.utils import secure_filename
 from flask_jwt_extended import jwt_required, get_jwt_identity
 
 from auth.models import User
 from auth.utils import testing_required, user_required, admin_required, validate_file_extension
-from ml.common.data import extract_zip_images_with_classes, prepare_image_data, split_data
-from ml.common.model_storage import save_tensorflow_model, load_tensorflow_model, list_models, delete_model
-from .model import create_cnn_model, train_cnn_model, evaluate_cnn_model, predict_image
+from ml.common.data import (
+    extract_zip_images_with_classes, prepare_image_data, split_data,
+    load_image_from_bytes, list_zip_image_members,
+    index_zip_images, check_zip_limits, prepare_zip_image_data, ZipLimitError,
+    probe_zip_images, check_decode_failures, ImageDecodeError
+)
+from ml.common.dataset_cache import dataset_cache, save_upload_with_hash
+from ml.common.model_storage import save_tensorflow_model, list_models, delete_model, update_model_metadata
+from ml.common.model_cache import model_cache
+from ml.common.name_index import model_name_index, AmbiguousModelNameError
+from ml.common.result_cache import prediction_cache, hash_bytes
+from ml.common.responses import parse_response_options, build_response, summarize_metadata, encode_image
+from .model import create_cnn_model, train_cnn_model, evaluate_cnn_model, predict_image, predict_batch
+from .inference import inference_dispatcher
+from .preprocessing import INPUT_SCALING_RAW, prepare_model_input
+from .weights import weights_store
+from .runs import run_store, RunNotResumableError
+from .embeddings import (
+    embedding_cache, supports_embedding_training, split_frozen_model, extract_embeddings, embed_images
+)
+from .dataset import (
+    INPUT_PIPELINES, build_image_dataset, build_array_dataset, get_shuffle_buffer, parse_augmentation_options
+)
+from ml.jobs.manager import job_manager, JobQueueFullError, JobCancelledError
+from ml.jobs.resources import resource_scheduler, estimate_cnn_job, ResourceRejectedError
+from ml.jobs.progress import PHASE_LOADING, PHASE_TRAINING, PHASE_EVALUATING, PHASE_SAVING
+from .tflite import TFLITE_MODES, CALIBRATION_SAMPLES, export_tflite
 
 # Crear blueprint para rutas de CNN
 cnn_bp = Blueprint('cnn', __name__, url_prefix='/api/ml/cnn')
 
+# Configurar logging para depuración
+logger = logging.getLogger(__name__)
+
+# Fallos de decodificación incluidos en el resultado de un entrenamiento
+MAX_REPORTED_IMAGE_FAILURES = 100
+
+# Motores de inferencia disponibles para las predicciones
+SERVING_RUNTIMES = ('keras', 'tflite')
+
+# Campos incluidos por defecto (perfil 'compact') en las respuestas de predicción
+PREDICT_COMPACT_FIELDS = ('model_name', 'prediction', 'runtime', 'cached', 'model')
+BATCH_COMPACT_FIELDS = (
+    'model_name', 'count', 'processed', 'failed', 'batch_size', 'runtime', 'results', 'throughput', 'model'
+)
+
+def _parse_tflite_mode(value):
+    """
+    Valida el modo de exportación TFLite solicitado
+
+    Args:
+        value: 'none', 'dynamic' o 'int8'
+
+    Returns:
+        Modo de cuantización o None si no se debe exportar
+    """
+    mode = (value or 'none').lower()
+    if mode == 'none':
+        return None
+    if mode not in TFLITE_MODES:
+        raise ValueError(f"tflite_export debe ser 'none' o uno de: {', '.join(TFLITE_MODES)}")
+    return mode
+
+def _export_tflite_with_metadata(model, model_path, metadata, mode, calibration_images, X_eval=None, y_eval=None):
+    """
+    Exporta un modelo guardado a TFLite y registra el resultado en sus metadatos
+
+    Un fallo en la exportación no invalida el modelo de Keras ya guardado: el
+    error queda registrado en los metadatos.
+
+    Returns:
+        Información de la exportación
+    """
+    try:
+        metadata['tflite'] = export_tflite(model, model_path, mode, calibration_images, X_eval, y_eval)
+    except Exception as e:
+        logger.exception(f"Error al exportar a TFLite el modelo '{model_path}'")
+        metadata['tflite'] = {'mode': mode, 'error': str(e)}
+
+    update_model_metadata(model_path, metadata)
+    # Los metadatos se guardan en caché junto al modelo
+    model_cache.invalidate(model_path)
+    return metadata['tflite']
+
+def _zip_ingest_limits():
+    """Límites de ingesta de los ZIP subidos (entrenamiento, predicción y calibración) según la configuración"""
+    return {
+        'max_members': current_app.config['ZIP_MAX_MEMBERS'],
+        'max_uncompressed_bytes': current_app.config['ZIP_MAX_UNCOMPRESSED_MB'] * 1024 * 1024,
+        'max_compression_ratio': current_app.config['ZIP_MAX_COMPRESSION_RATIO']
+    }
+
+def _load_serving_model(model_path, runtime):
+    """Carga el modelo desde la caché con el motor de inferencia indicado"""
+    if runtime == 'tflite':
+        return model_cache.get_tflite_model(model_path)
+    return model_cache.get_tensorflow_model(model_path)
+
+def _training_result(model_name, model_path, evaluation, training_run, tflite_info):
+    """Resultado de un entrenamiento, tal como lo devuelve el trabajo"""
+    history = training_run.history
+    best = training_run.state['best']
+    return {
+        'success': True,
+        'message': 'Modelo entrenado correctamente',
+        'model_name': model_name,
+        'model_path': model_path,
+        'run_id': training_run.run_id,
+        'epochs_trained': len(history.get('loss', [])),
+        'best_epoch': best['epoch'] if best else None,
+        'evaluation': evaluation,
+        'tflite': tflite_info,
+        'history': {
+            'accuracy': [float(acc) for acc in history.get('accuracy', [])],
+            'loss': [float(loss) for loss in history.get('loss', [])],
+            'val_accuracy': [float(acc) for acc in history.get('val_accuracy', [])],
+            'val_loss': [float(loss) for loss in history.get('val_loss', [])]
+        }
+    }
+
+def _embedding_training_data(extractor, X_train, y_train, X_test, y_test, batch_size):
+    """
+    Calcula los embeddings de entrenamiento y prueba con el extractor de la base congelada
+
+    Returns:
+        Tupla (E_train, y_train, E_test, y_test); con datasets las etiquetas
+        son las de sus lotes, en el orden de los embeddings
+    """
+    E_train, y_train = extract_embeddings(extractor, X_train, y_train, batch_size=batch_size)
+    E_test, y_test = extract_embeddings(extractor, X_test, y_test, batch_size=batch_size)
+    return E_train, y_train, E_test, y_test
+
+def _parse_run_options(values):
+    """
+    Valida las opciones de checkpoints y parada temprana de una ejecución
+
+    Args:
+        values: Parámetros de la solicitud (JSON o form-data)
+
+    Returns:
+        Diccionario con 'checkpoint_every', 'early_stopping_patience' y
+        'keep_data' (conservar checkpoints y datos aunque venza la retención)
+
+    Raises:
+        ValueError: Si alguna opción no es válida
+    """
+    checkpoint_every = int(values.get('checkpoint_every', run_store.checkpoint_every))
+    if checkpoint_every < 1:
+        raise ValueError("checkpoint_every debe ser al menos 1")
+    patience = int(values.get('early_stopping_patience', run_store.early_stopping_patience))
+    if patience < 0:
+        raise ValueError("early_stopping_patience no puede ser negativo (0 desactiva la parada temprana)")
+    keep_data = str(values.get('keep_run_data', 'false')).lower() == 'true'
+    return {'checkpoint_every': checkpoint_every, 'early_stopping_patience': patience, 'keep_data': keep_data}
+
+def _run_estimate(spec):
+    """Estimación de recursos del entrenamiento de una ejecución"""
+    streaming = spec.get('input_pipeline') == 'stream'
+    return estimate_cnn_job(
+        spec['num_images'], spec['model_params'], spec['train_params'],
+        streaming_buffer=get_shuffle_buffer() if streaming else None
+    )
+
+def _fit_run(job, training_run, model, fit_model, fit_train, fit_y_train, fit_test, fit_y_test):
+    """
+    Entrena el modelo de una ejecución desde su último checkpoint
+
+    Args:
+        model: Modelo completo de la ejecución (el que se guarda)
+        fit_model: Modelo que entrena model.fit: el mismo o la cabeza de embeddings
+    """
+    train_params = training_run.spec['train_params']
+    initial_epoch = training_run.restore(model)
+    if initial_epoch:
+        job.set_phase(PHASE_TRAINING, f'Reanudando el entrenamiento desde la época {initial_epoch}')
+    else:
+        job.set_phase(PHASE_TRAINING, 'Entrenando el modelo')
+
+    # Los checkpoints y la parada temprana van antes que la cancelación y el progreso del trabajo
+    callbacks = training_run.keras_callbacks(model) + job.keras_callbacks(len(fit_y_train), train_params['batch_size'])
+    train_cnn_model(
+        fit_model, fit_train, fit_y_train, fit_test, fit_y_test,
+        callbacks=callbacks, initial_epoch=initial_epoch, **train_params
+    )
+    job.check_cancelled()
+
+def _run_metadata(training_run):
+    """Metadatos comunes del modelo de una ejecución"""
+    spec = training_run.spec
+    best = training_run.state['best']
+    return {
+        'model_name': spec['model_name'],
+        'model_type': 'cnn',
+        'model_params': spec['model_params'],
+        'train_params': spec['train_params'],
+        'test_size': spec['test_size'],
+        'created_by': spec['created_by'],
+        'data_type': spec['data_type'],
+        'input_scaling': INPUT_SCALING_RAW,
+        'training_mode': 'embeddings' if spec['use_embeddings'] else 'end_to_end',
+        'run_id': training_run.run_id,
+        'epochs_trained': len(training_run.history.get('loss', [])),
+        'best_epoch': best['epoch'] if best else None,
+        'early_stopping_patience': spec['early_stopping_patience']
+    }
+
+def _train_test_run(job, training_run):
+    """Entrena, o continúa desde su último checkpoint, una ejecución con datos de prueba"""
+    spec = training_run.spec
+    model_params, train_params = spec['model_params'], spec['train_params']
+    num_samples = spec['num_images']
+    img_height, img_width = model_params['input_shape'][:2]
+    
+    job.set_phase(PHASE_LOADING, 'Generando datos de prueba')
+    
+    # Crear datos de prueba aleatorios (píxeles uint8, como las imágenes reales) con
+    # la semilla de la ejecución: al reanudarla se generan y dividen igual
+    rng = np.random.default_rng(spec['seed'])
+    X = rng.integers(0, 256, size=(num_samples, img_height, img_width, 3), dtype=np.uint8)
+    y = rng.integers(0, model_params['num_classes'], size=num_samples)
+    
+    # Dividir datos en entrenamiento y prueba
+    X_train, X_test, y_train, y_test = split_data(X, y, test_size=spec['test_size'], random_state=spec['seed'])
+    
+    model = create_cnn_model(**model_params)
+    fit_model, fit_train, fit_y_train, fit_test, fit_y_test = model, X_train, y_train, X_test, y_test
+    if spec['use_embeddings']:
+        # La base congelada se ejecuta una sola vez; se entrena la cabeza del mismo modelo
+        job.set_phase(PHASE_LOADING, 'Calculando los embeddings de la base congelada')
+        extractor, fit_model = split_frozen_model(model)
+        fit_train, fit_y_train, fit_test, fit_y_test = _embedding_training_data(
+            extractor, X_train, y_train, X_test, y_test, train_params['batch_size']
+        )
+        job.check_cancelled()
+    
+    # Entrenar el modelo con checkpoints, publicando el progreso por lote y época
+    _fit_run(job, training_run, model, fit_model, fit_train, fit_y_train, fit_test, fit_y_test)
+    
+    # Evaluar el modelo (la cabeza sobre los embeddings da las mismas métricas)
+    job.set_phase(PHASE_EVALUATING, 'Evaluando el modelo')
+    evaluation = evaluate_cnn_model(fit_model, fit_test, fit_y_test)
+    
+    # Metadatos del modelo
+    metadata = _run_metadata(training_run)
+    metadata['accuracy'] = float(evaluation['accuracy'])
+    metadata['loss'] = float(evaluation['loss'])
+    
+    # Guardar el modelo
+    job.set_phase(PHASE_SAVING, 'Guardando el modelo')
+    model_path = save_tensorflow_model(
+        model,
+        spec['model_name'],
+        current_app.config['CNN_MODELS_FOLDER'],
+        metadata
+    )
+    
+    # Exportar a TFLite calibrando con una muestra de las imágenes de entrenamiento
+    tflite_info = None
+    if spec['tflite_mode']:
+        tflite_info = _export_tflite_with_metadata(
+            model, model_path, metadata, spec['tflite_mode'], X_train, X_test, y_test
+        )
+    
+    return _training_result(spec['model_name'], model_path, evaluation, training_run, tflite_info)
+
+def _train_real_run(job, training_run, zip_index=None, cached_dataset=None):
+    """
+    Entrena, o continúa desde su último checkpoint, una ejecución con un ZIP de imágenes
+
+    Args:
+        job: JobContext del trabajo
+        training_run: Ejecución con el ZIP conservado en su directorio
+        zip_index: Tupla (miembros, etiquetas, clases de las carpetas) del ZIP ya
+            indexado (None para indexarlo)
+        cached_dataset: Entrada de la caché de conjuntos de imágenes ya abierta
+    """
+    spec = training_run.spec
+    model_params, train_params = spec['model_params'], spec['train_params']
+    input_height, input_width = spec['input_height'], spec['input_width']
+    input_pipeline = spec['input_pipeline']
+    augmentation = train_params['augmentation']
+    dataset_key = spec['dataset_key']
+    zip_path = training_run.data_path
+    extract_dir = training_run.extract_dir
+    # Las claves del mapeo de clases son cadenas tras guardar la ejecución en JSON
+    class_mapping = {int(idx): name for idx, name in spec['class_mapping'].items()}
+    
+    job.set_phase(PHASE_LOADING, f"Cargando {spec['num_images']} imágenes")
+    failed_images = []
+    
+    # Al reanudar, las imágenes pueden seguir decodificadas en la caché
+    dataset = cached_dataset
+    if dataset is None and zip_index is None:
+        dataset = dataset_cache.get(dataset_key)
+        if dataset is None:
+            with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+                zip_index = index_zip_images(zip_ref, **_zip_ingest_limits())
+    members, labels, folder_classes = zip_index or (None, None, None)
+    
+    # Decodificar las imágenes una sola vez en la caché de conjuntos de imágenes
+    if dataset is None and dataset_key is not None:
+        dataset = dataset_cache.build(
+            dataset_key, zip_path, members, labels, folder_classes, input_height, input_width
+        )
+        job.check_cancelled()
+    
+    # La semilla de la ejecución hace que al reanudarla la división sea la misma
+    if dataset is not None:
+        # Imágenes uint8 en un memmap: se dividen índices y no imágenes
+        images = dataset['images']
+        failed_images = list(dataset['failed_images'])
+        num_failed = dataset['num_failed']
+        train_index, test_index, y_train, y_test = split_data(
+            np.arange(len(images)), dataset['labels'], test_size=spec['test_size'], random_state=spec['seed']
+        )
+        
+        if input_pipeline == 'stream':
+            X_train = build_array_dataset(
+                images, train_index, y_train,
+                batch_size=train_params['batch_size'], training=True,
+                data_augmentation=train_params['data_augmentation'],
+                augmentation=augmentation
+            )
+            X_test = build_array_dataset(images, test_index, y_test, batch_size=train_params['batch_size'])
+        elif spec['use_embeddings']:
+            # Los embeddings se leen de su caché: las imágenes no se copian
+            X_train = X_test = None
+        else:
+            # Copia uint8: el modelo normaliza las imágenes dentro del grafo
+            X_train = images[train_index]
+            X_test = images[test_index]
+        load_samples = lambda count: (
+            images[train_index[:count]], images[test_index[:count]], y_test[:count]
+        )
+    else:
+        # Dividir las imágenes con las etiquetas de sus carpetas en entrenamiento y prueba
+        train_members, test_members, y_train, y_test = split_data(
+            members, labels, test_size=spec['test_size'], random_state=spec['seed']
+        )
+        
+        if input_pipeline == 'stream':
+            # tf.data lee archivos: extraer solo las imágenes indexadas
+            image_paths, _, _ = extract_zip_images_with_classes(
+                zip_path, extract_dir, members=train_members + test_members
+            )
+            train_paths, test_paths = image_paths[:len(train_members)], image_paths[len(train_members):]
+            job.check_cancelled()
+            
+            # Las imágenes se decodifican en paralelo durante la primera época
+            # y se guardan decodificadas en una caché dentro del directorio temporal
+            cache_dir = os.path.join(extract_dir, '.tfdata_cache')
+            X_train = build_image_dataset(
+                train_paths, y_train, input_height, input_width,
+                batch_size=train_params['batch_size'], training=True,
+                data_augmentation=train_params['data_augmentation'],
+                augmentation=augmentation,
+                cache_path=os.path.join(cache_dir, 'train')
+            )
+            X_test = build_image_dataset(
+                test_paths, y_test, input_height, input_width,
+                batch_size=train_params['batch_size'],
+                cache_path=os.path.join(cache_dir, 'test')
+            )
+            load_samples = lambda count: (
+                prepare_image_data(train_paths[:count], input_height, input_width)[0],
+                *prepare_image_data(test_paths[:count], input_height, input_width, y_test[:count])
+            )
+        else:
+            # Decodificar las imágenes directamente desde el ZIP (las que no se
+            # pueden decodificar quedan en negro)
+            X_train, y_train = prepare_zip_image_data(
+                zip_path, train_members, input_height, input_width, y_train, failures=failed_images
+            )
+            X_test, y_test = prepare_zip_image_data(
+                zip_path, test_members, input_height, input_width, y_test, failures=failed_images
+            )
+        num_failed = len(failed_images)
+    
+    # Con demasiadas imágenes en negro el modelo no aprendería nada útil
+    check_decode_failures(
+        num_failed, spec['num_images'], current_app.config['IMAGE_MAX_FAILED_FRACTION'],
+        failed_images[:MAX_REPORTED_IMAGE_FAILURES]
+    )
+    job.check_cancelled()
+    
+    model = create_cnn_model(**model_params)
+    fit_model, fit_train, fit_y_train, fit_test, fit_y_test = model, X_train, y_train, X_test, y_test
+    if spec['use_embeddings']:
+        # La base congelada se ejecuta una sola vez; se entrena la cabeza del mismo modelo
+        job.set_phase(PHASE_LOADING, 'Calculando los embeddings de la base congelada')
+        extractor, fit_model = split_frozen_model(model)
+        if dataset is not None:
+            # Embeddings de todo el conjunto, reutilizables por otros entrenamientos
+            embeddings = embed_images(
+                extractor, images, train_params['batch_size'],
+                cache_key=embedding_cache.make_key(
+                    dataset_key, model_params['architecture'],
+                    weights_store.fingerprint(model_params['architecture'], model_params['input_shape'])
+                )
+            )
+            fit_train, fit_test = embeddings[train_index], embeddings[test_index]
+        else:
+            fit_train, fit_y_train, fit_test, fit_y_test = _embedding_training_data(
+                extractor, X_train, y_train, X_test, y_test, train_params['batch_size']
+            )
+        job.check_cancelled()
+    
+    # Entrenar el modelo con checkpoints, publicando el progreso por lote y época
+    _fit_run(job, training_run, model, fit_model, fit_train, fit_y_train, fit_test, fit_y_test)
+    
+    # Evaluar el modelo (la cabeza sobre los embeddings da las mismas métricas)
+    job.set_phase(PHASE_EVALUATING, 'Evaluando el modelo')
+    evaluation = evaluate_cnn_model(fit_model, fit_test, fit_y_test)
+    
+    # Metadatos del modelo
+    metadata = _run_metadata(training_run)
+    metadata.update({
+        'accuracy': float(evaluation['accuracy']),
+        'loss': float(evaluation['loss']),
+        'num_images': spec['num_images'],
+        'input_pipeline': input_pipeline,
+        'failed_images': num_failed,
+        'class_mapping': class_mapping,
+        'class_names': list(class_mapping.values())
+    })
+    
+    # Guardar el modelo
+    job.set_phase(PHASE_SAVING, 'Guardando el modelo')
+    model_path = save_tensorflow_model(
+        model,
+        spec['model_name'],
+        current_app.config['CNN_MODELS_FOLDER'],
+        metadata
+    )
+    
+    # Exportar a TFLite calibrando con una muestra de las imágenes de entrenamiento
+    tflite_info = None
+    if spec['tflite_mode']:
+        if not isinstance(X_train, np.ndarray):
+            # Cargar en memoria solo las muestras de calibración y comparación
+            X_train, X_test, y_test = load_samples(CALIBRATION_SAMPLES)
+        tflite_info = _export_tflite_with_metadata(
+            model, model_path, metadata, spec['tflite_mode'], X_train, X_test, y_test
+        )
+    
+    result = _training_result(spec['model_name'], model_path, evaluation, training_run, tflite_info)
+    # Imágenes del ZIP que no se pudieron decodificar
+    result['failed_images'] = failed_images[:MAX_REPORTED_IMAGE_FAILURES]
+    return result
+
+def _run_job(training_run, train):
+    """
+    Función de trabajo que ejecuta un tramo de una ejecución y actualiza su estado
+
+    Si el tramo falla o se cancela, la ejecución queda interrumpida y se puede
+    reanudar desde su último checkpoint. Al terminar el tramo se aplica la
+    política de retención de las ejecuciones.
+
+    Args:
+        training_run: Ejecución a entrenar
+        train: Función (job, training_run) que entrena y devuelve el resultado
+    """
+    def run(job):
+        try:
+            result = train(job, training_run)
+        except JobCancelledError:
+            training_run.interrupt('Cancelado por el usuario')
+            raise
+        except Exception as e:
+            training_run.interrupt(str(e))
+            raise
+        else:
+            training_run.complete(result['model_path'])
+            return result
+        finally:
+            try:
+                run_store.enforce_retention()
+            except Exception:
+                # La retención no debe cambiar el resultado del entrenamiento
+                logger.exception("Error al aplicar la retención de las ejecuciones de entrenamiento")
+    return run
+
+def _submit_training_job(data_type, created_by, training_run, train, cleanup=None):
+    """
+    Encola un tramo de una ejecución CNN y construye la respuesta 202 con el trabajo creado
+
+    Si no se puede encolar, o el trabajo termina sin llegar a entrenar (cancelado
+    en cola o mientras espera recursos), la ejecución queda interrumpida.
+
+    Args:
+        training_run: Ejecución a entrenar (nueva o reanudada)
+        train: Función (job, training_run) que entrena y devuelve el resultado
+
+    Raises:
+        ResourceRejectedError: Si el entrenamiento no cabe en los recursos del servidor
+        JobQueueFullError: Si no se admiten más trabajos pendientes
+    """
+    model_name = training_run.spec['model_name']
+    try:
+        resources = resource_scheduler.check(_run_estimate(training_run.spec))
+        training_run.start()
+        job = job_manager.submit(
+            'cnn', data_type, _run_job(training_run, train), created_by=created_by, model_name=model_name,
+            cleanup=cleanup, resources=resources,
+            on_cancel=lambda: training_run.interrupt('El trabajo terminó antes de iniciar el entrenamiento')
+        )
+    except Exception as e:
+        training_run.interrupt(str(e))
+        raise
+    training_run.attach_job(job.id)
+
+    return jsonify({
+        'success': True,
+        'message': 'Entrenamiento encolado',
+        'job_id': job.id,
+        'status': job.status,
+        'model_name': model_name,
+        'run_id': training_run.run_id,
+        'resume_from_epoch': training_run.state['checkpoint_epoch'],
+        'resources': resources,
+        'status_url': f"/api/ml/jobs/{job.id}",
+        'run_url': f"/api/ml/cnn/runs/{training_run.run_id}"
+    }), 202
+
+def _get_visible_run(run_id):
+    """
+    Busca una ejecución visible para el usuario actual (su creador o un administrador)
+
+    Returns:
+        TrainingRun o None si no existe o el usuario no puede verla
+    """
+    training_run = run_store.get(run_id)
+    if training_run is None:
+        return None
+
+    identity = get_jwt_identity()
+    if str(training_run.spec['created_by']) == str(identity):
+        return training_run
+
+    user = User.query.get(identity)
+    if user and user.has_role('Administrador'):
+        return training_run
+    return None
+
 # Rutas para entrenamiento con datos de prueba (rol Testing)
 @cnn_bp.route('/train/test', methods=['POST'])
 @jwt_required()
@@ -37,6 +576,18 @@ def train_with_test_data():
         if test_size <= 0 or test_size >= 1:
             return jsonify({"error": "test_size debe estar entre 0 y 1"}), 400
         
+        # Exportación opcional a TFLite tras el entrenamiento
+        try:
+            tflite_mode = _parse_tflite_mode(data.get('tflite_export'))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        
+        # Checkpoints periódicos y parada temprana sobre val_loss
+        try:
+            run_options = _parse_run_options(data)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        
         # Obtener hiperparámetros para el modelo
         model_params = {
             'input_shape': data.get('input_shape', (224, 224, 3)),
@@ -50,80 +601,60 @@ def train_with_test_data():
             'learning_rate': float(data.get('learning_rate', 0.001))
         }
         
+        # Opciones de aumento de datos (rotation_range, desplazamientos, zoom y volteos)
+        try:
+            augmentation = parse_augmentation_options(data)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        
         # Parámetros para el entrenamiento
         train_params = {
             'batch_size': int(data.get('batch_size', 32)),
             'epochs': int(data.get('epochs', 10)),
-            'data_augmentation': bool(data.get('data_augmentation', True))
+            'data_augmentation': bool(data.get('data_augmentation', True)),
+            'augmentation': augmentation
         }
         
-        # Cargar datos de prueba (simular imágenes y etiquetas)
-        num_samples = int(data.get('num_samples', 100))
-        img_height, img_width = model_params['input_shape'][:2]
-        
-        # Crear datos de prueba aleatorios
-        X = np.random.rand(num_samples, img_height, img_width, 3)
-        y = np.random.randint(0, model_params['num_classes'], size=num_samples)
+        # Base congelada sin aumento de datos: entrenar solo la cabeza sobre embeddings
+        use_embeddings = bool(data.get('embedding_training', current_app.config['CNN_EMBEDDING_TRAINING'])) \
+            and supports_embedding_training(model_params, train_params)
         
-        # Dividir datos en entrenamiento y prueba
-        X_train, X_test, y_train, y_test = split_data(X, y, test_size=test_size)
-        
-        # Crear y compilar el modelo
-        model = create_cnn_model(**model_params)
-        
-        # Entrenar el modelo
-        history = train_cnn_model(
-            model, X_train, y_train, X_test, y_test, **train_params
-        )
-        
-        # Evaluar el modelo
-        evaluation = evaluate_cnn_model(model, X_test, y_test)
-        
-        # Guardar el modelo si se proporciona un nombre
         model_name = data.get('model_name', f'cnn_test_{uuid.uuid4().hex[:8]}')
+        created_by = get_jwt_identity()
         
-        # Metadatos del modelo
-        metadata = {
+        # Todo lo necesario para repetir o reanudar el entrenamiento (datos de prueba con semilla)
+        training_run = run_store.create({
             'model_name': model_name,
-            'model_type': 'cnn',
+            'created_by': created_by,
+            'data_type': 'test',
             'model_params': model_params,
             'train_params': train_params,
             'test_size': test_size,
-            'accuracy': float(evaluation['accuracy']),
-            'loss': float(evaluation['loss']),
-            'created_by': get_jwt_identity(),
-            'data_type': 'test'
-        }
-        
+            'num_images': int(data.get('num_samples', 100)),
+            'seed': uuid.uuid4().int % (2 ** 32),
+            'use_embeddings': use_embeddings,
+            'tflite_mode': tflite_mode,
+            **run_options
+        })
+        
+        # Entrenar en segundo plano si los recursos estimados caben en el servidor
         try:
-            # Guardar el modelo
-            model_path = save_tensorflow_model(
-                model, 
-                model_name, 
-                current_app.config['CNN_MODELS_FOLDER'],
-                metadata
-            )
-            
-            # Devolver resultados
-            return jsonify({
-                'success': True,
-                'message': 'Modelo entrenado correctamente',
-                'model_name': model_name,
-                'model_path': model_path,
-                'evaluation': evaluation,
-                'history': {
-                    'accuracy': [float(acc) for acc in history.history['accuracy']],
-                    'loss': [float(loss) for loss in history.history['loss']],
-                    'val_accuracy': [float(acc) for acc in history.history.get('val_accuracy', [])],
-                    'val_loss': [float(loss) for loss in history.history.get('val_loss', [])]
-                }
-            }), 200
-        except ValueError as e:
-            return jsonify({
-                'success': False,
-                'error': str(e)
-            }), 400
+            return _submit_training_job('test', created_by, training_run, _train_test_run)
+        except Exception:
+            run_store.delete(training_run.run_id)
+            raise
     
+    except ResourceRejectedError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'resources': e.estimate
+        }), 413
+    except JobQueueFullError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 503
     except Exception as e:
         return jsonify({
             'success': False,
@@ -151,162 +682,314 @@ def train_with_real_data():
         if not file.filename.endswith('.zip'):
             return jsonify({"error": "El archivo debe ser un ZIP"}), 400
         
-        # Guardar el archivo temporalmente
-        temp_zip_path = os.path.join(current_app.config['IMAGE_UPLOAD_FOLDER'], secure_filename(file.filename))
-        os.makedirs(os.path.dirname(temp_zip_path), exist_ok=True)
-        file.save(temp_zip_path)
-        
-        # Extraer imágenes del ZIP con detección de clases
-        extract_dir = os.path.join(current_app.config['IMAGE_UPLOAD_FOLDER'], f'extract_{uuid.uuid4().hex}')
-        image_paths, labels, class_mapping = extract_zip_images_with_classes(temp_zip_path, extract_dir)
-        
-        # Verificar si se extrajeron imágenes
-        if not image_paths:
-            return jsonify({"error": "No se encontraron imágenes en el archivo ZIP"}), 400
-        
-        # Verificar que el número de clases coincida con el parámetro (opcional)
-        num_classes_detected = len(class_mapping)
-        num_classes_param = int(request.form.get('num_classes', num_classes_detected))
-        
-        # Si el usuario especificó un número diferente de clases, usar el detectado
-        if num_classes_param != num_classes_detected:
-            logger = logging.getLogger(__name__)
-            logger.warning(f"Número de clases especificado ({num_classes_param}) difiere del detectado ({num_classes_detected}). Usando el detectado.")
-            num_classes_param = num_classes_detected
-        
-        # Obtener nombres personalizados de clases si se proporcionan
-        custom_class_names = {}
-        for i in range(num_classes_detected):
-            custom_name = request.form.get(f'class_name_{i}')
-            if custom_name and custom_name.strip():
-                custom_class_names[i] = custom_name.strip()
-        
-        # Actualizar el mapeo de clases con nombres personalizados
-        for idx, custom_name in custom_class_names.items():
-            if idx in class_mapping:
-                class_mapping[idx] = custom_name
-        
-        
-        # Obtener parámetros de entrenamiento
-        # Los parámetros pueden venir en form-data junto con el archivo
-        test_size = float(request.form.get('test_size', 0.2))
-        if test_size <= 0 or test_size >= 1:
-            return jsonify({"error": "test_size debe estar entre 0 y 1"}), 400
+        # Exportación opcional a TFLite tras el entrenamiento
+        try:
+            tflite_mode = _parse_tflite_mode(request.form.get('tflite_export'))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
         
-        # Obtener hiperparámetros para el modelo
-        # Intentar obtener desde form-data, o usar valores predeterminados
-        input_height = int(request.form.get('input_height', 224))
-        input_width = int(request.form.get('input_width', 224))
+        # Checkpoints periódicos y parada temprana sobre val_loss
+        try:
+            run_options = _parse_run_options(request.form)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        
+        # Entrada de datos: todas las imágenes en memoria o streaming con tf.data
+        input_pipeline = request.form.get('input_pipeline', current_app.config['CNN_INPUT_PIPELINE'])
+        if input_pipeline not in INPUT_PIPELINES:
+            return jsonify({"error": f"input_pipeline debe ser uno de: {', '.join(INPUT_PIPELINES)}"}), 400
+        
+        # Guardar el archivo temporalmente con un nombre único: varios trabajos
+        # pueden recibir archivos con el mismo nombre
+        upload_folder = current_app.config['IMAGE_UPLOAD_FOLDER']
+        temp_zip_path = os.path.join(upload_folder, f'{uuid.uuid4().hex}_{secure_filename(file.filename)}')
+        os.makedirs(upload_folder, exist_ok=True)
+        archive_hash = save_upload_with_hash(file, temp_zip_path)
+        training_run = None
+        
+        def cleanup():
+            # Limpiar archivos temporales (el ZIP se conserva en la ejecución para poder reanudarla)
+            if os.path.exists(temp_zip_path):
+                os.remove(temp_zip_path)
+            if training_run is not None:
+                shutil.rmtree(training_run.extract_dir, ignore_errors=True)
         
-        model_params = {
-            'input_shape': (input_height, input_width, 3),
-            'num_classes': int(request.form.get('num_classes', 2)),
-            'architecture': request.form.get('architecture', 'custom'),
-            'dropout_rate': float(request.form.get('dropout_rate', 0.5)),
-            'filters': json.loads(request.form.get('filters', '[32, 64, 128]')),
-            'kernel_size': tuple(json.loads(request.form.get('kernel_size', '[3, 3]'))),
-            'pool_size': tuple(json.loads(request.form.get('pool_size', '[2, 2]'))),
-            'dense_units': int(request.form.get('dense_units', 128)),
-            'learning_rate': float(request.form.get('learning_rate', 0.001)),
-            'num_classes': num_classes_detected
-        }
+        # El trabajo elimina los archivos temporales al terminar; si la solicitud
+        # no llega a encolarlo se eliminan aquí junto con la ejecución
+        submitted = False
+        try:
+            # Tamaño de las imágenes de entrada del modelo
+            input_height = int(request.form.get('input_height', 224))
+            input_width = int(request.form.get('input_width', 224))
+            
+            # Un entrenamiento anterior con el mismo ZIP y tamaño ya decodificó las imágenes
+            dataset_key = dataset_cache.make_key(archive_hash, input_height, input_width)
+            cached_dataset = dataset_cache.get(dataset_key)
+            
+            if cached_dataset is not None:
+                zip_index, labels = None, cached_dataset['labels']
+                class_mapping = dict(cached_dataset['class_mapping'])
+            else:
+                # Indexar las imágenes y sus clases con el directorio central del ZIP, sin extraerlo
+                try:
+                    with zipfile.ZipFile(temp_zip_path, 'r') as zip_ref:
+                        members, labels, class_mapping = index_zip_images(zip_ref, **_zip_ingest_limits())
+                except zipfile.BadZipFile:
+                    return jsonify({"error": "El archivo no es un ZIP válido"}), 400
+                except ZipLimitError as e:
+                    return jsonify({"error": str(e)}), 413
+                
+                # Verificar si el ZIP contiene imágenes
+                if not members:
+                    return jsonify({"error": "No se encontraron imágenes en el archivo ZIP"}), 400
+                zip_index = (members, labels, dict(class_mapping))
+            
+            # Rechazar los archivos cuyas imágenes no se pueden decodificar antes de
+            # encolar el entrenamiento: con la caché se conocen todos los fallos, sin
+            # ella se decodifica una muestra repartida por el archivo
+            max_failed_fraction = current_app.config['IMAGE_MAX_FAILED_FRACTION']
+            try:
+                if cached_dataset is not None:
+                    check_decode_failures(
+                        cached_dataset['num_failed'], len(labels), max_failed_fraction,
+                        cached_dataset['failed_images']
+                    )
+                else:
+                    probed, probe_failures = probe_zip_images(
+                        temp_zip_path, members, input_height, input_width,
+                        current_app.config['IMAGE_DECODE_PROBE_SAMPLES']
+                    )
+                    check_decode_failures(len(probe_failures), probed, max_failed_fraction, probe_failures)
+            except ImageDecodeError as e:
+                return jsonify({
+                    "error": str(e),
+                    "failed_images": e.failures[:MAX_REPORTED_IMAGE_FAILURES]
+                }), 400
+            
+            num_images = len(labels)
+            
+            # Verificar que el número de clases coincida con el parámetro (opcional)
+            num_classes_detected = len(class_mapping)
+            num_classes_param = int(request.form.get('num_classes', num_classes_detected))
+            
+            # Si el usuario especificó un número diferente de clases, usar el detectado
+            if num_classes_param != num_classes_detected:
+                logger = logging.getLogger(__name__)
+                logger.warning(f"Número de clases especificado ({num_classes_param}) difiere del detectado ({num_classes_detected}). Usando el detectado.")
+                num_classes_param = num_classes_detected
+            
+            # Obtener nombres personalizados de clases si se proporcionan
+            custom_class_names = {}
+            for i in range(num_classes_detected):
+                custom_name = request.form.get(f'class_name_{i}')
+                if custom_name and custom_name.strip():
+                    custom_class_names[i] = custom_name.strip()
+            
+            # Actualizar el mapeo de clases con nombres personalizados
+            for idx, custom_name in custom_class_names.items():
+                if idx in class_mapping:
+                    class_mapping[idx] = custom_name
+            
+            
+            # Obtener parámetros de entrenamiento
+            # Los parámetros pueden venir en form-data junto con el archivo
+            test_size = float(request.form.get('test_size', 0.2))
+            if test_size <= 0 or test_size >= 1:
+                return jsonify({"error": "test_size debe estar entre 0 y 1"}), 400
+            
+            # Obtener hiperparámetros para el modelo
+            # Intentar obtener desde form-data, o usar valores predeterminados
+            model_params = {
+                'input_shape': (input_height, input_width, 3),
+                'num_classes': int(request.form.get('num_classes', 2)),
+                'architecture': request.form.get('architecture', 'custom'),
+                'dropout_rate': float(request.form.get('dropout_rate', 0.5)),
+                'filters': json.loads(request.form.get('filters', '[32, 64, 128]')),
+                'kernel_size': tuple(json.loads(request.form.get('kernel_size', '[3, 3]'))),
+                'pool_size': tuple(json.loads(request.form.get('pool_size', '[2, 2]'))),
+                'dense_units': int(request.form.get('dense_units', 128)),
+                'learning_rate': float(request.form.get('learning_rate', 0.001)),
+                'num_classes': num_classes_detected
+            }
+            
+            # Opciones de aumento de datos (rotation_range, desplazamientos, zoom y volteos)
+            try:
+                augmentation = parse_augmentation_options(request.form)
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+            
+            # Parámetros para el entrenamiento
+            train_params = {
+                'batch_size': int(request.form.get('batch_size', 32)),
+                'epochs': int(request.form.get('epochs', 10)),
+                'data_augmentation': request.form.get('data_augmentation', 'true').lower() == 'true',
+                'augmentation': augmentation
+            }
+            
+            # Base congelada sin aumento de datos: entrenar solo la cabeza sobre embeddings
+            default_embedding_training = 'true' if current_app.config['CNN_EMBEDDING_TRAINING'] else 'false'
+            use_embeddings = request.form.get('embedding_training', default_embedding_training).lower() == 'true' \
+                and supports_embedding_training(model_params, train_params)
+            
+            model_name = request.form.get('model_name', f'cnn_real_{uuid.uuid4().hex[:8]}')
+            created_by = get_jwt_identity()
+            
+            # Todo lo necesario para repetir o reanudar el entrenamiento; el ZIP se
+            # conserva en el directorio de la ejecución hasta que se completa
+            training_run = run_store.create({
+                'model_name': model_name,
+                'created_by': created_by,
+                'data_type': 'real',
+                'model_params': model_params,
+                'train_params': train_params,
+                'test_size': test_size,
+                'num_images': num_images,
+                'seed': uuid.uuid4().int % (2 ** 32),
+                'use_embeddings': use_embeddings,
+                'tflite_mode': tflite_mode,
+                'input_pipeline': input_pipeline,
+                'input_height': input_height,
+                'input_width': input_width,
+                'dataset_key': dataset_key,
+                'class_mapping': class_mapping,
+                **run_options
+            })
+            shutil.move(temp_zip_path, training_run.data_path)
+            
+            # Entrenar en segundo plano si los recursos estimados caben en el servidor
+            response = _submit_training_job(
+                'real', created_by, training_run,
+                lambda job, run: _train_real_run(job, run, zip_index, cached_dataset),
+                cleanup
+            )
+            submitted = True
+            return response
+        
+        finally:
+            if not submitted:
+                cleanup()
+                if training_run is not None:
+                    run_store.delete(training_run.run_id)
+    
+    except ResourceRejectedError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'resources': e.estimate
+        }), 413
+    except JobQueueFullError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 503
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+# Rutas para las ejecuciones de entrenamiento (checkpoints y reanudación)
+@cnn_bp.route('/runs', methods=['GET'])
+@jwt_required()
+def list_training_runs():
+    """Endpoint para listar las ejecuciones de entrenamiento CNN del usuario actual"""
+    try:
+        runs = run_store.list(created_by=get_jwt_identity())
         
-        # Parámetros para el entrenamiento
-        train_params = {
-            'batch_size': int(request.form.get('batch_size', 32)),
-            'epochs': int(request.form.get('epochs', 10)),
-            'data_augmentation': request.form.get('data_augmentation', 'true').lower() == 'true'
-        }
+        return jsonify({
+            'success': True,
+            'runs': [training_run.to_dict() for training_run in runs]
+        }), 200
+    
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@cnn_bp.route('/runs/<run_id>', methods=['GET'])
+@jwt_required()
+def get_training_run(run_id):
+    """Endpoint para consultar el estado, los checkpoints y el historial de una ejecución"""
+    try:
+        training_run = _get_visible_run(run_id)
+        if training_run is None:
+            return jsonify({"error": f"Ejecución '{run_id}' no encontrada"}), 404
         
-        # Simular etiquetas para las imágenes (en un caso real vendrían con los datos)
-        # Aquí asumimos un problema de clasificación binaria por simplicidad
-        num_classes = model_params['num_classes']
-        labels = np.random.randint(0, num_classes, size=len(image_paths))
-        
-        # Preparar datos de imágenes
-        X, y = prepare_image_data(
-            image_paths, 
-            input_height, 
-            input_width, 
-            labels
-        )
+        return jsonify({
+            'success': True,
+            'run': training_run.to_dict()
+        }), 200
+    
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@cnn_bp.route('/runs/<run_id>/resume', methods=['POST'])
+@jwt_required()
+def resume_training_run(run_id):
+    """Endpoint para reanudar una ejecución interrumpida desde su último checkpoint"""
+    try:
+        training_run = _get_visible_run(run_id)
+        if training_run is None:
+            return jsonify({"error": f"Ejecución '{run_id}' no encontrada"}), 404
         
-        # Dividir datos en entrenamiento y prueba
-        X_train, X_test, y_train, y_test = split_data(X, y, test_size=test_size)
+        data_type = training_run.spec['data_type']
+        if data_type == 'real' and not os.path.exists(training_run.data_path):
+            return jsonify({"error": f"La ejecución '{run_id}' ya no conserva su ZIP de entrenamiento"}), 409
         
-        # Crear y compilar el modelo
-        model = create_cnn_model(**model_params)
+        # Reservar la ejecución: otra solicitud no puede reanudarla a la vez
+        try:
+            training_run = run_store.claim(run_id)
+        except RunNotResumableError as e:
+            return jsonify({"error": str(e)}), 409
         
-        # Entrenar el modelo
-        history = train_cnn_model(
-            model, X_train, y_train, X_test, y_test, **train_params
-        )
+        if data_type == 'real':
+            train = _train_real_run
+            cleanup = lambda: shutil.rmtree(training_run.extract_dir, ignore_errors=True)
+        else:
+            train, cleanup = _train_test_run, None
         
-        # Evaluar el modelo
-        evaluation = evaluate_cnn_model(model, X_test, y_test)
+        # El trabajo restaura el modelo y el optimizador del último checkpoint
+        return _submit_training_job(data_type, get_jwt_identity(), training_run, train, cleanup)
+    
+    except ResourceRejectedError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'resources': e.estimate
+        }), 413
+    except JobQueueFullError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 503
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@cnn_bp.route('/runs/<run_id>', methods=['DELETE'])
+@jwt_required()
+def delete_training_run(run_id):
+    """Endpoint para eliminar una ejecución con sus checkpoints y su ZIP conservado"""
+    try:
+        training_run = _get_visible_run(run_id)
+        if training_run is None:
+            return jsonify({"error": f"Ejecución '{run_id}' no encontrada"}), 404
         
-        # Guardar el modelo si se proporciona un nombre
-        model_name = request.form.get('model_name', f'cnn_real_{uuid.uuid4().hex[:8]}')
+        if training_run.active():
+            return jsonify({"error": f"La ejecución '{run_id}' está en curso; cancela antes su trabajo"}), 409
         
-        # Metadatos del modelo
-        metadata = {
-            'model_name': model_name,
-            'model_type': 'cnn',
-            'model_params': model_params,
-            'train_params': train_params,
-            'test_size': test_size,
-            'accuracy': float(evaluation['accuracy']),
-            'loss': float(evaluation['loss']),
-            'created_by': get_jwt_identity(),
-            'data_type': 'real',
-            'num_images': len(image_paths),
-            'class_mapping': class_mapping,
-            'class_names': list(class_mapping.values())
-        }
+        run_store.delete(run_id)
         
-        try:
-            # Guardar el modelo
-            model_path = save_tensorflow_model(
-                model, 
-                model_name, 
-                current_app.config['CNN_MODELS_FOLDER'],
-                metadata
-            )
-            
-            # Limpiar archivos temporales
-            try:
-                os.remove(temp_zip_path)
-                shutil.rmtree(extract_dir)
-            except:
-                pass
-            
-            # Devolver resultados
-            return jsonify({
-                'success': True,
-                'message': 'Modelo entrenado correctamente',
-                'model_name': model_name,
-                'model_path': model_path,
-                'evaluation': evaluation,
-                'history': {
-                    'accuracy': [float(acc) for acc in history.history['accuracy']],
-                    'loss': [float(loss) for loss in history.history['loss']],
-                    'val_accuracy': [float(acc) for acc in history.history.get('val_accuracy', [])],
-                    'val_loss': [float(loss) for loss in history.history.get('val_loss', [])]
-                }
-            }), 200
-        except ValueError as e:
-            # Limpiar archivos temporales en caso de error
-            try:
-                os.remove(temp_zip_path)
-                
-                shutil.rmtree(extract_dir)
-            except:
-                pass
-            
-            return jsonify({
-                'success': False,
-                'error': str(e)
-            }), 400
+        return jsonify({
+            'success': True,
+            'message': f"Ejecución '{run_id}' eliminada"
+        }), 200
     
     except Exception as e:
         return jsonify({
@@ -333,41 +1016,60 @@ def predict_with_test_data():
         if not model_name:
             return jsonify({"error": "No se proporcionó un nombre de modelo"}), 400
         
-        # Listar modelos disponibles
-        models = list_models(current_app.config['CNN_MODELS_FOLDER'])
+        # Motor de inferencia: 'keras' (por defecto) o 'tflite'
+        runtime = data.get('runtime', 'keras')
+        if runtime not in SERVING_RUNTIMES:
+            return jsonify({"error": f"runtime debe ser uno de: {', '.join(SERVING_RUNTIMES)}"}), 400
+        
+        # Opciones de la respuesta: perfil, campos seleccionados y codificación de imágenes
+        try:
+            response_options = parse_response_options(data)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
         
-        # Buscar el modelo por nombre
-        model_info = next((m for m in models if m['id'].startswith(model_name)), None)
-        if not model_info:
+        # Resolver el nombre del modelo con el índice de nombres
+        try:
+            model_path = model_name_index.resolve(current_app.config['CNN_MODELS_FOLDER'], model_name)
+        except AmbiguousModelNameError as e:
+            return jsonify({"error": str(e), "matches": e.matches}), 409
+        if not model_path:
             return jsonify({"error": f"Modelo '{model_name}' no encontrado"}), 404
         
-        # Cargar el modelo
-        model_path = model_info['path']
-        model, metadata = load_tensorflow_model(model_path)
+        # Cargar el modelo con el motor de inferencia solicitado
+        if runtime == 'tflite' and not os.path.exists(f"{model_path}.tflite"):
+            return jsonify({"error": f"El modelo '{model_name}' no tiene una versión TFLite exportada"}), 400
+        model, metadata = _load_serving_model(model_path, runtime)
         
         # Crear una imagen de prueba aleatoria
         img_height, img_width = metadata.get('model_params', {}).get('input_shape', (224, 224, 3))[:2]
-        test_image = np.random.rand(1, img_height, img_width, 3)
+        test_image = np.random.randint(0, 256, size=(1, img_height, img_width, 3), dtype=np.uint8)
         
-        # Realizar predicción
-        prediction = predict_image(model, test_image[0])
+        # Realizar predicción (los modelos anteriores esperan imágenes en [0,1])
+        prediction = predict_image(model, prepare_model_input(test_image[0], metadata))
         
         # Obtener la clase con mayor probabilidad
         predicted_class = int(np.argmax(prediction[0]))
         confidence = float(prediction[0][predicted_class])
         
-        # Devolver resultados
-        return jsonify({
-            'success': True,
+        # Devolver resultados; la imagen y los metadatos completos solo si se solicitan
+        payload = {
             'model_name': model_name,
             'prediction': {
                 'class': predicted_class,
                 'confidence': confidence,
                 'probabilities': prediction[0].tolist()
             },
-            'image': test_image[0].tolist(),  # Incluir la imagen utilizada
+            'runtime': runtime,
+            'model': summarize_metadata(metadata),
+            'image': lambda: encode_image(test_image[0], response_options['image_encoding']),
             'metadata': metadata
-        }), 200
+        }
+        try:
+            response = build_response(payload, response_options, PREDICT_COMPACT_FIELDS)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        
+        return jsonify(response), 200
     
     except Exception as e:
         return jsonify({
@@ -401,64 +1103,311 @@ def predict_with_real_data():
         if not model_name:
             return jsonify({"error": "No se proporcionó un nombre de modelo"}), 400
         
-        # Listar modelos disponibles
-        models = list_models(current_app.config['CNN_MODELS_FOLDER'])
+        # Motor de inferencia: 'keras' (por defecto) o 'tflite'
+        runtime = request.form.get('runtime', 'keras')
+        if runtime not in SERVING_RUNTIMES:
+            return jsonify({"error": f"runtime debe ser uno de: {', '.join(SERVING_RUNTIMES)}"}), 400
         
-        # Buscar el modelo por nombre
-        model_info = next((m for m in models if m['id'].startswith(model_name)), None)
-        if not model_info:
+        # Opciones de la respuesta: perfil, campos seleccionados y codificación de imágenes
+        try:
+            response_options = parse_response_options(request.form)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        
+        # Resolver el nombre del modelo con el índice de nombres
+        try:
+            model_path = model_name_index.resolve(current_app.config['CNN_MODELS_FOLDER'], model_name)
+        except AmbiguousModelNameError as e:
+            return jsonify({"error": str(e), "matches": e.matches}), 409
+        if not model_path:
             return jsonify({"error": f"Modelo '{model_name}' no encontrado"}), 404
         
-        # Cargar el modelo
-        model_path = model_info['path']
-        model, metadata = load_tensorflow_model(model_path)
+        # Cargar el modelo con el motor de inferencia solicitado
+        if runtime == 'tflite' and not os.path.exists(f"{model_path}.tflite"):
+            return jsonify({"error": f"El modelo '{model_name}' no tiene una versión TFLite exportada"}), 400
+        model, metadata = _load_serving_model(model_path, runtime)
 
         # Obtener mapeo de clases si está disponible
         class_mapping = metadata.get('class_mapping', {})
         
-        # Guardar la imagen temporalmente
-        temp_img_path = os.path.join(current_app.config['IMAGE_UPLOAD_FOLDER'], secure_filename(file.filename))
-        os.makedirs(os.path.dirname(temp_img_path), exist_ok=True)
-        file.save(temp_img_path)
-        
-        # Cargar y preprocesar la imagen
-        img_height, img_width = metadata.get('model_params', {}).get('input_shape', (224, 224, 3))[:2]
-        image_paths = [temp_img_path]
-        X, _ = prepare_image_data(image_paths, img_height, img_width)
+        # Consultar la caché de resultados con el hash de los bytes de la imagen
+        image_bytes = file.read()
+        model_file = f"{model_path}.tflite" if runtime == 'tflite' else f"{model_path}.h5"
+        cache_key = prediction_cache.make_key(model_path, model_file, hash_bytes(image_bytes), variant=runtime)
+        probabilities = prediction_cache.get(cache_key)
+        cached = probabilities is not None
         
-        # Realizar predicción
-        prediction = predict_image(model, X[0])
+        if not cached:
+            # Decodificar la imagen directamente desde los bytes recibidos
+            img_height, img_width = metadata.get('model_params', {}).get('input_shape', (224, 224, 3))[:2]
+            try:
+                image = load_image_from_bytes(image_bytes, img_height, img_width)
+            except OSError as e:
+                # Incluye PIL.UnidentifiedImageError (archivo que no es una imagen válida)
+                return jsonify({"error": f"No se pudo procesar la imagen: {str(e)}"}), 400
+            
+            # Realizar predicción (agrupada con otras solicitudes concurrentes del mismo modelo)
+            prediction = inference_dispatcher.predict(model_path, model, prepare_model_input(image, metadata))
+            probabilities = prediction[0].tolist()
+            prediction_cache.put(cache_key, probabilities)
         
         # Obtener la clase con mayor probabilidad
-        predicted_class = int(np.argmax(prediction[0]))
-        confidence = float(prediction[0][predicted_class])
+        predicted_class = int(np.argmax(probabilities))
+        confidence = float(probabilities[predicted_class])
 
         # Obtener nombre de la clase desde el mapeo
         class_name = class_mapping.get(str(predicted_class), f"Clase {predicted_class}")
         
-        # Codificar la imagen para devolverla como parte de la respuesta
+        # Devolver resultados; la imagen original (en base64) y los metadatos
+        # completos solo se incluyen si se solicitan
+        payload = {
+            'model_name': model_name,
+            'prediction': {
+                'class': predicted_class,
+                'class_name': class_name,
+                'confidence': confidence,
+                'probabilities': probabilities
+            },
+            'runtime': runtime,
+            'cached': cached,
+            'model': summarize_metadata(metadata),
+            'image': lambda: base64.b64encode(image_bytes).decode('utf-8'),
+            'metadata': metadata
+        }
+        try:
+            response = build_response(payload, response_options, PREDICT_COMPACT_FIELDS)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        
+        return jsonify(response), 200
+    
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+# Ruta para predicción por lotes con datos reales (rol Usuario)
+@cnn_bp.route('/predict/batch', methods=['POST'])
+@jwt_required()
+@user_required
+def predict_batch_with_real_data():
+    """Endpoint para predecir con un modelo CNN sobre múltiples imágenes (Usuario)"""
+    zip_ref = None
+    try:
+        # Obtener el modelo a utilizar
+        model_name = request.form.get('model_name')
+        if not model_name:
+            return jsonify({"error": "No se proporcionó un nombre de modelo"}), 400
+        
+        # Tamaño de bloque para la inferencia
+        batch_size = int(request.form.get('batch_size', current_app.config['CNN_PREDICT_BATCH_SIZE']))
+        if batch_size <= 0:
+            return jsonify({"error": "batch_size debe ser mayor que 0"}), 400
+        
+        # Motor de inferencia: 'keras' (por defecto) o 'tflite'
+        runtime = request.form.get('runtime', 'keras')
+        if runtime not in SERVING_RUNTIMES:
+            return jsonify({"error": f"runtime debe ser uno de: {', '.join(SERVING_RUNTIMES)}"}), 400
+        
+        # Opciones de la respuesta: perfil, campos seleccionados y codificación de imágenes
+        try:
+            response_options = parse_response_options(request.form)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        
+        # Reunir las imágenes: lista de archivos en 'files' o un ZIP en 'file'
+        # Cada elemento es (nombre, función que devuelve los bytes de la imagen)
+        sources = []
+        uploaded_files = [f for f in request.files.getlist('files') if f.filename]
+        
+        if uploaded_files:
+            for uploaded in uploaded_files:
+                if not validate_file_extension(uploaded.filename, current_app.config['ALLOWED_IMAGE_EXTENSIONS']):
+                    return jsonify({"error": f"El archivo '{uploaded.filename}' debe ser una imagen (PNG, JPG, JPEG)"}), 400
+                sources.append((uploaded.filename, uploaded.read))
+        elif 'file' in request.files and request.files['file'].filename.endswith('.zip'):
+            try:
+                zip_ref = zipfile.ZipFile(request.files['file'].stream)
+            except zipfile.BadZipFile:
+                return jsonify({"error": "El archivo ZIP no es válido"}), 400
+            
+            # Verificar los límites de tamaño antes de descomprimir ninguna imagen
+            members = list_zip_image_members(zip_ref)
+            try:
+                check_zip_limits(zip_ref, members, **_zip_ingest_limits())
+            except ZipLimitError as e:
+                return jsonify({"error": str(e)}), 413
+            for member in members:
+                sources.append((member, lambda member=member: zip_ref.read(member)))
+        else:
+            return jsonify({"error": "Se debe proporcionar una lista de imágenes en 'files' o un archivo ZIP en 'file'"}), 400
         
-        with open(temp_img_path, "rb") as img_file:
-            image_base64 = base64.b64encode(img_file.read()).decode('utf-8')
+        if not sources:
+            return jsonify({"error": "No se encontraron imágenes para predecir"}), 400
         
-        # Limpiar archivo temporal
+        max_images = current_app.config['CNN_BATCH_MAX_IMAGES']
+        if len(sources) > max_images:
+            return jsonify({"error": f"Se admiten como máximo {max_images} imágenes por solicitud"}), 400
+        
+        # Resolver el nombre del modelo con el índice de nombres
         try:
-            os.remove(temp_img_path)
-        except:
-            pass
+            model_path = model_name_index.resolve(current_app.config['CNN_MODELS_FOLDER'], model_name)
+        except AmbiguousModelNameError as e:
+            return jsonify({"error": str(e), "matches": e.matches}), 409
+        if not model_path:
+            return jsonify({"error": f"Modelo '{model_name}' no encontrado"}), 404
+        
+        # Cargar el modelo con el motor de inferencia solicitado
+        if runtime == 'tflite' and not os.path.exists(f"{model_path}.tflite"):
+            return jsonify({"error": f"El modelo '{model_name}' no tiene una versión TFLite exportada"}), 400
+        model, metadata = _load_serving_model(model_path, runtime)
+        class_mapping = metadata.get('class_mapping', {})
+        img_height, img_width = metadata.get('model_params', {}).get('input_shape', (224, 224, 3))[:2]
+        
+        results = []
+        failed = 0
+        inference_seconds = 0.0
+        start_time = time.perf_counter()
+        
+        # Decodificar y predecir por bloques para acotar la memoria utilizada
+        for chunk_start in range(0, len(sources), batch_size):
+            chunk = sources[chunk_start:chunk_start + batch_size]
+            
+            X = np.zeros((len(chunk), img_height, img_width, 3), dtype=np.uint8)
+            chunk_results = [None] * len(chunk)
+            decoded = []
+            for position, (filename, read_bytes) in enumerate(chunk):
+                try:
+                    X[len(decoded)] = load_image_from_bytes(read_bytes(), img_height, img_width)
+                    decoded.append(position)
+                except Exception as e:
+                    failed += 1
+                    chunk_results[position] = {'filename': filename, 'error': f"No se pudo procesar la imagen: {str(e)}"}
+            
+            if decoded:
+                # Una única pasada del modelo para todo el bloque
+                inference_start = time.perf_counter()
+                predictions = predict_batch(model, prepare_model_input(X[:len(decoded)], metadata), batch_size=batch_size)
+                inference_seconds += time.perf_counter() - inference_start
+                
+                for position, probabilities in zip(decoded, predictions):
+                    predicted_class = int(np.argmax(probabilities))
+                    chunk_results[position] = {
+                        'filename': chunk[position][0],
+                        'class': predicted_class,
+                        'class_name': class_mapping.get(str(predicted_class), f"Clase {predicted_class}"),
+                        'confidence': float(probabilities[predicted_class]),
+                        'probabilities': probabilities.tolist()
+                    }
+            
+            results.extend(chunk_results)
+        
+        total_seconds = time.perf_counter() - start_time
+        processed = len(sources) - failed
         
         # Devolver resultados
-        return jsonify({
-            'success': True,
+        payload = {
             'model_name': model_name,
-            'prediction': {
-                'class': predicted_class,
-                'class_name': class_name,
-                'confidence': confidence,
-                'probabilities': prediction[0].tolist()
+            'count': len(sources),
+            'processed': processed,
+            'failed': failed,
+            'batch_size': batch_size,
+            'runtime': runtime,
+            'results': results,
+            'throughput': {
+                'images_per_second': processed / total_seconds if total_seconds > 0 else None,
+                'inference_images_per_second': processed / inference_seconds if inference_seconds > 0 else None,
+                'total_seconds': total_seconds,
+                'inference_seconds': inference_seconds
             },
-            'image': image_base64,  # Incluir la imagen codificada en base64
+            'model': summarize_metadata(metadata),
             'metadata': metadata
+        }
+        try:
+            response = build_response(payload, response_options, BATCH_COMPACT_FIELDS)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        
+        return jsonify(response), 200
+    
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+    
+    finally:
+        if zip_ref is not None:
+            zip_ref.close()
+
+# Ruta para exportar bajo demanda un modelo CNN a TFLite
+@cnn_bp.route('/models/<model_name>/tflite', methods=['POST'])
+@jwt_required()
+@user_required
+def export_cnn_model_tflite(model_name):
+    """Endpoint para exportar un modelo CNN guardado a TFLite con cuantización post-entrenamiento"""
+    zip_ref = None
+    try:
+        try:
+            mode = _parse_tflite_mode(request.form.get('mode', 'dynamic'))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        if mode is None:
+            return jsonify({"error": f"mode debe ser uno de: {', '.join(TFLITE_MODES)}"}), 400
+        
+        # Resolver el nombre del modelo con el índice de nombres
+        try:
+            model_path = model_name_index.resolve(current_app.config['CNN_MODELS_FOLDER'], model_name)
+        except AmbiguousModelNameError as e:
+            return jsonify({"error": str(e), "matches": e.matches}), 409
+        if not model_path:
+            return jsonify({"error": f"Modelo '{model_name}' no encontrado"}), 404
+        
+        model, metadata = model_cache.get_tensorflow_model(model_path)
+        metadata = dict(metadata or {})
+        img_height, img_width = metadata.get('model_params', {}).get('input_shape', (224, 224, 3))[:2]
+        
+        # Imágenes de calibración opcionales: un ZIP en 'file' (obligatorio para int8)
+        calibration_images = None
+        if 'file' in request.files and request.files['file'].filename:
+            if not request.files['file'].filename.endswith('.zip'):
+                return jsonify({"error": "Las imágenes de calibración deben enviarse en un archivo ZIP"}), 400
+            try:
+                zip_ref = zipfile.ZipFile(request.files['file'].stream)
+            except zipfile.BadZipFile:
+                return jsonify({"error": "El archivo ZIP no es válido"}), 400
+            
+            members = list_zip_image_members(zip_ref)[:CALIBRATION_SAMPLES]
+            try:
+                check_zip_limits(zip_ref, members, **_zip_ingest_limits())
+            except ZipLimitError as e:
+                return jsonify({"error": str(e)}), 413
+            
+            calibration_images = np.zeros((len(members), img_height, img_width, 3), dtype=np.uint8)
+            loaded = 0
+            for member in members:
+                try:
+                    calibration_images[loaded] = load_image_from_bytes(zip_ref.read(member), img_height, img_width)
+                    loaded += 1
+                except Exception as e:
+                    logger.warning(f"Imagen de calibración ignorada '{member}': {str(e)}")
+            calibration_images = prepare_model_input(calibration_images[:loaded], metadata)
+        
+        if mode == 'int8' and (calibration_images is None or len(calibration_images) == 0):
+            return jsonify({"error": "La cuantización int8 requiere un ZIP con imágenes de calibración en 'file'"}), 400
+        
+        # Sin etiquetas, la calidad se mide como coincidencia con el modelo de Keras
+        tflite_info = _export_tflite_with_metadata(
+            model, model_path, metadata, mode, calibration_images, calibration_images
+        )
+        if 'error' in tflite_info:
+            return jsonify({'success': False, 'error': tflite_info['error']}), 500
+        
+        return jsonify({
+            'success': True,
+            'model_name': model_name,
+            'tflite': tflite_info
         }), 200
     
     except Exception as e:
@@ -466,6 +1415,10 @@ def predict_with_real_data():
             'success': False,
             'error': str(e)
         }), 500
+    
+    finally:
+        if zip_ref is not None:
+            zip_ref.close()
 
 # Ruta para listar modelos CNN disponibles
 @cnn_bp.route('/models', methods=['GET'])
@@ -494,17 +1447,17 @@ def list_cnn_models():
 def delete_cnn_model(model_name):
     """Endpoint para eliminar un modelo CNN específico (solo administradores)"""
     try:
-        # Listar modelos disponibles
-        models = list_models(current_app.config['CNN_MODELS_FOLDER'])
-        
-        # Buscar el modelo por nombre
-        model_info = next((m for m in models if m['id'].startswith(model_name)), None)
-        if not model_info:
+        # Resolver el nombre del modelo con el índice de nombres
+        try:
+            model_path = model_name_index.resolve(current_app.config['CNN_MODELS_FOLDER'], model_name)
+        except AmbiguousModelNameError as e:
+            return jsonify({"error": str(e), "matches": e.matches}), 409
+        if not model_path:
             return jsonify({"error": f"Modelo '{model_name}' no encontrado"}), 404
         
         # Eliminar el modelo
-        model_path = model_info['path']
         result = delete_model(model_path)
+        model_cache.invalidate(model_path)
         
         if result:
             return jsonify({
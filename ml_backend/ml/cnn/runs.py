@@ -0,0 +1,564 @@
+import os
+import json
+import time
+import uuid
+import shutil
+import threading
+import logging
+
+import numpy as np
+import tensorflow as tf
+from tensorflow import keras
+
+from ml.jobs.models import TrainingJob
+
+# Configurar logging para depuración
+logger = logging.getLogger(__name__)
+
+# Estados de una ejecución de entrenamiento
+RUN_RUNNING = 'running'
+RUN_INTERRUPTED = 'interrupted'
+RUN_COMPLETED = 'completed'
+# Interrumpida cuyos checkpoints y datos se eliminaron por la política de retención
+RUN_EXPIRED = 'expired'
+
+# Archivos de cada ejecución
+RUN_FILE = 'run.json'
+CHECKPOINT_DIR = 'checkpoints'
+BEST_WEIGHTS_FILE = 'best_weights.npz'
+DATA_FILE = 'data.zip'
+EXTRACT_DIR = 'extract'
+
+class RunNotResumableError(Exception):
+    """Error lanzado cuando una ejecución no se puede reanudar"""
+    pass
+
+def _job_active(job_id):
+    if not job_id:
+        return False
+    job = TrainingJob.query.get(job_id)
+    return job is not None and not job.finished
+
+class TrainingRun:
+    """
+    Ejecución de un entrenamiento CNN con checkpoints periódicos.
+
+    El estado (parámetros, datos de entrada, épocas completadas, mejor
+    val_loss e historial) se guarda en run.json; los checkpoints guardan los
+    pesos del modelo junto con el estado del optimizador, de modo que una
+    ejecución interrumpida continúa desde su último checkpoint como si no se
+    hubiera detenido.
+    """
+
+    def __init__(self, directory, state):
+        self.directory = directory
+        self.state = state
+        self._lock = threading.Lock()
+        self._checkpoint_manager = None
+
+    @property
+    def run_id(self):
+        return self.state['run_id']
+
+    @property
+    def spec(self):
+        """Parámetros con los que se creó la ejecución (modelo, entrenamiento y datos)"""
+        return self.state['spec']
+
+    @property
+    def history(self):
+        """Historial de métricas por época de todos los tramos de la ejecución"""
+        return self.state['history']
+
+    @property
+    def data_path(self):
+        """Ruta del ZIP de entrenamiento conservado para poder reanudar"""
+        return os.path.join(self.directory, DATA_FILE)
+
+    @property
+    def extract_dir(self):
+        """Directorio temporal para las imágenes extraídas del ZIP"""
+        return os.path.join(self.directory, EXTRACT_DIR)
+
+    @property
+    def keep_data(self):
+        """Indica si se pidió conservar los checkpoints y datos aunque venza la retención"""
+        return bool(self.spec.get('keep_data'))
+
+    def save(self):
+        """Guarda el estado de la ejecución con una escritura atómica"""
+        with self._lock:
+            self.state['updated_at'] = time.time()
+            temp_path = os.path.join(self.directory, f".{RUN_FILE}.{uuid.uuid4().hex}.tmp")
+            with open(temp_path, 'w') as f:
+                json.dump(self.state, f)
+            os.replace(temp_path, os.path.join(self.directory, RUN_FILE))
+
+    def start(self):
+        """Marca la ejecución como en curso, antes de encolar su trabajo"""
+        self.state['status'] = RUN_RUNNING
+        self.state['job_id'] = None
+        self.state['error'] = None
+        self.save()
+
+    def attach_job(self, job_id):
+        """
+        Registra el trabajo de entrenamiento que ejecuta la ejecución
+
+        Args:
+            job_id: Identificador del trabajo
+        """
+        self.state['job_id'] = job_id
+        self.save()
+
+    def active(self):
+        """Indica si la ejecución está en curso en un trabajo que sigue ejecutándose"""
+        return self.state['status'] == RUN_RUNNING and _job_active(self.state['job_id'])
+
+    def interrupt(self, error=None):
+        """Marca la ejecución como interrumpida (reanudable desde su último checkpoint)"""
+        self.state['status'] = RUN_INTERRUPTED
+        self.state['error'] = error
+        self.save()
+
+    def complete(self, model_path):
+        """
+        Marca la ejecución como completada y elimina sus checkpoints y datos
+
+        Args:
+            model_path: Ruta del modelo guardado
+        """
+        self.state['status'] = RUN_COMPLETED
+        self.state['model_path'] = model_path
+        self.save()
+        self._remove_data()
+
+    def expire(self, reason):
+        """
+        Elimina los checkpoints y datos de una ejecución que no se completó
+
+        La ejecución conserva run.json con su historial, pero ya no se puede reanudar.
+
+        Args:
+            reason: Motivo que se guarda como error de la ejecución
+        """
+        self.state['status'] = RUN_EXPIRED
+        self.state['error'] = reason
+        self.save()
+        self._remove_data()
+
+    def size_bytes(self):
+        """Espacio en disco de la ejecución (checkpoints, datos y estado)"""
+        total = 0
+        for root, _, files in os.walk(self.directory):
+            for filename in files:
+                try:
+                    total += os.path.getsize(os.path.join(root, filename))
+                except OSError:
+                    # Archivo eliminado mientras se recorría el directorio
+                    pass
+        return total
+
+    def restore(self, model):
+        """
+        Restaura los pesos y el estado del optimizador del último checkpoint
+
+        En un tramo reanudado, el historial de las épocas posteriores al
+        checkpoint se descarta: esas épocas se vuelven a entrenar.
+
+        Args:
+            model: Modelo compilado con la misma arquitectura que la ejecución
+
+        Returns:
+            Época desde la que continúa el entrenamiento (0 si no hay checkpoint)
+        """
+        manager = self._get_checkpoint_manager(model)
+        epoch = 0
+        if manager.latest_checkpoint is not None:
+            # Crear las variables del optimizador para restaurarlas en lugar de diferirlas
+            if hasattr(model.optimizer, 'build'):
+                model.optimizer.build(model.trainable_variables)
+            manager.checkpoint.restore(manager.latest_checkpoint).assert_existing_objects_matched()
+            # El número del checkpoint es su época, aunque el proceso se detuviera antes de guardar run.json
+            epoch = int(manager.latest_checkpoint.rsplit('-', 1)[1])
+            logger.info(f"Ejecución '{self.run_id}' reanudada desde la época {epoch}")
+
+        self.state['checkpoint_epoch'] = epoch
+        self.state['history'] = {key: values[:epoch] for key, values in self.history.items()}
+        if self.state['best'] is not None and self.state['best']['epoch'] > epoch:
+            self.state['best'] = None
+        self.save()
+        return epoch
+
+    def record_epoch(self, model, epoch, metrics, save_checkpoint):
+        """
+        Registra una época completada y guarda los checkpoints que correspondan
+
+        Args:
+            model: Modelo entrenado por model.fit (la cabeza con embeddings)
+            epoch: Número de épocas completadas
+            metrics: Métricas de la época
+            save_checkpoint: Guardar un checkpoint con el estado del optimizador
+        """
+        for key, value in metrics.items():
+            self.history.setdefault(key, []).append(value)
+
+        val_loss = metrics.get('val_loss')
+        best = self.state['best']
+        if val_loss is not None and (best is None or val_loss < best['val_loss']):
+            self._write_best_weights(model.get_weights())
+            self.state['best'] = {'epoch': epoch, 'val_loss': val_loss}
+
+        if save_checkpoint:
+            self._checkpoint_manager.save(checkpoint_number=epoch)
+            self.state['checkpoint_epoch'] = epoch
+        self.save()
+
+    def best_weights(self):
+        """Pesos de la época con menor val_loss o None si aún no hay"""
+        path = os.path.join(self.directory, BEST_WEIGHTS_FILE)
+        if self.state['best'] is None or not os.path.exists(path):
+            return None
+        with np.load(path) as data:
+            return [data[f'arr_{index}'] for index in range(len(data.files))]
+
+    def keras_callbacks(self, model):
+        """
+        Callbacks de Keras que guardan los checkpoints y aplican la parada temprana
+
+        Deben ir antes que los del trabajo: una época cancelada se detecta
+        por stop_training antes de que la cancelación lo marque al final de
+        una época completa.
+
+        Args:
+            model: Modelo completo de la ejecución (el que se guarda)
+        """
+        self._get_checkpoint_manager(model)
+        callbacks = [RunCheckpointCallback(self, self.spec['checkpoint_every'])]
+        if self.spec['early_stopping_patience']:
+            callbacks.append(RunEarlyStopping(self, self.spec['early_stopping_patience']))
+        return callbacks
+
+    def to_dict(self):
+        """Convierte la ejecución a un diccionario para la API"""
+        spec = self.spec
+        return {
+            'run_id': self.run_id,
+            'model_name': spec['model_name'],
+            'data_type': spec['data_type'],
+            'status': self.state['status'],
+            'job_id': self.state['job_id'],
+            'epochs': spec['train_params']['epochs'],
+            'checkpoint_epoch': self.state['checkpoint_epoch'],
+            'best': self.state['best'],
+            'early_stopping_patience': spec['early_stopping_patience'],
+            'checkpoint_every': spec['checkpoint_every'],
+            'history': self.history,
+            'resumable': self.state['status'] not in (RUN_COMPLETED, RUN_EXPIRED) and not self.active(),
+            'keep_data': self.keep_data,
+            'model_path': self.state.get('model_path'),
+            'error': self.state.get('error'),
+            'created_by': spec['created_by'],
+            'created_at': self.state['created_at'],
+            'updated_at': self.state['updated_at']
+        }
+
+    def _get_checkpoint_manager(self, model):
+        if self._checkpoint_manager is None:
+            # El optimizador es el del modelo completo, compartido con la cabeza de embeddings
+            checkpoint = tf.train.Checkpoint(model=model, optimizer=model.optimizer)
+            self._checkpoint_manager = tf.train.CheckpointManager(
+                checkpoint, os.path.join(self.directory, CHECKPOINT_DIR), max_to_keep=1
+            )
+        return self._checkpoint_manager
+
+    def _remove_data(self):
+        shutil.rmtree(os.path.join(self.directory, CHECKPOINT_DIR), ignore_errors=True)
+        shutil.rmtree(self.extract_dir, ignore_errors=True)
+        for filename in (BEST_WEIGHTS_FILE, DATA_FILE):
+            path = os.path.join(self.directory, filename)
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _write_best_weights(self, weights):
+        temp_path = os.path.join(self.directory, f".{uuid.uuid4().hex}.tmp.npz")
+        np.savez(temp_path, *weights)
+        os.replace(temp_path, os.path.join(self.directory, BEST_WEIGHTS_FILE))
+
+class RunCheckpointCallback(keras.callbacks.Callback):
+    """
+    Callback de Keras que registra cada época en la ejecución y guarda un
+    checkpoint cada checkpoint_every épocas y al terminar la última.
+
+    Una época cortada por una cancelación no se registra: al reanudar se
+    vuelve a entrenar completa.
+    """
+
+    def __init__(self, run, checkpoint_every=1):
+        super().__init__()
+        self.run = run
+        self.checkpoint_every = max(int(checkpoint_every), 1)
+
+    def on_epoch_end(self, epoch, logs=None):
+        if self.model.stop_training:
+            return
+        completed = epoch + 1
+        metrics = {key: float(value) for key, value in (logs or {}).items()}
+        save_checkpoint = completed % self.checkpoint_every == 0 or completed == self.params.get('epochs')
+        self.run.record_epoch(self.model, completed, metrics, save_checkpoint)
+
+class RunEarlyStopping(keras.callbacks.EarlyStopping):
+    """
+    Parada temprana sobre val_loss que restaura los mejores pesos.
+
+    En un tramo reanudado continúa con la mejor val_loss y la paciencia
+    consumida de la ejecución. Los mejores pesos se restauran también cuando
+    el entrenamiento completa todas sus épocas sin detenerse.
+    """
+
+    def __init__(self, run, patience):
+        super().__init__(monitor='val_loss', patience=patience, restore_best_weights=True)
+        self.run = run
+
+    def on_train_begin(self, logs=None):
+        super().on_train_begin(logs)
+        best = self.run.state['best']
+        if best is not None:
+            self.best = best['val_loss']
+            self.best_epoch = best['epoch'] - 1
+            self.wait = max(self.run.state['checkpoint_epoch'] - best['epoch'], 0)
+            self.best_weights = self.run.best_weights()
+
+    def on_train_end(self, logs=None):
+        super().on_train_end(logs)
+        if self.stopped_epoch == 0 and self.best_weights is not None:
+            self.model.set_weights(self.best_weights)
+
+class RunStore:
+    """
+    Ejecuciones de entrenamiento CNN guardadas en disco (un directorio por ejecución).
+
+    Los directorios están bajo la carpeta de modelos CNN, así que cualquier
+    worker que la comparta puede consultar y reanudar las ejecuciones de otro.
+    Los checkpoints y datos de las ejecuciones que no se completan se eliminan
+    según la política de retención (antigüedad y espacio total).
+    """
+
+    def __init__(self):
+        self.folder = None
+        self.checkpoint_every = 1
+        self.early_stopping_patience = 5
+        self.retention_days = 7
+        self.max_bytes = 0
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        """
+        Configura las ejecuciones a partir de la configuración de la aplicación
+
+        Args:
+            app: Aplicación Flask
+        """
+        self.folder = app.config.get('CNN_RUNS_FOLDER', self.folder)
+        self.checkpoint_every = app.config.get('CNN_CHECKPOINT_EVERY', self.checkpoint_every)
+        self.early_stopping_patience = app.config.get('CNN_EARLY_STOPPING_PATIENCE', self.early_stopping_patience)
+        self.retention_days = app.config.get('CNN_RUN_RETENTION_DAYS', self.retention_days)
+        self.max_bytes = app.config.get('CNN_RUNS_MAX_BYTES', self.max_bytes)
+        if self.folder:
+            os.makedirs(self.folder, exist_ok=True)
+
+    def create(self, spec):
+        """
+        Crea una ejecución nueva
+
+        Args:
+            spec: Parámetros serializables a JSON de la ejecución: model_name,
+                created_by, data_type, model_params, train_params,
+                checkpoint_every, early_stopping_patience y los necesarios para
+                volver a cargar los datos
+
+        Returns:
+            TrainingRun creada
+        """
+        run_id = uuid.uuid4().hex
+        directory = os.path.join(self.folder, run_id)
+        os.makedirs(directory)
+
+        now = time.time()
+        run = TrainingRun(directory, {
+            'run_id': run_id,
+            'spec': spec,
+            'status': RUN_INTERRUPTED,
+            'job_id': None,
+            'checkpoint_epoch': 0,
+            'best': None,
+            'history': {},
+            'error': None,
+            'created_at': now,
+            'updated_at': now
+        })
+        run.save()
+        return run
+
+    def get(self, run_id):
+        """
+        Carga una ejecución
+
+        Returns:
+            TrainingRun o None si no existe
+        """
+        # Los identificadores son hexadecimales: nunca rutas relativas
+        if not self.folder or not run_id.isalnum():
+            return None
+        directory = os.path.join(self.folder, run_id)
+        try:
+            with open(os.path.join(directory, RUN_FILE)) as f:
+                return TrainingRun(directory, json.load(f))
+        except (FileNotFoundError, NotADirectoryError, ValueError):
+            return None
+
+    def list(self, created_by=None):
+        """
+        Lista las ejecuciones, de la más reciente a la más antigua
+
+        Args:
+            created_by: Devolver solo las de este usuario (opcional)
+
+        Returns:
+            Lista de TrainingRun
+        """
+        if not self.folder or not os.path.exists(self.folder):
+            return []
+        runs = [self.get(run_id) for run_id in os.listdir(self.folder)]
+        runs = [
+            run for run in runs
+            if run is not None and (created_by is None or str(run.spec['created_by']) == str(created_by))
+        ]
+        return sorted(runs, key=lambda run: run.state['created_at'], reverse=True)
+
+    def claim(self, run_id):
+        """
+        Reserva una ejecución interrumpida para reanudarla
+
+        Una ejecución en curso cuyo trabajo ya terminó (p. ej. porque se
+        detuvo el proceso que la ejecutaba) también se puede reanudar.
+
+        Args:
+            run_id: Identificador de la ejecución
+
+        Returns:
+            TrainingRun reservada (en curso, pendiente de registrar su trabajo)
+
+        Raises:
+            RunNotResumableError: Si la ejecución no existe, está completada o en curso
+        """
+        with self._lock:
+            run = self.get(run_id)
+            if run is None:
+                raise RunNotResumableError(f"La ejecución '{run_id}' no existe")
+            if run.state['status'] == RUN_COMPLETED:
+                raise RunNotResumableError(f"La ejecución '{run_id}' ya está completada")
+            if run.state['status'] == RUN_EXPIRED:
+                raise RunNotResumableError(
+                    f"La ejecución '{run_id}' ya no se puede reanudar: sus checkpoints y datos se eliminaron"
+                )
+            if run.active():
+                raise RunNotResumableError(f"La ejecución '{run_id}' está en curso")
+            run.start()
+            return run
+
+    def delete(self, run_id):
+        """Elimina una ejecución con sus checkpoints y datos"""
+        if not run_id.isalnum():
+            return
+        shutil.rmtree(os.path.join(self.folder, run_id), ignore_errors=True)
+
+    def recover_interrupted(self):
+        """
+        Marca como interrumpidas las ejecuciones en curso cuyo trabajo ya no se ejecuta
+
+        Debe llamarse al iniciar la aplicación, tras marcar los trabajos
+        interrumpidos, dentro de un contexto de aplicación.
+        """
+        interrupted = 0
+        for run in self.list():
+            if run.state['status'] == RUN_RUNNING and not run.active():
+                run.interrupt('El entrenamiento se interrumpió al reiniciar el servicio')
+                interrupted += 1
+        if interrupted:
+            logger.warning(f"{interrupted} ejecuciones de entrenamiento interrumpidas; se pueden reanudar")
+
+    def enforce_retention(self):
+        """
+        Elimina los checkpoints y datos de las ejecuciones terminadas sin completarse
+
+        Se eliminan los de las ejecuciones interrumpidas (fallidas, canceladas o
+        abandonadas) sin actividad en los últimos retention_days días y, si las
+        ejecuciones ocupan más de max_bytes, los de las interrumpidas más antiguas
+        hasta bajar del límite. Se conservan las ejecuciones creadas con keep_data.
+        Debe llamarse dentro de un contexto de aplicación.
+
+        Returns:
+            Número de ejecuciones cuyos datos se eliminaron
+        """
+        if not self.folder or not os.path.exists(self.folder):
+            return 0
+
+        cutoff = time.time() - self.retention_days * 86400 if self.retention_days else None
+        expired = 0
+        with self._lock:
+            runs = self.list()
+            sizes = {run.run_id: run.size_bytes() for run in runs}
+            total = sum(sizes.values())
+
+            # De la ejecución con menos actividad reciente a la que más
+            for run in sorted(runs, key=lambda run: run.state['updated_at']):
+                if run.keep_data:
+                    continue
+                status = run.state['status']
+                too_old = cutoff is not None and run.state['updated_at'] < cutoff
+                over_size = bool(self.max_bytes) and total > self.max_bytes
+                # Una ejecución en curso sin trabajo activo quedó abandonada; las
+                # recientes pueden estar reservándose para reanudarse en otro worker
+                abandoned = status == RUN_RUNNING and too_old and not run.active()
+                if not (status == RUN_INTERRUPTED and (too_old or over_size)) and not abandoned:
+                    continue
+
+                # Volver a leer el estado: otro worker pudo reanudarla mientras tanto
+                current = self.get(run.run_id)
+                if current is None or current.state['status'] != status or current.active():
+                    continue
+                reason = 'antigüedad' if too_old else 'espacio en disco'
+                try:
+                    current.expire(f"Checkpoints y datos eliminados por la política de retención ({reason})")
+                except OSError as e:
+                    logger.warning(f"No se pudieron eliminar los datos de la ejecución '{run.run_id}': {e}")
+                    continue
+                total -= sizes[run.run_id] - current.size_bytes()
+                expired += 1
+
+        if expired:
+            logger.info(f"Retención de ejecuciones: datos eliminados de {expired} ejecuciones")
+        return expired
+
+    def stats(self):
+        """
+        Devuelve estadísticas de las ejecuciones
+
+        Returns:
+            Diccionario con la configuración y el número de ejecuciones por estado
+        """
+        by_status = {RUN_RUNNING: 0, RUN_INTERRUPTED: 0, RUN_COMPLETED: 0, RUN_EXPIRED: 0}
+        for run in self.list():
+            by_status[run.state['status']] = by_status.get(run.state['status'], 0) + 1
+        return {
+            'folder': self.folder,
+            'checkpoint_every': self.checkpoint_every,
+            'early_stopping_patience': self.early_stopping_patience,
+            'retention_days': self.retention_days,
+            'max_bytes': self.max_bytes,
+            'runs': by_status
+        }
+
+# Instancia compartida por los endpoints de entrenamiento
+run_store = RunStore()
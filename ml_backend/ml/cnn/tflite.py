@@ -0,0 +1,190 @@
+import os
+import time
+import datetime
+import threading
+import logging
+
+import numpy as np
+import tensorflow as tf
+
+# Configurar logging para depuración
+logger = logging.getLogger(__name__)
+
+# Modos de cuantización soportados
+TFLITE_MODES = ('dynamic', 'int8')
+
+# Número máximo de imágenes usadas para calibrar la cuantización int8
+CALIBRATION_SAMPLES = 200
+
+class TFLiteModel:
+    """
+    Modelo TFLite con la misma interfaz de inferencia que un modelo de Keras.
+
+    El intérprete de TFLite no es seguro para hilos, por lo que las invocaciones
+    se serializan con un candado; el tamaño de lote de la entrada se ajusta en
+    cada llamada si cambia.
+    """
+
+    def __init__(self, tflite_path, num_threads=None):
+        self.path = tflite_path
+        self._interpreter = tf.lite.Interpreter(model_path=tflite_path, num_threads=num_threads)
+        self._interpreter.allocate_tensors()
+        self._input = self._interpreter.get_input_details()[0]
+        self._output = self._interpreter.get_output_details()[0]
+        self._batch_size = int(self._input['shape'][0])
+        self._lock = threading.Lock()
+
+    @property
+    def input_shape(self):
+        return (None,) + tuple(int(d) for d in self._input['shape'][1:])
+
+    def predict(self, images, batch_size=None, verbose=0):
+        """
+        Ejecuta el modelo sobre un lote de imágenes
+
+        Args:
+            images: Array (N, altura, anchura, canales)
+
+        Returns:
+            Array NumPy con las salidas del modelo
+        """
+        images = np.asarray(images, dtype=self._input['dtype'])
+
+        with self._lock:
+            if images.shape[0] != self._batch_size:
+                self._interpreter.resize_tensor_input(self._input['index'], images.shape)
+                self._interpreter.allocate_tensors()
+                self._input = self._interpreter.get_input_details()[0]
+                self._output = self._interpreter.get_output_details()[0]
+                self._batch_size = images.shape[0]
+
+            self._interpreter.set_tensor(self._input['index'], images)
+            self._interpreter.invoke()
+            return self._interpreter.get_tensor(self._output['index']).copy()
+
+def convert_to_tflite(model, mode='dynamic', calibration_images=None):
+    """
+    Convierte un modelo de Keras a TFLite con cuantización post-entrenamiento
+
+    Args:
+        model: Modelo de Keras
+        mode: 'dynamic' (pesos int8, activaciones float) o 'int8' (cuantización completa)
+        calibration_images: Imágenes representativas, necesarias para 'int8'
+
+    Returns:
+        Contenido del modelo TFLite (bytes)
+    """
+    if mode not in TFLITE_MODES:
+        raise ValueError(f"Modo de cuantización no soportado: {mode}. Opciones: {', '.join(TFLITE_MODES)}")
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+
+    if mode == 'int8':
+        if calibration_images is None or len(calibration_images) == 0:
+            raise ValueError("La cuantización int8 requiere imágenes de calibración")
+
+        samples = calibration_images[:CALIBRATION_SAMPLES]
+
+        def representative_dataset():
+            for image in samples:
+                yield [np.expand_dims(image, axis=0).astype('float32')]
+
+        # Todas las operaciones en int8; la entrada y la salida siguen siendo float32
+        converter.representative_dataset = representative_dataset
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+
+    return converter.convert()
+
+def _median_latency_ms(fn, image, repeats=20):
+    fn(image)
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn(image)
+        timings.append((time.perf_counter() - start) * 1000.0)
+    return float(np.median(timings))
+
+def export_tflite(model, model_path, mode='dynamic', calibration_images=None, X_eval=None, y_eval=None):
+    """
+    Exporta un modelo a TFLite junto al archivo .h5 y mide su impacto
+
+    Si se proporcionan etiquetas se compara la precisión de ambos modelos; si
+    solo hay imágenes se mide la coincidencia de la clase predicha.
+
+    Args:
+        model: Modelo de Keras
+        model_path: Ruta base del modelo (sin extensión)
+        mode: 'dynamic' o 'int8'
+        calibration_images: Imágenes para calibrar la cuantización int8
+        X_eval: Imágenes para medir precisión y latencia (opcional)
+        y_eval: Etiquetas de X_eval (opcional)
+
+    Returns:
+        Diccionario con la información de la exportación para los metadatos
+    """
+    # Importación local para evitar importaciones circulares
+    from .model import run_inference
+
+    tflite_path = f"{model_path}.tflite"
+    logger.info(f"Exportando modelo a TFLite ({mode}) en '{tflite_path}'")
+
+    tflite_content = convert_to_tflite(model, mode, calibration_images)
+    with open(tflite_path, 'wb') as f:
+        f.write(tflite_content)
+
+    info = {
+        'mode': mode,
+        'size_bytes': len(tflite_content),
+        'keras_size_bytes': os.path.getsize(f"{model_path}.h5") if os.path.exists(f"{model_path}.h5") else None,
+        'calibration_samples': min(len(calibration_images), CALIBRATION_SAMPLES) if mode == 'int8' else 0,
+        'created_at': datetime.datetime.now().isoformat()
+    }
+
+    if X_eval is None or len(X_eval) == 0:
+        return info
+
+    tflite_model = TFLiteModel(tflite_path)
+
+    # Comparar predicciones de ambos modelos
+    keras_predictions = np.argmax(run_inference(model, X_eval), axis=1)
+    tflite_predictions = np.concatenate([
+        np.argmax(tflite_model.predict(X_eval[i:i + 32]), axis=1) for i in range(0, len(X_eval), 32)
+    ])
+    info['evaluation_samples'] = int(len(X_eval))
+    info['agreement'] = float(np.mean(keras_predictions == tflite_predictions))
+
+    if y_eval is not None:
+        keras_accuracy = float(np.mean(keras_predictions == y_eval))
+        tflite_accuracy = float(np.mean(tflite_predictions == y_eval))
+        info['keras_accuracy'] = keras_accuracy
+        info['accuracy'] = tflite_accuracy
+        info['accuracy_delta'] = tflite_accuracy - keras_accuracy
+
+    # Latencia de una imagen con cada motor
+    single_image = X_eval[:1]
+    info['keras_latency_ms'] = _median_latency_ms(lambda x: run_inference(model, x), single_image)
+    info['latency_ms'] = _median_latency_ms(tflite_model.predict, single_image)
+
+    logger.info(f"Exportación TFLite completada: {info}")
+    return info
+
+def load_tflite_model(model_path):
+    """
+    Carga el modelo TFLite exportado de un modelo CNN
+
+    Args:
+        model_path: Ruta base del modelo (sin extensión)
+
+    Returns:
+        Modelo TFLite cargado y metadatos (si existen)
+    """
+    # Importación local para evitar importaciones circulares
+    from ml.common.model_storage import load_model_metadata
+
+    tflite_path = f"{model_path}.tflite"
+    if not os.path.exists(tflite_path):
+        raise FileNotFoundError(f"El modelo no tiene una versión TFLite exportada: '{tflite_path}'")
+
+    logger.info(f"Cargando modelo TFLite desde '{tflite_path}'")
+    return TFLiteModel(tflite_path), load_model_metadata(model_path)
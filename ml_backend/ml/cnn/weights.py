@@ -0,0 +1,309 @@
+import os
+import json
+import time
+import uuid
+import shutil
+import hashlib
+import threading
+import logging
+
+# Configurar logging para depuración
+logger = logging.getLogger(__name__)
+
+# Arquitecturas con base preentrenada en ImageNet
+PRETRAINED_ARCHITECTURES = ('mobilenet', 'vgg16', 'resnet50')
+
+# Resoluciones con pesos propios de MobileNetV2 (las demás usan los de 224)
+MOBILENET_ROWS = (96, 128, 160, 192, 224)
+
+# Índice de los archivos del almacén con su arquitectura y su SHA-256
+MANIFEST_FILE = 'manifest.json'
+
+class WeightsStoreError(RuntimeError):
+    """Error lanzado cuando unos pesos preentrenados no están disponibles o no son válidos"""
+    pass
+
+def weights_filename(architecture, input_shape):
+    """
+    Nombre del archivo de pesos sin capas superiores de una arquitectura
+
+    Coincide con el nombre con el que Keras descarga los pesos, de modo que el
+    almacén se puede poblar con los archivos de ~/.keras/models.
+
+    Args:
+        architecture: 'mobilenet', 'vgg16' o 'resnet50'
+        input_shape: Forma de entrada (altura, anchura, canales)
+
+    Returns:
+        Nombre del archivo .h5
+    """
+    if architecture == 'mobilenet':
+        rows, cols = (int(v) for v in input_shape[:2])
+        if rows != cols or rows not in MOBILENET_ROWS:
+            rows = 224
+        return f'mobilenet_v2_weights_tf_dim_ordering_tf_kernels_1.0_{rows}_no_top.h5'
+    if architecture == 'vgg16':
+        return 'vgg16_weights_tf_dim_ordering_tf_kernels_notop.h5'
+    if architecture == 'resnet50':
+        return 'resnet50_weights_tf_dim_ordering_tf_kernels_notop.h5'
+    raise ValueError(f"Arquitectura sin pesos preentrenados: '{architecture}'")
+
+def known_weights_files():
+    """
+    Devuelve todos los archivos de pesos que puede usar create_cnn_model
+
+    Returns:
+        Diccionario {nombre_archivo: (arquitectura, tamaño de entrada)}
+    """
+    files = {
+        weights_filename('mobilenet', (rows, rows, 3)): ('mobilenet', rows) for rows in MOBILENET_ROWS
+    }
+    files[weights_filename('vgg16', (224, 224, 3))] = ('vgg16', 224)
+    files[weights_filename('resnet50', (224, 224, 3))] = ('resnet50', 224)
+    return files
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    """Calcula el SHA-256 de un archivo en hexadecimal"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _backbone_constructor(architecture):
+    # Importación local: la CLI del almacén no necesita TensorFlow
+    from keras.applications import MobileNetV2, VGG16, ResNet50
+    return {'mobilenet': MobileNetV2, 'vgg16': VGG16, 'resnet50': ResNet50}[architecture]
+
+class WeightsStore:
+    """
+    Almacén local de pesos preentrenados de las bases de los modelos CNN.
+
+    Los archivos se guardan en un directorio con un manifiesto que registra el
+    SHA-256 de cada uno; al cargarlos se verifica el checksum. Si un archivo no
+    está en el almacén, los pesos se descargan de Keras solo cuando está
+    permitido, de modo que los nodos sin acceso a internet fallan con un error
+    claro en lugar de quedarse esperando.
+
+    Los pesos leídos se conservan en memoria y se comparten entre todos los
+    entrenamientos del proceso: cada archivo se lee y se verifica una sola vez,
+    aunque varios trabajos lo pidan a la vez.
+    """
+
+    def __init__(self):
+        self.folder = None
+        self.allow_download = True
+        self._lock = threading.Lock()
+        self._load_locks = {}
+        self._weights = {}
+        self.loads = 0
+        self.shared = 0
+        self.downloads = 0
+
+    def init_app(self, app):
+        """
+        Configura el almacén a partir de la configuración de la aplicación
+
+        Args:
+            app: Aplicación Flask
+        """
+        self.folder = app.config.get('PRETRAINED_WEIGHTS_FOLDER', self.folder)
+        self.allow_download = app.config.get('PRETRAINED_WEIGHTS_ALLOW_DOWNLOAD', self.allow_download)
+        if self.folder:
+            os.makedirs(self.folder, exist_ok=True)
+
+    def manifest(self):
+        """
+        Lee el manifiesto del almacén
+
+        Returns:
+            Diccionario {nombre_archivo: entrada} (vacío si no hay almacén)
+        """
+        if not self.folder:
+            return {}
+        try:
+            with open(os.path.join(self.folder, MANIFEST_FILE)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def add(self, source_path, architecture=None, input_size=None, expected_sha256=None):
+        """
+        Copia un archivo de pesos al almacén y lo registra en el manifiesto
+
+        Args:
+            source_path: Ruta del archivo .h5
+            architecture: Arquitectura de los pesos (se deduce del nombre de los
+                archivos de Keras si no se indica)
+            input_size: Tamaño de entrada de los pesos (solo MobileNetV2)
+            expected_sha256: SHA-256 esperado del archivo (opcional)
+
+        Returns:
+            Tupla (nombre en el almacén, entrada del manifiesto)
+
+        Raises:
+            WeightsStoreError: Si no se puede identificar el archivo o el checksum no coincide
+        """
+        known = known_weights_files().get(os.path.basename(source_path))
+        if architecture is None:
+            if known is None:
+                raise WeightsStoreError(
+                    f"No se reconoce '{os.path.basename(source_path)}': indica la arquitectura"
+                )
+            architecture, input_size = known
+        filename = weights_filename(architecture, (input_size or 224, input_size or 224, 3))
+
+        digest = file_sha256(source_path)
+        if expected_sha256 and digest != expected_sha256.lower():
+            raise WeightsStoreError(f"El SHA-256 de '{source_path}' no coincide: {digest}")
+
+        os.makedirs(self.folder, exist_ok=True)
+        temp_path = os.path.join(self.folder, f".{filename}.{uuid.uuid4().hex}.tmp")
+        shutil.copyfile(source_path, temp_path)
+        os.replace(temp_path, os.path.join(self.folder, filename))
+
+        entry = {
+            'architecture': architecture,
+            'sha256': digest,
+            'size_bytes': os.path.getsize(source_path),
+            'source': os.path.abspath(source_path),
+            'added_at': time.time()
+        }
+        with self._lock:
+            manifest = self.manifest()
+            manifest[filename] = entry
+            self._write_manifest(manifest)
+        return filename, entry
+
+    def verify(self):
+        """
+        Comprueba todos los archivos del manifiesto
+
+        Returns:
+            Diccionario {nombre_archivo: 'ok' | 'missing' | 'checksum_mismatch'}
+        """
+        results = {}
+        for filename, entry in self.manifest().items():
+            path = os.path.join(self.folder, filename)
+            if not os.path.exists(path):
+                results[filename] = 'missing'
+            elif file_sha256(path) != entry['sha256']:
+                results[filename] = 'checksum_mismatch'
+            else:
+                results[filename] = 'ok'
+        return results
+
+    def fingerprint(self, architecture, input_shape):
+        """
+        Identificador de los pesos de una base, para las claves de caché
+
+        Returns:
+            Prefijo del SHA-256 del archivo del almacén o 'imagenet' si se descargan de Keras
+        """
+        entry = self.manifest().get(weights_filename(architecture, input_shape))
+        return entry['sha256'][:12] if entry else 'imagenet'
+
+    def load_weights(self, architecture, input_shape):
+        """
+        Obtiene los pesos de la base de una arquitectura, compartidos en el proceso
+
+        Args:
+            architecture: 'mobilenet', 'vgg16' o 'resnet50'
+            input_shape: Forma de entrada del modelo
+
+        Returns:
+            Lista de arreglos para set_weights (no se deben modificar)
+
+        Raises:
+            WeightsStoreError: Si los pesos no están en el almacén y no se permite
+                descargarlos, o si el checksum no coincide
+        """
+        filename = weights_filename(architecture, input_shape)
+        with self._lock:
+            if filename in self._weights:
+                self.shared += 1
+                return self._weights[filename]
+            load_lock = self._load_locks.setdefault(filename, threading.Lock())
+
+        # Un solo trabajo lee cada archivo; los demás esperan y reutilizan sus pesos
+        with load_lock:
+            with self._lock:
+                if filename in self._weights:
+                    self.shared += 1
+                    return self._weights[filename]
+
+            weights = self._read(architecture, input_shape, filename)
+            with self._lock:
+                self._weights[filename] = weights
+                self.loads += 1
+        return weights
+
+    def build_backbone(self, architecture, input_shape):
+        """
+        Crea la base sin capas superiores de una arquitectura con los pesos del almacén
+
+        Args:
+            architecture: 'mobilenet', 'vgg16' o 'resnet50'
+            input_shape: Forma de entrada del modelo
+
+        Returns:
+            Modelo de Keras de la base
+        """
+        backbone = _backbone_constructor(architecture)(input_shape=tuple(input_shape), include_top=False, weights=None)
+        backbone.set_weights(self.load_weights(architecture, input_shape))
+        return backbone
+
+    def stats(self):
+        """
+        Devuelve estadísticas del almacén
+
+        Returns:
+            Diccionario con los archivos almacenados y cargados y los contadores de uso
+        """
+        manifest = self.manifest()
+        with self._lock:
+            return {
+                'folder': self.folder,
+                'allow_download': self.allow_download,
+                'stored': sorted(manifest),
+                'loaded': sorted(self._weights),
+                'loads': self.loads,
+                'shared': self.shared,
+                'downloads': self.downloads
+            }
+
+    def _read(self, architecture, input_shape, filename):
+        entry = self.manifest().get(filename)
+        path = os.path.join(self.folder, filename) if entry else None
+
+        if path and os.path.exists(path):
+            digest = file_sha256(path)
+            if digest != entry['sha256']:
+                raise WeightsStoreError(
+                    f"El checksum de '{filename}' no coincide con el manifiesto del almacén de pesos"
+                )
+            source = path
+        elif self.allow_download:
+            logger.warning(f"Pesos '{filename}' no encontrados en el almacén local: descargándolos de Keras")
+            source = 'imagenet'
+            with self._lock:
+                self.downloads += 1
+        else:
+            raise WeightsStoreError(
+                f"Los pesos '{filename}' no están en el almacén local ({self.folder}); "
+                f"añádelos con 'python manage_weights.py add'"
+            )
+
+        logger.info(f"Cargando pesos preentrenados de '{architecture}' desde '{source}'")
+        backbone = _backbone_constructor(architecture)(input_shape=tuple(input_shape), include_top=False, weights=source)
+        return backbone.get_weights()
+
+    def _write_manifest(self, manifest):
+        # Escritura atómica: los workers leen el manifiesto sin bloqueos
+        temp_path = os.path.join(self.folder, f".{MANIFEST_FILE}.{uuid.uuid4().hex}.tmp")
+        with open(temp_path, 'w') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(temp_path, os.path.join(self.folder, MANIFEST_FILE))
+
+# Instancia compartida por la creación de modelos CNN
+weights_store = WeightsStore()
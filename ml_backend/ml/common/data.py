@@ -1,11 +1,35 @@
 import os
+import io
+import logging
+import contextlib
 import numpy as np
 import pandas as pd
 import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image, UnidentifiedImageError
 from sklearn.model_selection import train_test_split
-from keras.utils import load_img, img_to_array
 from keras.preprocessing.image import ImageDataGenerator
 
+# Configurar logging para depuración
+logger = logging.getLogger(__name__)
+
+# Configuración de la carga paralela de imágenes (ver configure_image_loading)
+_image_loading_config = {
+    'workers': 0,
+    'chunk_size': 64
+}
+
+def configure_image_loading(workers=0, chunk_size=64):
+    """
+    Configura la carga paralela de imágenes de prepare_image_data
+    
+    Args:
+        workers: Hilos de decodificación (0 para usar los núcleos disponibles)
+        chunk_size: Imágenes que decodifica cada tarea del grupo de hilos
+    """
+    _image_loading_config['workers'] = max(int(workers), 0)
+    _image_loading_config['chunk_size'] = max(int(chunk_size), 1)
+
 def split_data(X, y, test_size=0.2, random_state=None):
     """
     Divide los datos en conjuntos de entrenamiento y prueba
@@ -95,107 +119,289 @@ def prepare_tabular_data(df, target_column, features=None, categorical_columns=N
     
     return X, y, features, encoded_columns
 
-def extract_zip_images_with_classes(zip_path, extract_dir):
+class ZipLimitError(ValueError):
+    """Error lanzado cuando un archivo ZIP supera los límites de ingesta"""
+    pass
+
+class ImageDecodeError(ValueError):
+    """Error lanzado cuando no se puede decodificar una proporción excesiva de las imágenes"""
+
+    def __init__(self, num_failed, total, failures=None):
+        self.num_failed = num_failed
+        self.total = total
+        self.failures = failures or []
+        super().__init__(
+            f"No se pudieron decodificar {num_failed} de {total} imágenes; "
+            f"compruebe que el archivo contiene imágenes PNG o JPEG válidas"
+        )
+
+# Errores esperados al decodificar una imagen: archivo que no es una imagen o
+# está truncado, miembro del ZIP corrupto o inexistente
+IMAGE_DECODE_ERRORS = (OSError, UnidentifiedImageError, zipfile.BadZipFile, KeyError)
+
+def check_zip_limits(zip_ref, members, max_members=None, max_uncompressed_bytes=None, max_compression_ratio=None):
+    """
+    Verifica los límites de ingesta de un ZIP a partir del directorio central,
+    antes de descomprimir ninguna imagen
+    
+    Args:
+        zip_ref: Instancia de zipfile.ZipFile
+        members: Nombres de los miembros que se van a leer
+        max_members: Máximo de entradas del archivo (None sin límite)
+        max_uncompressed_bytes: Máximo del tamaño descomprimido total de los miembros
+        max_compression_ratio: Máxima proporción tamaño descomprimido / comprimido
+            de un miembro (las imágenes apenas se comprimen; valores altos
+            indican una bomba de descompresión)
+    
+    Raises:
+        ZipLimitError: Si el archivo supera alguno de los límites
+    """
+    infos = zip_ref.infolist()
+    if max_members and len(infos) > max_members:
+        raise ZipLimitError(f"El archivo ZIP tiene {len(infos)} entradas (máximo {max_members})")
+    
+    member_infos = {info.filename: info for info in infos}
+    
+    total_bytes = 0
+    for member in members:
+        info = member_infos[member]
+        total_bytes += info.file_size
+        if max_compression_ratio and info.file_size > max_compression_ratio * max(info.compress_size, 1):
+            raise ZipLimitError(
+                f"La imagen '{member}' tiene una proporción de compresión sospechosa "
+                f"({info.file_size} / {info.compress_size} bytes)"
+            )
+    if max_uncompressed_bytes and total_bytes > max_uncompressed_bytes:
+        raise ZipLimitError(
+            f"Las imágenes del ZIP ocupan {total_bytes // (1024 * 1024)} MB descomprimidas "
+            f"(máximo {max_uncompressed_bytes // (1024 * 1024)} MB)"
+        )
+
+def index_zip_images(zip_ref, max_members=None, max_uncompressed_bytes=None, max_compression_ratio=None):
     """
-    Extrae imágenes de un archivo ZIP manteniendo la estructura de carpetas
+    Obtiene las imágenes de un ZIP y sus clases a partir del directorio central,
+    sin leer ni extraer su contenido
+    
+    La clase de cada imagen es la primera carpeta de su ruta. Si ninguna imagen
+    está en una carpeta, todas pertenecen a una única clase por defecto. Las
+    clases se numeran por orden alfabético.
+    
+    Args:
+        zip_ref: Instancia de zipfile.ZipFile
+        max_members: Máximo de entradas del archivo (None sin límite)
+        max_uncompressed_bytes: Máximo del tamaño descomprimido total de las imágenes
+        max_compression_ratio: Máxima proporción tamaño descomprimido / comprimido
+            de una imagen (ver check_zip_limits)
+    
+    Returns:
+        Tupla con:
+        - Lista de nombres de los miembros que son imágenes
+        - Lista de etiquetas correspondientes
+        - Diccionario con mapeo de clases {índice: nombre_clase}
+    
+    Raises:
+        ZipLimitError: Si el archivo supera alguno de los límites
+    """
+    members = list_zip_image_members(zip_ref)
+    check_zip_limits(
+        zip_ref, members, max_members=max_members,
+        max_uncompressed_bytes=max_uncompressed_bytes, max_compression_ratio=max_compression_ratio
+    )
+    
+    # Las imágenes en carpetas usan la carpeta como clase; las de la raíz solo
+    # se usan si no hay ninguna carpeta
+    in_folders = [member for member in members if '/' in member]
+    if in_folders:
+        class_names = sorted({member.split('/', 1)[0] for member in in_folders})
+        class_to_index = {name: index for index, name in enumerate(class_names)}
+        labels = [class_to_index[member.split('/', 1)[0]] for member in in_folders]
+        class_mapping = dict(enumerate(class_names))
+        return in_folders, labels, class_mapping
+    
+    if not members:
+        return [], [], {}
+    return members, [0] * len(members), {0: "Sin clasificar"}
+
+def extract_zip_images_with_classes(zip_path, extract_dir, members=None, **limits):
+    """
+    Extrae las imágenes de un archivo ZIP manteniendo la estructura de carpetas
     y detectando automáticamente las clases
     
+    Solo se extraen las imágenes; las clases se obtienen del directorio central
+    con index_zip_images.
+    
     Args:
         zip_path: Ruta al archivo ZIP
         extract_dir: Directorio donde extraer las imágenes
+        members: Imágenes a extraer, si ya se indexó el archivo (opcional)
+        **limits: Límites de index_zip_images
     
     Returns:
         Tupla con:
         - Lista de rutas a las imágenes extraídas
         - Lista de etiquetas correspondientes
         - Diccionario con mapeo de clases {índice: nombre_clase}
-    """    
-    # Crear directorio si no existe
+    """
     os.makedirs(extract_dir, exist_ok=True)
     
-    # Estructuras para almacenar datos
-    image_paths = []
-    labels = []
-    class_mapping = {}
-    class_to_index = {}
-    
-    # Extensiones de imagen permitidas
-    allowed_extensions = {'.jpg', '.jpeg', '.png'}
-    
-    # Extraer archivos del ZIP
     with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-        # Extraer todo el contenido
-        zip_ref.extractall(extract_dir)
-        
-        # Buscar imágenes en la estructura de carpetas
-        for root, dirs, files in os.walk(extract_dir):
-            for file in files:
-                # Verificar si es una imagen
-                if os.path.splitext(file.lower())[1] in allowed_extensions:
-                    # Obtener la ruta completa
-                    full_path = os.path.join(root, file)
-                    
-                    # Obtener el nombre de la carpeta padre (clase)
-                    relative_path = os.path.relpath(full_path, extract_dir)
-                    path_parts = relative_path.split(os.sep)
-                    
-                    # Si la imagen está en una subcarpeta, usar esa como clase
-                    if len(path_parts) > 1:
-                        class_name = path_parts[0]
-                        
-                        # Asignar índice a la clase si no existe
-                        if class_name not in class_to_index:
-                            class_index = len(class_to_index)
-                            class_to_index[class_name] = class_index
-                            class_mapping[class_index] = class_name
-                        
-                        # Agregar imagen y etiqueta
-                        image_paths.append(full_path)
-                        labels.append(class_to_index[class_name])
-    
-    # Si no se encontraron clases (todas las imágenes en raíz), crear una clase por defecto
-    if not class_mapping:
-        # Buscar imágenes en el directorio raíz
-        for file in os.listdir(extract_dir):
-            if os.path.splitext(file.lower())[1] in allowed_extensions:
-                full_path = os.path.join(extract_dir, file)
-                image_paths.append(full_path)
-                labels.append(0)
-        
-        if image_paths:
-            class_mapping[0] = "Sin clasificar"
+        labels, class_mapping = None, None
+        if members is None:
+            members, labels, class_mapping = index_zip_images(zip_ref, **limits)
+        image_paths = [zip_ref.extract(member, extract_dir) for member in members]
     
     return image_paths, labels, class_mapping
 
-def prepare_image_data(image_paths, img_height, img_width, labels=None):
+def decode_image(source, img_height, img_width):
+    """
+    Decodifica una imagen RGB y la redimensiona al tamaño objetivo
+    
+    Los JPEG mucho mayores que el destino se decodifican directamente a escala
+    reducida (modo draft de Pillow: 1/2, 1/4 o 1/8 del tamaño original), lo que
+    evita decodificar la imagen completa para descartar la mayoría de píxeles.
+    
+    Args:
+        source: Ruta o archivo abierto de la imagen
+        img_height: Altura objetivo de la imagen
+        img_width: Anchura objetivo de la imagen
+    
+    Returns:
+        Array uint8 (altura, anchura, 3)
+    """
+    with Image.open(source) as img:
+        if img.format == 'JPEG':
+            # Escala más reducida que sigue siendo mayor o igual que el destino
+            img.draft('RGB', (img_width, img_height))
+        img = img.convert('RGB')
+        if img.size != (img_width, img_height):
+            img = img.resize((img_width, img_height), Image.NEAREST)
+        return np.asarray(img)
+
+def _decode_images_parallel(sources, img_height, img_width, zip_path=None, failures=None):
+    """
+    Decodifica imágenes en paralelo en un arreglo uint8
+    
+    Returns:
+        Arreglo (N, altura, anchura, 3); las imágenes con error quedan en negro
+    """
+    # Preparar contenedor para imágenes (píxeles en bruto: el modelo los normaliza)
+    X = np.zeros((len(sources), img_height, img_width, 3), dtype=np.uint8)
+    decode_images_into(X, sources, img_height, img_width, zip_path=zip_path, failures=failures)
+    return X
+
+def decode_images_into(out, sources, img_height, img_width, zip_path=None, failures=None):
+    """
+    Decodifica imágenes en paralelo en un arreglo de salida ya reservado
+    
+    Args:
+        out: Arreglo uint8 (N, altura, anchura, 3) inicializado a cero que recibe
+            los píxeles tal cual (el modelo los normaliza). Puede ser un memmap
+            para escribir las imágenes directamente en disco
+        sources: Rutas de las imágenes o nombres de miembros de zip_path
+        img_height: Altura objetivo de las imágenes
+        img_width: Anchura objetivo de las imágenes
+        zip_path: Archivo ZIP del que leer los miembros (None si son rutas)
+        failures: Lista donde añadir los fallos de decodificación como
+            diccionarios {'index', 'path', 'error'} (opcional)
+    
+    Raises:
+        TypeError: Si el arreglo de salida no es uint8
+    """
+    if out.dtype != np.uint8:
+        raise TypeError(f"El arreglo de salida debe ser uint8, no {out.dtype}")
+    
+    def load_chunk(start):
+        chunk_failures = []
+        # Cada bloque usa su propio descriptor del ZIP para leer sin bloqueos compartidos
+        with (zipfile.ZipFile(zip_path, 'r') if zip_path else contextlib.nullcontext()) as zip_ref:
+            for i in range(start, min(start + chunk_size, len(sources))):
+                try:
+                    source = io.BytesIO(zip_ref.read(sources[i])) if zip_path else sources[i]
+                    out[i] = decode_image(source, img_height, img_width)
+                except IMAGE_DECODE_ERRORS as e:
+                    # Cualquier otro error es un fallo del servidor y se propaga
+                    chunk_failures.append({'index': i, 'path': str(sources[i]), 'error': str(e)})
+        return chunk_failures
+    
+    chunk_size = _image_loading_config['chunk_size']
+    starts = range(0, len(sources), chunk_size)
+    workers = min(_image_loading_config['workers'] or os.cpu_count() or 1, len(starts))
+    
+    if workers <= 1:
+        results = [load_chunk(start) for start in starts]
+    else:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='image-loader') as executor:
+            results = list(executor.map(load_chunk, starts))
+    
+    load_failures = [failure for chunk_failures in results for failure in chunk_failures]
+    if load_failures:
+        logger.warning(
+            f"No se pudieron decodificar {len(load_failures)} de {len(sources)} imágenes "
+            f"(primera: {load_failures[0]['path']}: {load_failures[0]['error']})"
+        )
+        if failures is not None:
+            failures.extend(load_failures)
+
+def check_decode_failures(num_failed, total, max_failed_fraction, failures=None):
+    """
+    Verifica que la proporción de imágenes que no se pudieron decodificar es aceptable
+    
+    Args:
+        num_failed: Imágenes que no se pudieron decodificar
+        total: Imágenes totales
+        max_failed_fraction: Proporción máxima de fallos admitida
+        failures: Fallos de decodificación a incluir en el error (opcional)
+    
+    Raises:
+        ImageDecodeError: Si fallaron todas las imágenes o más de la proporción admitida
+    """
+    if total and (num_failed >= total or num_failed > max_failed_fraction * total):
+        raise ImageDecodeError(num_failed, total, failures)
+
+def probe_zip_images(zip_path, members, img_height, img_width, samples):
+    """
+    Decodifica una muestra de las imágenes de un ZIP repartida por todo el archivo
+    
+    Permite rechazar un archivo sin imágenes válidas antes de encolar el
+    entrenamiento, sin decodificar el conjunto completo.
+    
+    Args:
+        zip_path: Ruta al archivo ZIP
+        members: Imágenes del ZIP (ver index_zip_images)
+        img_height: Altura objetivo de las imágenes
+        img_width: Anchura objetivo de las imágenes
+        samples: Número máximo de imágenes a decodificar
+    
+    Returns:
+        Tupla (número de imágenes decodificadas de prueba, lista de fallos)
+    """
+    step = max(len(members) // max(samples, 1), 1)
+    sample = members[::step][:samples]
+    failures = []
+    _decode_images_parallel(sample, img_height, img_width, zip_path=zip_path, failures=failures)
+    return len(sample), failures
+
+def prepare_image_data(image_paths, img_height, img_width, labels=None, failures=None):
     """
     Prepara datos de imágenes para el entrenamiento
     
+    Las imágenes se decodifican en paralelo por bloques en un grupo de hilos
+    (Pillow libera el GIL al decodificar y redimensionar) y cada hilo escribe
+    en su posición de un único arreglo reservado de antemano. Las imágenes que
+    no se pueden decodificar quedan en negro.
+    
     Args:
         image_paths: Lista de rutas a las imágenes
         img_height: Altura objetivo de las imágenes
         img_width: Anchura objetivo de las imágenes
         labels: Etiquetas correspondientes a las imágenes (opcional)
+        failures: Lista donde añadir los fallos de decodificación como
+            diccionarios {'index', 'path', 'error'} (opcional)
     
     Returns:
-        X, y (si se proporcionaron etiquetas)
-    """
-    # Preparar contenedor para imágenes
-    X = np.zeros((len(image_paths), img_height, img_width, 3), dtype='float32')
-    
-    # Cargar y preprocesar cada imagen
-    for i, path in enumerate(image_paths):
-        try:
-            # Cargar imagen y redimensionar
-            img = load_img(path, target_size=(img_height, img_width))
-            # Convertir a array y normalizar a [0,1]
-            img_array = img_to_array(img) / 255.0
-            # Almacenar en el arreglo
-            X[i] = img_array
-        except Exception as e:
-            print(f"Error al procesar imagen {path}: {str(e)}")
-            # En caso de error, usar una imagen en negro
-            X[i] = np.zeros((img_height, img_width, 3))
+        X (uint8, píxeles en [0,255]), y (si se proporcionaron etiquetas)
+    """
+    X = _decode_images_parallel(image_paths, img_height, img_width, failures=failures)
     
     # Si se proporcionaron etiquetas, devolverlas junto con las imágenes
     if labels is not None:
@@ -203,6 +409,67 @@ def prepare_image_data(image_paths, img_height, img_width, labels=None):
     
     return X, None
 
+def prepare_zip_image_data(zip_path, members, img_height, img_width, labels=None, failures=None):
+    """
+    Prepara datos de imágenes leyéndolas directamente de un archivo ZIP
+    
+    Igual que prepare_image_data, pero cada imagen se decodifica desde los
+    bytes de su miembro del ZIP sin extraerla al disco.
+    
+    Args:
+        zip_path: Ruta al archivo ZIP
+        members: Nombres de los miembros a cargar (ver index_zip_images)
+        img_height: Altura objetivo de las imágenes
+        img_width: Anchura objetivo de las imágenes
+        labels: Etiquetas correspondientes a las imágenes (opcional)
+        failures: Lista donde añadir los fallos de decodificación (opcional)
+    
+    Returns:
+        X (uint8, píxeles en [0,255]), y (si se proporcionaron etiquetas)
+    """
+    X = _decode_images_parallel(members, img_height, img_width, zip_path=zip_path, failures=failures)
+    
+    if labels is not None:
+        return X, np.array(labels)
+    
+    return X, None
+
+def load_image_from_bytes(image_bytes, img_height, img_width):
+    """
+    Decodifica una imagen en memoria y la prepara para la predicción
+    
+    Args:
+        image_bytes: Contenido del archivo de imagen
+        img_height: Altura objetivo de la imagen
+        img_width: Anchura objetivo de la imagen
+    
+    Returns:
+        Array uint8 (altura, anchura, 3) de la imagen
+    """
+    return decode_image(io.BytesIO(image_bytes), img_height, img_width)
+
+def list_zip_image_members(zip_ref):
+    """
+    Obtiene los nombres de las imágenes contenidas en un archivo ZIP abierto
+    
+    Args:
+        zip_ref: Instancia de zipfile.ZipFile
+    
+    Returns:
+        Lista con los nombres de los miembros que son imágenes
+    """
+    allowed_extensions = {'.jpg', '.jpeg', '.png'}
+    
+    members = []
+    for info in zip_ref.infolist():
+        # Ignorar directorios y metadatos de macOS
+        if info.is_dir() or info.filename.startswith('__MACOSX/'):
+            continue
+        if os.path.splitext(info.filename.lower())[1] in allowed_extensions:
+            members.append(info.filename)
+    
+    return members
+
 def create_image_data_generator(
     rotation_range=20, 
     width_shift_range=0.2, 
@@ -385,4 +652,109 @@ def prepare_tabular_data(df, target_column, features=None, categorical_columns=N
     X = df_copy[features].values
     y = df_copy[target_column].values
     
-    return X, y, features, encoded_columns
\ No newline at end of file
+    return X, y, features, encoded_columns
+
+def detect_csv_encoding(file_path, sample_size=65536):
+    """
+    Detecta la codificación de un archivo CSV a partir de una muestra inicial
+    
+    Args:
+        file_path: Ruta al archivo
+        sample_size: Número de bytes a inspeccionar
+    
+    Returns:
+        Nombre de la codificación ('utf-8' o 'latin-1')
+    """
+    with open(file_path, 'rb') as f:
+        sample = f.read(sample_size)
+    
+    try:
+        sample.decode('utf-8')
+        return 'utf-8'
+    except UnicodeDecodeError as e:
+        # Un carácter multibyte cortado al final de la muestra no indica otra codificación
+        if e.start >= len(sample) - 3:
+            return 'utf-8'
+        return 'latin-1'
+
+def iter_tabular_chunks(file_path, chunk_size=10000):
+    """
+    Lee un archivo CSV o Excel por bloques de filas
+    
+    Los CSV se leen de forma incremental, sin cargar el archivo completo en memoria.
+    Los archivos Excel no admiten lectura incremental, por lo que se cargan y se
+    dividen en bloques.
+    
+    Args:
+        file_path: Ruta al archivo
+        chunk_size: Número de filas por bloque
+    
+    Returns:
+        Iterador de DataFrames
+    """
+    if file_path.endswith('.csv'):
+        encoding = detect_csv_encoding(file_path)
+        for chunk in pd.read_csv(file_path, encoding=encoding, chunksize=chunk_size):
+            yield chunk
+    elif file_path.endswith(('.xlsx', '.xls')):
+        df = pd.read_excel(file_path)
+        for start in range(0, len(df), chunk_size):
+            yield df.iloc[start:start + chunk_size]
+    else:
+        raise ValueError(f"Formato de archivo no soportado: {file_path}")
+
+def encode_feature_frame(df, features, categorical_columns=None, encoded_columns=None):
+    """
+    Codifica las características de un DataFrame para predicción usando
+    operaciones vectorizadas por columna
+    
+    Las columnas categóricas se traducen con el mismo mapeo de categorías
+    generado por prepare_tabular_data durante el entrenamiento.
+    
+    Args:
+        df: DataFrame con las características
+        features: Lista ordenada de columnas que espera el modelo
+        categorical_columns: Lista de columnas categóricas
+        encoded_columns: Mapeo {columna: {código: categoría}} guardado en los metadatos
+    
+    Returns:
+        Matriz NumPy (filas x características) lista para el modelo
+    
+    Raises:
+        ValueError: Si faltan columnas o hay valores no reconocidos
+    """
+    categorical_columns = categorical_columns or []
+    encoded_columns = encoded_columns or {}
+    
+    # Verificar que todas las características existen
+    missing_features = [col for col in features if col not in df.columns]
+    if missing_features:
+        raise ValueError(f"Faltan características requeridas: {', '.join(missing_features)}")
+    
+    X = np.empty((len(df), len(features)), dtype='float64')
+    
+    for i, feature in enumerate(features):
+        column = df[feature]
+        
+        if feature in categorical_columns and feature in encoded_columns:
+            # Invertir el mapeo una sola vez por columna: categoría -> código
+            category_to_code = {str(category): int(code) for code, category in encoded_columns[feature].items()}
+            codes = column.astype(str).map(category_to_code)
+            
+            unknown = codes.isna()
+            if unknown.any():
+                value = column[unknown].iloc[0]
+                raise ValueError(f"Valor '{value}' no reconocido para la característica categórica '{feature}'")
+            
+            X[:, i] = codes.to_numpy(dtype='float64')
+        else:
+            values = pd.to_numeric(column, errors='coerce')
+            
+            invalid = values.isna() & column.notna()
+            if invalid.any():
+                value = column[invalid].iloc[0]
+                raise ValueError(f"Valor '{value}' no numérico para la característica '{feature}'")
+            
+            X[:, i] = values.to_numpy(dtype='float64')
+    
+    return X
\ No newline at end of file
@@ -0,0 +1,255 @@
+import os
+import json
+import time
+import uuid
+import shutil
+import hashlib
+import threading
+import logging
+
+import numpy as np
+
+from .data import decode_images_into
+
+# Configurar logging para depuración
+logger = logging.getLogger(__name__)
+
+# Archivos de cada entrada de la caché
+IMAGES_FILE = 'images.npy'
+LABELS_FILE = 'labels.npy'
+META_FILE = 'meta.json'
+
+# Fallos de decodificación guardados en los metadatos de una entrada
+MAX_STORED_FAILURES = 100
+
+def save_upload_with_hash(file, path, chunk_size=1024 * 1024):
+    """
+    Guarda un archivo subido calculando su SHA-256 en la misma pasada
+
+    Args:
+        file: FileStorage de Werkzeug
+        path: Ruta de destino
+        chunk_size: Bytes leídos en cada iteración
+
+    Returns:
+        Hash SHA-256 en hexadecimal
+    """
+    digest = hashlib.sha256()
+    with open(path, 'wb') as output:
+        while True:
+            chunk = file.stream.read(chunk_size)
+            if not chunk:
+                break
+            digest.update(chunk)
+            output.write(chunk)
+    return digest.hexdigest()
+
+class DatasetCache:
+    """
+    Caché en disco de conjuntos de imágenes ya decodificados, direccionada por contenido.
+
+    Cada entrada se identifica por el SHA-256 del ZIP subido y el tamaño de
+    destino de las imágenes, y guarda las imágenes como un arreglo uint8
+    (N, altura, anchura, 3) en formato .npy, que se abre como memmap, junto con
+    las etiquetas y el mapeo de clases. Volver a entrenar con el mismo ZIP y
+    tamaño no extrae ni decodifica nada. Las entradas se escriben en un
+    directorio temporal y se publican con un rename atómico, así que los
+    workers que comparten el directorio nunca leen una entrada a medias. Al
+    superar el tamaño máximo se eliminan las entradas usadas hace más tiempo.
+    """
+
+    # Prefijo de las claves de configuración y descripción de las entradas en el log
+    CONFIG_PREFIX = 'DATASET_CACHE'
+    ENTRY_DESCRIPTION = 'Conjunto de imágenes'
+
+    def __init__(self, max_bytes=10 * 1024 * 1024 * 1024):
+        self.enabled = False
+        self.folder = None
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def init_app(self, app):
+        """
+        Configura la caché a partir de la configuración de la aplicación
+
+        Args:
+            app: Aplicación Flask
+        """
+        self.enabled = app.config.get(f'{self.CONFIG_PREFIX}_ENABLED', self.enabled)
+        self.folder = app.config.get(f'{self.CONFIG_PREFIX}_FOLDER', self.folder)
+        self.max_bytes = app.config.get(f'{self.CONFIG_PREFIX}_MAX_BYTES', self.max_bytes)
+        if self.enabled and self.folder:
+            os.makedirs(self.folder, exist_ok=True)
+
+    def make_key(self, archive_hash, img_height, img_width):
+        """
+        Construye la clave de un conjunto de imágenes
+
+        Args:
+            archive_hash: SHA-256 del ZIP subido
+            img_height: Altura de las imágenes decodificadas
+            img_width: Anchura de las imágenes decodificadas
+
+        Returns:
+            Clave (nombre del directorio de la entrada) o None si la caché está desactivada
+        """
+        if not self.enabled or not self.folder:
+            return None
+        return f"{archive_hash}_{int(img_height)}x{int(img_width)}"
+
+    def get(self, key):
+        """
+        Abre una entrada de la caché y la marca como usada
+
+        Args:
+            key: Clave devuelta por make_key
+
+        Returns:
+            Diccionario con 'images' (memmap uint8 de solo lectura), 'labels',
+            'class_mapping', 'failed_images' y 'num_failed', o None si no existe
+        """
+        if key is None:
+            return None
+
+        entry_dir = os.path.join(self.folder, key)
+        try:
+            entry = self._open(entry_dir)
+            # La fecha de modificación de los metadatos marca el último uso (LRU)
+            os.utime(os.path.join(entry_dir, META_FILE))
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        return entry
+
+    def build(self, key, zip_path, members, labels, class_mapping, img_height, img_width):
+        """
+        Decodifica las imágenes de un ZIP directamente en una nueva entrada
+
+        Las imágenes se escriben en el archivo .npy a medida que se decodifican,
+        sin reservar el conjunto completo en memoria.
+
+        Args:
+            key: Clave devuelta por make_key
+            zip_path: Ruta al archivo ZIP
+            members: Imágenes del ZIP (ver index_zip_images)
+            labels: Etiquetas de las imágenes
+            class_mapping: Mapeo de clases {índice: nombre_carpeta}
+            img_height: Altura objetivo de las imágenes
+            img_width: Anchura objetivo de las imágenes
+
+        Returns:
+            Entrada abierta, como en get
+        """
+        def write_entry(temp_dir):
+            images = np.lib.format.open_memmap(
+                os.path.join(temp_dir, IMAGES_FILE), mode='w+', dtype=np.uint8,
+                shape=(len(members), img_height, img_width, 3)
+            )
+            failures = []
+            decode_images_into(images, members, img_height, img_width, zip_path=zip_path, failures=failures)
+            images.flush()
+            del images
+
+            np.save(os.path.join(temp_dir, LABELS_FILE), np.asarray(labels, dtype=np.int32))
+            with open(os.path.join(temp_dir, META_FILE), 'w') as f:
+                json.dump({
+                    'class_mapping': {str(index): name for index, name in class_mapping.items()},
+                    'num_images': len(members),
+                    'num_failed': len(failures),
+                    'failed_images': failures[:MAX_STORED_FAILURES],
+                    'created_at': time.time()
+                }, f)
+
+        return self._publish(key, write_entry)
+
+    def stats(self):
+        """
+        Devuelve estadísticas de uso de la caché
+
+        Returns:
+            Diccionario con entradas, tamaño en disco, aciertos, fallos y desalojos
+        """
+        entries = self._entries() if self.enabled and self.folder else []
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'entries': len(entries),
+                'size_bytes': sum(size for _, _, size in entries),
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
+
+    def _publish(self, key, write_entry):
+        # Escribir la entrada en un directorio temporal y publicarla con un rename atómico
+        entry_dir = os.path.join(self.folder, key)
+        temp_dir = os.path.join(self.folder, f".{key}.{uuid.uuid4().hex}.tmp")
+        os.makedirs(temp_dir)
+
+        try:
+            write_entry(temp_dir)
+            try:
+                os.rename(temp_dir, entry_dir)
+            except OSError:
+                # Otro trabajo publicó la misma entrada mientras se escribía
+                shutil.rmtree(temp_dir, ignore_errors=True)
+        except BaseException:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+            raise
+
+        self._evict(keep=key)
+        return self._open(entry_dir)
+
+    def _open(self, entry_dir):
+        with open(os.path.join(entry_dir, META_FILE)) as f:
+            meta = json.load(f)
+        return {
+            'images': np.load(os.path.join(entry_dir, IMAGES_FILE), mmap_mode='r'),
+            'labels': np.load(os.path.join(entry_dir, LABELS_FILE)),
+            'class_mapping': {int(index): name for index, name in meta['class_mapping'].items()},
+            'failed_images': meta['failed_images'],
+            'num_failed': meta['num_failed']
+        }
+
+    def _entries(self):
+        # Entradas publicadas como (clave, último uso, tamaño en bytes)
+        entries = []
+        for key in os.listdir(self.folder):
+            entry_dir = os.path.join(self.folder, key)
+            if key.startswith('.') or not os.path.isdir(entry_dir):
+                continue
+            try:
+                last_used = os.path.getmtime(os.path.join(entry_dir, META_FILE))
+                size = sum(entry.stat().st_size for entry in os.scandir(entry_dir) if entry.is_file())
+            except OSError:
+                continue
+            entries.append((key, last_used, size))
+        return entries
+
+    def _evict(self, keep=None):
+        # Eliminar las entradas usadas hace más tiempo hasta respetar el tamaño máximo.
+        # Los trabajos que ya tienen abierto un memmap de una entrada eliminada
+        # siguen leyéndolo: el archivo se libera al cerrarlo.
+        entries = sorted(self._entries(), key=lambda entry: entry[1])
+        total = sum(size for _, _, size in entries)
+        for key, _, size in entries:
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            shutil.rmtree(os.path.join(self.folder, key), ignore_errors=True)
+            total -= size
+            with self._lock:
+                self.evictions += 1
+            logger.info(f"{self.ENTRY_DESCRIPTION} '{key}' eliminado de la caché")
+
+# Instancia compartida por los endpoints de entrenamiento
+dataset_cache = DatasetCache()
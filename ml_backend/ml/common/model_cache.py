@@ -0,0 +1,269 @@
+import os
+import threading
+import logging
+from collections import OrderedDict
+from flask import has_app_context
+
+from ml.common.model_storage import load_tensorflow_model, load_sklearn_model
+from ml.common.registry import touch_model
+from ml.cnn.tflite import load_tflite_model
+
+# Configurar logging para depuración
+logger = logging.getLogger(__name__)
+
+class ModelCache:
+    """
+    Caché en memoria de modelos cargados, compartida por todos los hilos del proceso.
+
+    Las entradas se identifican por la ruta del modelo, el archivo cargado (.h5,
+    .pkl o .tflite) y su fecha de modificación (mtime), de modo que un modelo
+    regenerado en disco invalida la entrada anterior. Cuando el tamaño estimado
+    de los modelos supera el presupuesto de memoria se descartan los menos usados
+    recientemente (LRU).
+
+    Al cargar cada modelo se mide la variación de la memoria residente (RSS) del
+    proceso y de su parte privada (no respaldada por archivos), que es la que no
+    se comparte entre workers cuando los arreglos se mapean en memoria.
+    """
+
+    def __init__(self, max_bytes=1024 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.enabled = True
+        self._entries = OrderedDict()
+        self._current_bytes = 0
+        self._lock = threading.Lock()
+        self._loading_locks = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def init_app(self, app):
+        """
+        Configura la caché a partir de la configuración de la aplicación
+
+        Args:
+            app: Aplicación Flask
+        """
+        self.max_bytes = app.config.get('MODEL_CACHE_MAX_BYTES', self.max_bytes)
+        self.enabled = app.config.get('MODEL_CACHE_ENABLED', True)
+
+    def get_tensorflow_model(self, model_path, touch=True):
+        """
+        Obtiene un modelo de TensorFlow/Keras desde la caché o lo carga desde disco
+
+        Args:
+            model_path: Ruta base del modelo (sin extensión)
+            touch: Registrar el uso del modelo (False en la precarga, que no es un uso real)
+
+        Returns:
+            Modelo cargado y metadatos (si existen)
+        """
+        return self._get(model_path, f"{model_path}.h5", load_tensorflow_model, touch=touch)
+
+    def get_sklearn_model(self, model_path, touch=True):
+        """
+        Obtiene un modelo de scikit-learn desde la caché o lo carga desde disco
+
+        Args:
+            model_path: Ruta base del modelo (sin extensión)
+            touch: Registrar el uso del modelo (False en la precarga, que no es un uso real)
+
+        Returns:
+            Modelo cargado y metadatos (si existen)
+        """
+        return self._get(model_path, f"{model_path}.pkl", load_sklearn_model, touch=touch)
+
+    def get_tflite_model(self, model_path, touch=True):
+        """
+        Obtiene la versión TFLite de un modelo CNN desde la caché o la carga desde disco
+
+        Args:
+            model_path: Ruta base del modelo (sin extensión)
+            touch: Registrar el uso del modelo (False en la precarga, que no es un uso real)
+
+        Returns:
+            Modelo TFLite cargado y metadatos (si existen)
+        """
+        return self._get(model_path, f"{model_path}.tflite", load_tflite_model, touch=touch)
+
+    def invalidate(self, model_path):
+        """
+        Elimina de la caché todas las entradas de un modelo
+
+        Args:
+            model_path: Ruta base del modelo (sin extensión)
+        """
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == model_path]:
+                self._remove(key)
+
+    def clear(self):
+        """Vacía la caché por completo"""
+        with self._lock:
+            self._entries.clear()
+            self._current_bytes = 0
+
+    def stats(self):
+        """
+        Devuelve los contadores de uso de la caché
+
+        Returns:
+            Diccionario con aciertos, fallos, desalojos y ocupación
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'enabled': self.enabled,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'current_bytes': self._current_bytes,
+                'max_bytes': self.max_bytes,
+                'process_memory': _process_memory(),
+                'models': [
+                    {
+                        'file': key[1],
+                        'size_bytes': entry['size'],
+                        'rss_delta_bytes': entry['rss_delta'],
+                        'private_delta_bytes': entry['private_delta']
+                    }
+                    for key, entry in self._entries.items()
+                ]
+            }
+
+    def _get(self, model_path, file_path, loader, touch=True):
+        # Registrar el uso del modelo para la precarga al iniciar
+        if touch and has_app_context():
+            touch_model(model_path)
+
+        if not self.enabled:
+            return loader(model_path)
+
+        # Si el archivo no existe se delega en el cargador para que lance el error habitual
+        try:
+            mtime = os.path.getmtime(file_path)
+        except OSError:
+            return loader(model_path)
+
+        key = (model_path, file_path, mtime)
+
+        entry = self._lookup(key)
+        if entry is not None:
+            return entry['model'], entry['metadata']
+
+        # Un único hilo carga cada modelo; el resto espera y reutiliza el resultado
+        with self._lock:
+            loading_lock = self._loading_locks.setdefault(key, threading.Lock())
+
+        with loading_lock:
+            entry = self._lookup(key)
+            if entry is not None:
+                return entry['model'], entry['metadata']
+
+            with self._lock:
+                self.misses += 1
+
+            memory_before = _process_memory()
+            try:
+                model, metadata = loader(model_path)
+            except Exception:
+                with self._lock:
+                    self._loading_locks.pop(key, None)
+                raise
+
+            size = _estimate_model_size(model, file_path)
+
+            # Memoria del worker atribuible a la carga (aproximada si hay cargas simultáneas)
+            memory_after = _process_memory()
+            rss_delta = private_delta = None
+            if memory_before and memory_after:
+                rss_delta = memory_after['rss_bytes'] - memory_before['rss_bytes']
+                private_delta = memory_after['private_bytes'] - memory_before['private_bytes']
+
+            with self._lock:
+                # Descartar versiones anteriores del mismo archivo
+                for old_key in [k for k in self._entries if k[1] == file_path and k != key]:
+                    self._remove(old_key)
+
+                self._entries[key] = {
+                    'model': model,
+                    'metadata': metadata,
+                    'size': size,
+                    'rss_delta': rss_delta,
+                    'private_delta': private_delta
+                }
+                self._current_bytes += size
+                self._loading_locks.pop(key, None)
+                self._evict()
+
+        return model, metadata
+
+    def _lookup(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            return entry
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._current_bytes -= entry['size']
+
+    def _evict(self):
+        # Siempre se conserva al menos el modelo más reciente aunque supere el presupuesto
+        while self._current_bytes > self.max_bytes and len(self._entries) > 1:
+            key, _ = next(iter(self._entries.items()))
+            logger.info(f"Desalojando modelo de la caché: '{key[0]}'")
+            self._remove(key)
+            self.evictions += 1
+
+def _process_memory():
+    """
+    Lee la memoria residente del proceso desde /proc/self/statm
+
+    Returns:
+        Diccionario con la memoria residente total, la respaldada por archivos
+        (compartible entre procesos) y la privada, en bytes; None si no está disponible
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            fields = f.read().split()
+        page_size = os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+    rss = int(fields[1]) * page_size
+    shared = int(fields[2]) * page_size
+    return {'rss_bytes': rss, 'shared_bytes': shared, 'private_bytes': rss - shared}
+
+def _estimate_model_size(model, file_path):
+    """
+    Estima la memoria ocupada por un modelo cargado
+
+    Args:
+        model: Modelo cargado
+        file_path: Ruta del archivo del modelo
+
+    Returns:
+        Tamaño estimado en bytes
+    """
+    # Para modelos de Keras se suman los tamaños de los pesos
+    if hasattr(model, 'get_weights'):
+        try:
+            return int(sum(w.nbytes for w in model.get_weights()))
+        except Exception:
+            pass
+
+    # Los bosques compactos informan el tamaño de sus arreglos
+    if hasattr(model, 'nbytes'):
+        return int(model.nbytes)
+
+    # Para el resto se usa el tamaño del archivo serializado como aproximación
+    return os.path.getsize(file_path)
+
+# Instancia compartida por los blueprints
+model_cache = ModelCache()
@@ -1,12 +1,19 @@
 import os
 import json
-import pickle
+import joblib
 import datetime
 import numpy as np
 from tensorflow import keras
 from pathlib import Path
+from flask import has_app_context
 import logging
 
+from ml.common.registry import (
+    ModelRecord, ModelNameConflictError, register_model, unregister_model, query_models, model_name_exists
+)
+from ml.common.result_cache import prediction_cache
+from ml.tabular.forest import FOREST_EXTENSION, supports_compact_forest, export_compact_forest, load_compact_forest
+
 # Configurar logging para depuración
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -24,6 +31,10 @@ class NumpyEncoder(json.JSONEncoder):
             return obj.isoformat()
         return super(NumpyEncoder, self).default(obj)
 
+def _registry_available():
+    """El registro de modelos requiere un contexto de aplicación para acceder a la base de datos"""
+    return has_app_context()
+
 def check_model_name_exists(model_name, model_dir):
     """
     Verifica si ya existe un modelo con el nombre especificado
@@ -37,6 +48,10 @@ def check_model_name_exists(model_name, model_dir):
     """
     logger.info(f"Verificando si existe el modelo '{model_name}' en '{model_dir}'")
     
+    # Consultar el registro de modelos si está disponible
+    if _registry_available():
+        return model_name_exists(model_name, model_dir)
+    
     if not os.path.exists(model_dir):
         logger.info(f"El directorio '{model_dir}' no existe")
         return False
@@ -82,6 +97,24 @@ def save_model_metadata(model_path, metadata):
     with open(metadata_file, 'w') as f:
         json.dump(metadata, f, cls=NumpyEncoder, indent=2)
 
+def update_model_metadata(model_path, metadata):
+    """
+    Reemplaza los metadatos de un modelo ya guardado y actualiza el registro
+    
+    Args:
+        model_path: Ruta base del modelo (sin extensión)
+        metadata: Diccionario con los metadatos completos del modelo
+    """
+    save_model_metadata(model_path, metadata)
+    
+    if _registry_available():
+        record = ModelRecord.query.filter_by(path=model_path).first()
+        if record is not None:
+            register_model(
+                model_path, record.model_dir, record.model_format,
+                name=record.name, metadata=metadata, created_at=record.created_at
+            )
+
 def load_model_metadata(model_path):
     """
     Carga los metadatos del modelo desde un archivo JSON
@@ -103,6 +136,35 @@ def load_model_metadata(model_path):
     with open(metadata_file, 'r') as f:
         return json.load(f)
 
+def _register_saved_model(model_path, model_dir, model_format, name, metadata):
+    """
+    Registra un modelo recién guardado en el registro de modelos
+    
+    Args:
+        model_path: Ruta base del modelo (sin extensión)
+        model_dir: Directorio raíz de modelos
+        model_format: 'tensorflow' o 'sklearn'
+        name: Nombre del modelo
+        metadata: Diccionario con metadatos del modelo
+    
+    Raises:
+        ModelNameConflictError: Si otro guardado concurrente registró el mismo nombre
+    """
+    if not _registry_available():
+        return
+    
+    try:
+        register_model(model_path, model_dir, model_format, name=name, metadata=metadata)
+    except ModelNameConflictError:
+        # Otro proceso guardó un modelo con el mismo nombre tras la verificación previa:
+        # se descartan los archivos recién escritos para no dejar un duplicado en disco
+        logger.error(f"Conflicto de nombre al registrar el modelo '{model_path}', descartando sus archivos")
+        delete_model(model_path)
+        raise
+    except Exception as e:
+        # El modelo ya está en disco; la sincronización al iniciar lo registrará
+        logger.error(f"Error al registrar el modelo '{model_path}': {str(e)}")
+
 def save_tensorflow_model(model, model_name, model_dir, metadata=None):
     """
     Guarda un modelo de TensorFlow/Keras junto con sus metadatos
@@ -148,6 +210,9 @@ def save_tensorflow_model(model, model_name, model_dir, metadata=None):
     if metadata:
         save_model_metadata(model_path, metadata)
     
+    # Registrar el modelo
+    _register_saved_model(model_path, model_dir, 'tensorflow', safe_name, metadata)
+    
     return model_path
 
 def load_tensorflow_model(model_path):
@@ -168,9 +233,11 @@ def load_tensorflow_model(model_path):
         logger.error(f"No se encontró el archivo del modelo: '{h5_path}'")
         raise FileNotFoundError(f"No se encontró el archivo del modelo: '{h5_path}'")
     
-    # Cargar el modelo
+    # Cargar el modelo; los modelos CNN incluyen la capa de preprocesamiento propia
+    # Importación local para evitar importaciones circulares
+    from ml.cnn.preprocessing import PixelPreprocessing
     try:
-        model = keras.models.load_model(h5_path)
+        model = keras.models.load_model(h5_path, custom_objects={'PixelPreprocessing': PixelPreprocessing})
         logger.info(f"Modelo cargado correctamente desde '{h5_path}'")
     except Exception as e:
         logger.error(f"Error al cargar el modelo: {str(e)}")
@@ -213,28 +280,48 @@ def save_sklearn_model(model, model_name, model_dir, metadata=None):
     # Asegurarse de que el directorio existe
     os.makedirs(os.path.dirname(model_path), exist_ok=True)
     
-    # Guardar el modelo
+    # Guardar el modelo con joblib sin comprimir: los arreglos NumPy se escriben
+    # alineados dentro del archivo para poder mapearlos en memoria al cargar
     try:
         model_file = f"{model_path}.pkl"
         logger.info(f"Guardando modelo en '{model_file}'")
-        with open(model_file, 'wb') as f:
-            pickle.dump(model, f)
+        joblib.dump(model, model_file)
     except Exception as e:
         logger.error(f"Error al guardar el modelo: {str(e)}")
         raise
     
+    # Exportar los Random Forest como bosque compacto para la predicción
+    if supports_compact_forest(model):
+        try:
+            forest_info = export_compact_forest(model, model_path)
+            if metadata is not None:
+                metadata['compact_forest'] = forest_info
+        except Exception as e:
+            # El .pkl sigue siendo válido: se registra el error y se continúa
+            logger.error(f"Error al exportar el bosque compacto: {str(e)}")
+    
     # Guardar metadatos
     if metadata:
         save_model_metadata(model_path, metadata)
     
+    # Registrar el modelo
+    _register_saved_model(model_path, model_dir, 'sklearn', safe_name, metadata)
+    
     return model_path
 
-def load_sklearn_model(model_path):
+def load_sklearn_model(model_path, prefer_compact=True, mmap=True):
     """
     Carga un modelo de scikit-learn
     
+    Los arreglos grandes del modelo (vectores de soporte, datos de entrenamiento
+    de k-NN, coeficientes) se mapean en memoria en modo de solo lectura, de modo
+    que todos los workers de gunicorn del mismo servidor comparten una única
+    copia en la caché de páginas del sistema operativo.
+    
     Args:
         model_path: Ruta base del modelo (sin extensión)
+        prefer_compact: Si existe un bosque compacto exportado, cargarlo en lugar del .pkl
+        mmap: Mapear en memoria los arreglos del modelo en lugar de copiarlos
     
     Returns:
         Modelo cargado y metadatos (si existen)
@@ -247,10 +334,20 @@ def load_sklearn_model(model_path):
         logger.error(f"No se encontró el archivo del modelo: '{pkl_path}'")
         raise FileNotFoundError(f"No se encontró el archivo del modelo: '{pkl_path}'")
     
+    # Bosque compacto mapeado en memoria (solo Random Forest)
+    forest_path = f"{model_path}{FOREST_EXTENSION}"
+    if prefer_compact and os.path.exists(forest_path):
+        try:
+            model = load_compact_forest(model_path)
+            logger.info(f"Bosque compacto cargado desde '{forest_path}'")
+            return model, load_model_metadata(model_path)
+        except Exception as e:
+            logger.warning(f"No se pudo cargar el bosque compacto, se usa el .pkl: {str(e)}")
+    
     # Cargar el modelo
     try:
-        with open(pkl_path, 'rb') as f:
-            model = pickle.load(f)
+        # joblib también lee los modelos guardados con pickle antes de este formato
+        model = joblib.load(pkl_path, mmap_mode='r' if mmap else None)
         logger.info(f"Modelo cargado correctamente desde '{pkl_path}'")
     except Exception as e:
         logger.error(f"Error al cargar el modelo: {str(e)}")
@@ -274,6 +371,12 @@ def list_models(model_dir, model_type=None):
     """
     logger.info(f"Listando modelos en '{model_dir}', tipo: {model_type}")
     
+    # Consultar el registro de modelos si está disponible
+    if _registry_available():
+        models = [record.to_dict() for record in query_models(model_dir, model_type)]
+        logger.info(f"Total de modelos encontrados: {len(models)}")
+        return models
+    
     if not os.path.exists(model_dir):
         logger.warning(f"El directorio '{model_dir}' no existe")
         return []
@@ -349,12 +452,31 @@ def delete_model(model_path):
             logger.info(f"Eliminando archivo: '{pkl_path}'")
             os.remove(pkl_path)
         
+        # Eliminar bosque compacto exportado
+        forest_path = f"{model_path}{FOREST_EXTENSION}"
+        if os.path.exists(forest_path):
+            logger.info(f"Eliminando archivo: '{forest_path}'")
+            os.remove(forest_path)
+        
+        # Eliminar versión TFLite exportada
+        tflite_path = f"{model_path}.tflite"
+        if os.path.exists(tflite_path):
+            logger.info(f"Eliminando archivo: '{tflite_path}'")
+            os.remove(tflite_path)
+        
         # Eliminar metadatos
         json_path = f"{model_path}.json"
         if os.path.exists(json_path):
             logger.info(f"Eliminando archivo: '{json_path}'")
             os.remove(json_path)
         
+        # Eliminar el modelo del registro
+        if _registry_available():
+            unregister_model(model_path)
+        
+        # Descartar los resultados de predicción guardados para el modelo
+        prediction_cache.invalidate(model_path)
+        
         return True
     except Exception as e:
         logger.error(f"Error al eliminar modelo: {str(e)}")
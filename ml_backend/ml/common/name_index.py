@@ -0,0 +1,212 @@
+import os
+import time
+import bisect
+import threading
+import logging
+
+# Configurar logging para depuración
+logger = logging.getLogger(__name__)
+
+# Intervalo mínimo entre recargas de un directorio por nombres no encontrados o
+# ambiguos (segundos): acota el coste de las solicitudes repetidas de un nombre
+# inexistente, a cambio de tardar hasta ese tiempo en ver los modelos guardados
+# por otros workers
+MISS_RELOAD_INTERVAL = 5.0
+
+class AmbiguousModelNameError(ValueError):
+    """Error lanzado cuando un prefijo coincide con más de un modelo"""
+
+    def __init__(self, prefix, matches):
+        self.prefix = prefix
+        self.matches = matches
+        super().__init__(
+            f"El nombre '{prefix}' es ambiguo, coincide con {len(matches)} modelos: {', '.join(matches)}"
+        )
+
+class ModelNameIndex:
+    """
+    Índice en memoria para resolver nombres de modelos sin listar metadatos.
+
+    Por cada directorio de modelos mantiene un arreglo ordenado de identificadores
+    (nombre_timestamp) sobre el que se resuelven prefijos con búsqueda binaria, y
+    un mapeo del nombre con el que se guardó cada modelo a su identificador.
+    El índice se carga desde el registro de modelos la primera vez que se consulta
+    un directorio y se mantiene al guardar y eliminar modelos.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._dirs = {}
+
+    def resolve(self, model_dir, model_name):
+        """
+        Resuelve un nombre de modelo a la ruta base del modelo
+
+        El nombre puede ser el identificador completo, el nombre con el que se
+        guardó el modelo o un prefijo que identifique un único modelo. Si el
+        nombre no se encuentra o es ambiguo, el índice se recarga (como máximo
+        una vez cada MISS_RELOAD_INTERVAL segundos por directorio) por si otro
+        proceso guardó o eliminó modelos. Si los archivos del modelo resuelto ya
+        no existen, el índice se recarga siempre y se devuelve None si sigue sin
+        haber archivos.
+
+        Args:
+            model_dir: Directorio raíz de modelos
+            model_name: Identificador, nombre o prefijo del modelo
+
+        Returns:
+            Ruta base del modelo (sin extensión) o None si no existe
+
+        Raises:
+            AmbiguousModelNameError: Si el prefijo coincide con varios modelos
+        """
+        try:
+            path = self._resolve(model_dir, model_name)
+        except AmbiguousModelNameError:
+            if not self._reload_due(model_dir):
+                raise
+            path = None
+
+        stale = path is not None and not _model_files_exist(path)
+        if stale or (path is None and self._reload_due(model_dir)):
+            # Otro proceso pudo haber guardado o eliminado modelos; recargar y reintentar
+            self.reload(model_dir)
+            path = self._resolve(model_dir, model_name)
+
+            if path is not None and not _model_files_exist(path):
+                logger.warning(f"El modelo '{model_name}' está indexado pero sus archivos no existen: '{path}'")
+                return None
+
+        return path
+
+    def add(self, model_dir, model_id, name, path):
+        """
+        Agrega un modelo al índice
+
+        Args:
+            model_dir: Directorio raíz de modelos
+            model_id: Identificador del modelo (nombre de archivo sin extensión)
+            name: Nombre con el que se guardó el modelo
+            path: Ruta base del modelo (sin extensión)
+        """
+        with self._lock:
+            entry = self._dirs.get(_normalize_dir(model_dir))
+            if entry is None:
+                # El directorio se cargará completo en la primera consulta
+                return
+
+            if model_id not in entry['paths']:
+                bisect.insort(entry['ids'], model_id)
+            entry['paths'][model_id] = path
+            entry['names'][name] = model_id
+
+    def remove(self, model_dir, model_id):
+        """
+        Elimina un modelo del índice
+
+        Args:
+            model_dir: Directorio raíz de modelos
+            model_id: Identificador del modelo
+        """
+        with self._lock:
+            entry = self._dirs.get(_normalize_dir(model_dir))
+            if entry is None or model_id not in entry['paths']:
+                return
+
+            position = bisect.bisect_left(entry['ids'], model_id)
+            del entry['ids'][position]
+            del entry['paths'][model_id]
+            for name in [n for n, i in entry['names'].items() if i == model_id]:
+                del entry['names'][name]
+
+    def reload(self, model_dir):
+        """
+        Reconstruye el índice de un directorio desde el registro de modelos
+
+        Args:
+            model_dir: Directorio raíz de modelos
+        """
+        # Importación local para evitar importaciones circulares
+        from ml.common.registry import ModelRecord
+
+        normalized_dir = _normalize_dir(model_dir)
+        rows = (
+            ModelRecord.query
+            .with_entities(ModelRecord.model_id, ModelRecord.name, ModelRecord.path)
+            .filter_by(model_dir=normalized_dir)
+            .all()
+        )
+
+        entry = {
+            'ids': sorted(row.model_id for row in rows),
+            'paths': {row.model_id: row.path for row in rows},
+            'names': {row.name: row.model_id for row in rows},
+            'loaded_at': time.monotonic()
+        }
+
+        with self._lock:
+            self._dirs[normalized_dir] = entry
+
+        logger.info(f"Índice de nombres cargado para '{normalized_dir}': {len(rows)} modelos")
+
+    def clear(self):
+        """Descarta el índice de todos los directorios"""
+        with self._lock:
+            self._dirs.clear()
+
+    def _reload_due(self, model_dir):
+        # Indica si ha pasado el intervalo mínimo desde la última recarga del directorio
+        with self._lock:
+            entry = self._dirs.get(_normalize_dir(model_dir))
+        return entry is None or time.monotonic() - entry['loaded_at'] >= MISS_RELOAD_INTERVAL
+
+    def _resolve(self, model_dir, model_name):
+        normalized_dir = _normalize_dir(model_dir)
+
+        with self._lock:
+            entry = self._dirs.get(normalized_dir)
+
+        if entry is None:
+            self.reload(model_dir)
+
+        with self._lock:
+            entry = self._dirs[normalized_dir]
+
+            # Identificador exacto
+            if model_name in entry['paths']:
+                return entry['paths'][model_name]
+
+            # Nombre con el que se guardó el modelo
+            model_id = entry['names'].get(model_name)
+            if model_id is not None:
+                return entry['paths'][model_id]
+
+            # Prefijo único: los identificadores que comparten el prefijo son contiguos
+            ids = entry['ids']
+            start = bisect.bisect_left(ids, model_name)
+            end = start
+            while end < len(ids) and end - start < 2 and ids[end].startswith(model_name):
+                end += 1
+
+            if end == start:
+                return None
+
+            if end - start > 1:
+                # Reunir todas las coincidencias para el mensaje de error
+                stop = bisect.bisect_left(ids, model_name + '\U0010ffff', lo=start)
+                raise AmbiguousModelNameError(model_name, ids[start:stop])
+
+            return entry['paths'][ids[start]]
+
+def _normalize_dir(model_dir):
+    return os.path.abspath(model_dir)
+
+def _model_files_exist(path):
+    """Indica si existe en disco el archivo de algún formato para la ruta base del modelo"""
+    # Importación local para evitar importaciones circulares
+    from ml.common.registry import MODEL_EXTENSIONS
+
+    return any(os.path.exists(f"{path}{extension}") for extension in MODEL_EXTENSIONS.values())
+
+# Instancia compartida por los blueprints
+model_name_index = ModelNameIndex()
@@ -0,0 +1,358 @@
+import os
+import re
+import json
+import datetime
+import logging
+import threading
+from pathlib import Path
+from sqlalchemy import inspect
+from sqlalchemy.exc import IntegrityError
+
+from auth.models import db
+from ml.common.name_index import model_name_index
+
+# Configurar logging para depuración
+logger = logging.getLogger(__name__)
+
+# Extensiones de archivo según el formato del modelo
+MODEL_EXTENSIONS = {
+    'tensorflow': '.h5',
+    'sklearn': '.pkl'
+}
+
+# Sufijo de marca de tiempo que se agrega al nombre al guardar (nombre_YYYYmmdd_HHMMSS)
+TIMESTAMP_SUFFIX = re.compile(r'_\d{8}_\d{6}$')
+
+# Intervalo mínimo entre actualizaciones de last_used_at de un mismo modelo (segundos)
+TOUCH_INTERVAL = 60
+
+_last_touch = {}
+_touch_lock = threading.Lock()
+
+class ModelNameConflictError(ValueError):
+    """Error lanzado cuando ya hay un modelo registrado con el mismo nombre en el directorio"""
+
+    def __init__(self, name, model_dir):
+        self.name = name
+        self.model_dir = model_dir
+        super().__init__(
+            f"Ya existe un modelo con el nombre '{name}'. Por favor, elige un nombre diferente."
+        )
+
+class ModelRecord(db.Model):
+    """
+    Registro de un modelo guardado en disco.
+
+    La tabla es un índice derivado de los archivos de modelos: se actualiza al
+    guardar o eliminar un modelo y se reconcilia con el disco al iniciar la
+    aplicación, por lo que puede reconstruirse en cualquier momento. El nombre es
+    único dentro de cada directorio, de modo que dos guardados concurrentes con el
+    mismo nombre no pueden registrarse ambos.
+    """
+    __tablename__ = 'model_registry'
+
+    id = db.Column(db.Integer, primary_key=True)
+    model_id = db.Column(db.String(255), nullable=False)
+    name = db.Column(db.String(255), nullable=False)
+    model_dir = db.Column(db.String(1024), nullable=False)
+    path = db.Column(db.String(1024), unique=True, nullable=False)
+    model_format = db.Column(db.String(20), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.datetime.now, index=True)
+    last_used_at = db.Column(db.DateTime, index=True)
+    metadata_json = db.Column(db.Text)
+
+    __table_args__ = (
+        db.UniqueConstraint('model_dir', 'name', name='uq_model_registry_dir_name'),
+        db.Index('ix_model_registry_dir_model_id', 'model_dir', 'model_id'),
+    )
+
+    def __repr__(self):
+        return f'<ModelRecord {self.model_id}>'
+
+    def to_dict(self):
+        """Convierte el registro al formato devuelto por list_models"""
+        return {
+            'id': self.model_id,
+            'path': self.path,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'metadata': json.loads(self.metadata_json) if self.metadata_json else {}
+        }
+
+def _normalize_dir(model_dir):
+    return os.path.abspath(model_dir)
+
+def _model_name_from_id(model_id):
+    """Obtiene el nombre con el que se guardó el modelo quitando la marca de tiempo"""
+    return TIMESTAMP_SUFFIX.sub('', model_id)
+
+def register_model(model_path, model_dir, model_format, name=None, metadata=None, created_at=None):
+    """
+    Agrega (o actualiza) un modelo en el registro
+
+    Args:
+        model_path: Ruta base del modelo (sin extensión)
+        model_dir: Directorio raíz de modelos al que pertenece
+        model_format: 'tensorflow' o 'sklearn'
+        name: Nombre del modelo (por defecto se deduce de la ruta)
+        metadata: Diccionario con metadatos del modelo
+        created_at: Fecha de creación (por defecto, ahora)
+
+    Returns:
+        Registro creado o actualizado
+
+    Raises:
+        ModelNameConflictError: Si otro modelo del directorio ya usa el nombre
+    """
+    # Importación local para evitar importaciones circulares
+    from ml.common.model_storage import NumpyEncoder
+
+    model_id = os.path.basename(model_path)
+    record = ModelRecord.query.filter_by(path=model_path).first()
+    if record is None:
+        record = ModelRecord(path=model_path)
+        db.session.add(record)
+
+    record.model_id = model_id
+    record.name = name or _model_name_from_id(model_id)
+    record.model_dir = _normalize_dir(model_dir)
+    record.model_format = model_format
+    record.created_at = created_at or datetime.datetime.now()
+    record.metadata_json = json.dumps(metadata or {}, cls=NumpyEncoder)
+    name, normalized_dir = record.name, record.model_dir
+
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        conflict = (
+            ModelRecord.query
+            .filter_by(model_dir=normalized_dir, name=name)
+            .filter(ModelRecord.path != model_path)
+            .first()
+        )
+        if conflict is not None:
+            raise ModelNameConflictError(name, model_dir)
+        raise
+    except Exception:
+        db.session.rollback()
+        raise
+
+    model_name_index.add(model_dir, record.model_id, record.name, record.path)
+    return record
+
+def unregister_model(model_path):
+    """
+    Elimina un modelo del registro
+
+    Args:
+        model_path: Ruta base del modelo (sin extensión)
+
+    Returns:
+        True si existía un registro para el modelo
+    """
+    record = ModelRecord.query.filter_by(path=model_path).first()
+    if record is None:
+        return False
+
+    model_dir, model_id = record.model_dir, record.model_id
+    db.session.delete(record)
+    try:
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    model_name_index.remove(model_dir, model_id)
+    return True
+
+def query_models(model_dir, model_format=None):
+    """
+    Obtiene los modelos registrados en un directorio
+
+    Args:
+        model_dir: Directorio raíz de modelos
+        model_format: 'tensorflow', 'sklearn' o None para todos
+
+    Returns:
+        Lista de registros ordenados del más reciente al más antiguo
+    """
+    query = ModelRecord.query.filter_by(model_dir=_normalize_dir(model_dir))
+    if model_format:
+        query = query.filter_by(model_format=model_format)
+
+    return query.order_by(ModelRecord.created_at.desc()).all()
+
+def touch_model(model_path):
+    """
+    Registra el uso de un modelo para priorizarlo en la precarga al iniciar.
+
+    Para no escribir en la base de datos en cada predicción, la fecha se
+    actualiza como máximo una vez cada TOUCH_INTERVAL segundos por modelo. La
+    actualización usa su propia conexión y transacción, de modo que nunca
+    confirma ni descarta los cambios pendientes de la sesión de la solicitud.
+
+    Args:
+        model_path: Ruta base del modelo (sin extensión)
+    """
+    now = datetime.datetime.now()
+    with _touch_lock:
+        last = _last_touch.get(model_path)
+        if last is not None and (now - last).total_seconds() < TOUCH_INTERVAL:
+            return
+        _last_touch[model_path] = now
+
+    table = ModelRecord.__table__
+    try:
+        with db.engine.begin() as connection:
+            connection.execute(table.update().where(table.c.path == model_path).values(last_used_at=now))
+    except Exception as e:
+        logger.warning(f"No se pudo registrar el uso del modelo '{model_path}': {str(e)}")
+
+def recently_used_models(model_dir, model_format=None, limit=None):
+    """
+    Obtiene los modelos de un directorio ordenados por uso reciente
+
+    Los modelos nunca usados se ordenan después, del más nuevo al más antiguo.
+
+    Args:
+        model_dir: Directorio raíz de modelos
+        model_format: 'tensorflow', 'sklearn' o None para todos
+        limit: Número máximo de modelos a devolver
+
+    Returns:
+        Lista de registros
+    """
+    query = ModelRecord.query.filter_by(model_dir=_normalize_dir(model_dir))
+    if model_format:
+        query = query.filter_by(model_format=model_format)
+
+    query = query.order_by(
+        ModelRecord.last_used_at.is_(None),
+        ModelRecord.last_used_at.desc(),
+        ModelRecord.created_at.desc()
+    )
+    if limit is not None:
+        query = query.limit(limit)
+
+    return query.all()
+
+def model_name_exists(name, model_dir):
+    """
+    Verifica si ya hay un modelo registrado con un nombre en un directorio
+
+    Args:
+        name: Nombre del modelo
+        model_dir: Directorio raíz de modelos
+
+    Returns:
+        True si existe, False en caso contrario
+    """
+    query = ModelRecord.query.filter_by(model_dir=_normalize_dir(model_dir), name=name)
+    return db.session.query(query.exists()).scalar()
+
+def ensure_registry_schema():
+    """
+    Crea la tabla del registro o la recrea si su esquema quedó desactualizado.
+
+    Además de las columnas se comprueban las restricciones de unicidad, para
+    migrar las tablas creadas antes de que el nombre fuera único por directorio.
+    Como el registro se reconstruye desde disco, recrear la tabla no pierde información.
+    """
+    inspector = inspect(db.engine)
+    table_name = ModelRecord.__tablename__
+
+    if inspector.has_table(table_name):
+        existing_columns = {column['name'] for column in inspector.get_columns(table_name)}
+        expected_columns = {column.name for column in ModelRecord.__table__.columns}
+        if existing_columns == expected_columns and _has_unique_name_constraint(inspector, table_name):
+            return
+
+        logger.info("Esquema del registro de modelos desactualizado, recreando la tabla")
+        ModelRecord.__table__.drop(db.engine)
+
+    ModelRecord.__table__.create(db.engine)
+
+def _has_unique_name_constraint(inspector, table_name):
+    """Indica si la tabla existente garantiza nombres únicos por directorio"""
+    expected = {'model_dir', 'name'}
+    # Según el motor, la restricción se refleja como restricción o como índice único
+    constraints = inspector.get_unique_constraints(table_name)
+    unique_indexes = [index for index in inspector.get_indexes(table_name) if index.get('unique')]
+    return any(set(item['column_names']) == expected for item in constraints + unique_indexes)
+
+def sync_registry(model_dir):
+    """
+    Reconcilia el registro con los archivos de modelos presentes en disco.
+
+    Agrega los modelos que no estén registrados (por ejemplo, guardados antes de
+    existir el registro) y elimina los registros cuyos archivos ya no existen.
+    Si un archivo comparte nombre con un modelo ya registrado se registra con su
+    identificador completo como nombre, para respetar la unicidad por directorio.
+
+    Args:
+        model_dir: Directorio raíz de modelos
+
+    Returns:
+        Tupla con el número de modelos agregados y eliminados
+    """
+    # Importación local para evitar importaciones circulares
+    from ml.common.model_storage import load_model_metadata
+
+    normalized_dir = _normalize_dir(model_dir)
+    logger.info(f"Sincronizando registro de modelos con '{normalized_dir}'")
+
+    # Archivos presentes en disco
+    on_disk = {}
+    if os.path.exists(model_dir):
+        for model_format, extension in MODEL_EXTENSIONS.items():
+            for model_file in Path(model_dir).glob(f"**/*{extension}"):
+                model_path = str(model_file)[:-len(extension)]
+                on_disk[model_path] = (model_format, model_file)
+
+    # Registros existentes
+    records = ModelRecord.query.filter_by(model_dir=normalized_dir).all()
+    registered = {record.path for record in records}
+
+    removed = 0
+    used_names = set()
+    for record in records:
+        if record.path not in on_disk:
+            db.session.delete(record)
+            removed += 1
+        else:
+            used_names.add(record.name)
+
+    added = 0
+    for model_path, (model_format, model_file) in on_disk.items():
+        if model_path in registered:
+            continue
+
+        model_id = os.path.basename(model_path)
+        name = _model_name_from_id(model_id)
+        if name in used_names:
+            logger.warning(f"El nombre '{name}' ya está registrado, se registra '{model_path}' como '{model_id}'")
+            name = model_id
+        used_names.add(name)
+
+        record = ModelRecord(
+            model_id=model_id,
+            name=name,
+            model_dir=normalized_dir,
+            path=model_path,
+            model_format=model_format,
+            created_at=datetime.datetime.fromtimestamp(os.path.getctime(model_file)),
+            metadata_json=json.dumps(load_model_metadata(model_path) or {})
+        )
+        db.session.add(record)
+        added += 1
+
+    try:
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    model_name_index.reload(model_dir)
+
+    logger.info(f"Registro sincronizado: {added} modelos agregados, {removed} eliminados")
+    return added, removed
@@ -0,0 +1,162 @@
+import io
+import json
+import base64
+
+import numpy as np
+
+# Perfiles de respuesta de los endpoints de predicción
+RESPONSE_PROFILES = ('compact', 'full')
+
+# Codificaciones disponibles para devolver imágenes
+IMAGE_ENCODINGS = ('png', 'base64_uint8', 'base64_float16', 'list')
+
+# Campos de los metadatos incluidos en el resumen del modelo
+_SUMMARY_KEYS = (
+    'model_name', 'model_type', 'algorithm', 'problem_type', 'data_type',
+    'accuracy', 'class_mapping', 'class_names', 'features'
+)
+
+def parse_response_options(params):
+    """
+    Lee las opciones de respuesta de los parámetros de la solicitud
+
+    Args:
+        params: Diccionario con los parámetros (JSON o formulario)
+
+    Returns:
+        Diccionario con 'profile', 'fields' (conjunto o None) e 'image_encoding'
+
+    Raises:
+        ValueError: Si alguna opción no es válida
+    """
+    profile = params.get('profile', 'compact')
+    if profile not in RESPONSE_PROFILES:
+        raise ValueError(f"profile debe ser uno de: {', '.join(RESPONSE_PROFILES)}")
+
+    fields = params.get('fields')
+    if isinstance(fields, str):
+        # Lista separada por comas o lista JSON (formularios multipart)
+        fields = json.loads(fields) if fields.strip().startswith('[') else fields.split(',')
+    if fields is not None:
+        if not isinstance(fields, list):
+            raise ValueError("fields debe ser una lista de nombres de campo")
+        fields = {str(field).strip() for field in fields if str(field).strip()}
+
+    image_encoding = params.get('image_encoding', 'png')
+    if image_encoding not in IMAGE_ENCODINGS:
+        raise ValueError(f"image_encoding debe ser uno de: {', '.join(IMAGE_ENCODINGS)}")
+
+    return {'profile': profile, 'fields': fields, 'image_encoding': image_encoding}
+
+def build_response(payload, options, compact_fields):
+    """
+    Construye la respuesta con los campos seleccionados
+
+    Los valores del payload pueden ser funciones sin argumentos, que solo se
+    evalúan si el campo forma parte de la respuesta (p. ej. codificar una imagen).
+
+    Args:
+        payload: Diccionario con todos los campos disponibles
+        options: Opciones devueltas por parse_response_options
+        compact_fields: Campos incluidos con el perfil 'compact'
+
+    Returns:
+        Diccionario listo para serializar, siempre con 'success'
+
+    Raises:
+        ValueError: Si se solicitan campos que el endpoint no ofrece
+    """
+    if options['fields'] is not None:
+        unknown = options['fields'] - set(payload)
+        if unknown:
+            raise ValueError(
+                f"Campos desconocidos: {', '.join(sorted(unknown))}. "
+                f"Disponibles: {', '.join(sorted(payload))}"
+            )
+        selected = [key for key in payload if key in options['fields']]
+    elif options['profile'] == 'full':
+        selected = list(payload)
+    else:
+        selected = [key for key in payload if key in compact_fields]
+
+    response = {'success': True}
+    for key in selected:
+        value = payload[key]
+        response[key] = value() if callable(value) else value
+    return response
+
+def summarize_metadata(metadata):
+    """
+    Resume los metadatos de un modelo para las respuestas de predicción
+
+    Omite informes de clasificación, matrices de confusión, historiales e
+    importancia de características.
+
+    Args:
+        metadata: Metadatos completos del modelo
+
+    Returns:
+        Diccionario con los datos básicos del modelo
+    """
+    metadata = metadata or {}
+    summary = {key: metadata[key] for key in _SUMMARY_KEYS if key in metadata}
+
+    model_params = metadata.get('model_params') or {}
+    for key in ('architecture', 'num_classes', 'input_shape'):
+        if key in model_params:
+            summary[key] = model_params[key]
+
+    return summary
+
+def encode_image(image, encoding='png'):
+    """
+    Codifica una imagen para incluirla en una respuesta
+
+    Las codificaciones 'list' y 'base64_float16' devuelven valores en [0, 1]
+    tanto si la imagen es uint8 como si ya está normalizada.
+
+    Args:
+        image: Array (altura, anchura, canales) uint8 o con valores en [0, 1]
+        encoding: 'png', 'base64_uint8', 'base64_float16' o 'list' (listas anidadas)
+
+    Returns:
+        Lista anidada para 'list'; en otro caso un diccionario con la codificación,
+        el tipo y la forma del arreglo y los datos en base64
+    """
+    image = np.asarray(image)
+    raw_pixels = image.dtype == np.uint8
+    if raw_pixels and encoding in ('list', 'base64_float16'):
+        image = image / 255.0
+
+    if encoding == 'list':
+        return image.tolist()
+
+    if encoding == 'base64_float16':
+        return {
+            'encoding': encoding,
+            'dtype': 'float16',
+            'shape': list(image.shape),
+            'data': base64.b64encode(image.astype(np.float16).tobytes()).decode('utf-8')
+        }
+
+    pixels = image if raw_pixels else np.clip(np.rint(image * 255.0), 0, 255).astype(np.uint8)
+
+    if encoding == 'base64_uint8':
+        return {
+            'encoding': encoding,
+            'dtype': 'uint8',
+            'shape': list(pixels.shape),
+            'data': base64.b64encode(pixels.tobytes()).decode('utf-8')
+        }
+
+    # Importación local: Pillow solo se necesita para PNG
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.fromarray(pixels.squeeze(axis=-1) if pixels.shape[-1] == 1 else pixels).save(buffer, format='PNG')
+    return {
+        'encoding': 'png',
+        'dtype': 'uint8',
+        'shape': list(pixels.shape),
+        'data': base64.b64encode(buffer.getvalue()).decode('utf-8')
+    }
@@ -0,0 +1,173 @@
+import os
+import copy
+import time
+import hashlib
+import threading
+import logging
+from collections import OrderedDict
+
+import numpy as np
+
+# Configurar logging para depuración
+logger = logging.getLogger(__name__)
+
+class PredictionCache:
+    """
+    Caché en memoria de resultados de predicción, compartida por los hilos del proceso.
+
+    Las entradas se identifican por la ruta del modelo, la fecha de modificación
+    del archivo del modelo y un hash SHA-256 de la entrada ya codificada (bytes
+    de la imagen o vector de características), de modo que volver a entrenar o
+    reemplazar el modelo deja de devolver resultados antiguos. Se descartan las
+    entradas menos usadas recientemente al superar el número máximo y las que
+    superan su tiempo de vida (TTL).
+    """
+
+    def __init__(self, max_entries=10000, ttl=300):
+        self.enabled = False
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def init_app(self, app):
+        """
+        Configura la caché a partir de la configuración de la aplicación
+
+        Args:
+            app: Aplicación Flask
+        """
+        self.enabled = app.config.get('PREDICTION_CACHE_ENABLED', self.enabled)
+        self.max_entries = app.config.get('PREDICTION_CACHE_MAX_ENTRIES', self.max_entries)
+        self.ttl = app.config.get('PREDICTION_CACHE_TTL', self.ttl)
+
+    def make_key(self, model_path, model_file, input_hash, variant=''):
+        """
+        Construye la clave de una predicción
+
+        Args:
+            model_path: Ruta base del modelo (sin extensión)
+            model_file: Archivo del modelo usado para predecir (su mtime forma parte de la clave)
+            input_hash: Hash de la entrada codificada
+            variant: Distingue resultados del mismo modelo y entrada (p. ej. el motor de inferencia)
+
+        Returns:
+            Tupla con la clave o None si la caché está desactivada o el archivo no existe
+        """
+        if not self.enabled:
+            return None
+        try:
+            mtime = os.path.getmtime(model_file)
+        except OSError:
+            return None
+        return (model_path, mtime, variant, input_hash)
+
+    def get(self, key):
+        """
+        Obtiene un resultado de la caché
+
+        Args:
+            key: Clave devuelta por make_key (None desactiva la consulta)
+
+        Returns:
+            Copia del resultado guardado o None si no existe o expiró
+        """
+        if key is None:
+            return None
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl and time.monotonic() - entry['stored_at'] > self.ttl:
+                del self._entries[key]
+                self.expirations += 1
+                entry = None
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            value = entry['value']
+
+        return copy.deepcopy(value)
+
+    def put(self, key, value):
+        """
+        Guarda un resultado en la caché
+
+        Args:
+            key: Clave devuelta por make_key (None no guarda nada)
+            value: Resultado serializable de la predicción
+        """
+        if key is None:
+            return
+
+        value = copy.deepcopy(value)
+        with self._lock:
+            self._entries[key] = {'value': value, 'stored_at': time.monotonic()}
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, model_path):
+        """
+        Elimina todos los resultados de un modelo
+
+        Args:
+            model_path: Ruta base del modelo (sin extensión)
+        """
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == model_path]:
+                del self._entries[key]
+
+    def clear(self):
+        """Vacía la caché por completo"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """
+        Devuelve los contadores de uso de la caché
+
+        Returns:
+            Diccionario con aciertos, fallos, desalojos y ocupación
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'enabled': self.enabled,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl
+            }
+
+def hash_bytes(data):
+    """Hash SHA-256 de una secuencia de bytes"""
+    return hashlib.sha256(data).hexdigest()
+
+def hash_array(array):
+    """
+    Hash SHA-256 canónico de un arreglo numérico
+
+    El arreglo se convierte a float64 contiguo e incluye su forma, de modo que
+    entradas con el mismo valor producen el mismo hash sin importar cómo se
+    construyeron.
+    """
+    array = np.ascontiguousarray(array, dtype=np.float64)
+    digest = hashlib.sha256(str(array.shape).encode('utf-8'))
+    digest.update(array.tobytes())
+    return digest.hexdigest()
+
+# Instancia compartida por los blueprints
+prediction_cache = PredictionCache()
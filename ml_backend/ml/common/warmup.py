@@ -0,0 +1,175 @@
+import time
+import datetime
+import threading
+import logging
+
+import numpy as np
+
+from ml.common.model_cache import model_cache
+from ml.common.name_index import model_name_index
+from ml.common.registry import recently_used_models
+
+# Configurar logging para depuración
+logger = logging.getLogger(__name__)
+
+class WarmupState:
+    """Estado de la precarga de modelos, consultado por el endpoint de disponibilidad"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.status = 'pending'
+        self.models = []
+        self.errors = []
+        self.started_at = None
+        self.finished_at = None
+
+    @property
+    def ready(self):
+        return self.status in ('ready', 'disabled')
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                'status': self.status,
+                'ready': self.ready,
+                'models': list(self.models),
+                'errors': list(self.errors),
+                'started_at': self.started_at.isoformat() if self.started_at else None,
+                'finished_at': self.finished_at.isoformat() if self.finished_at else None
+            }
+
+    def _update(self, **kwargs):
+        with self._lock:
+            for key, value in kwargs.items():
+                setattr(self, key, value)
+
+    def _add_model(self, entry):
+        with self._lock:
+            self.models.append(entry)
+
+    def _add_error(self, entry):
+        with self._lock:
+            self.errors.append(entry)
+
+def select_models_to_preload(model_dir, model_format, count, pinned=None):
+    """
+    Selecciona los modelos a precargar de un directorio
+
+    Args:
+        model_dir: Directorio raíz de modelos
+        model_format: 'tensorflow' o 'sklearn'
+        count: Número de modelos usados más recientemente a incluir
+        pinned: Lista de nombres o identificadores que se precargan siempre
+
+    Returns:
+        Lista de rutas base de modelos, sin duplicados
+    """
+    selected = []
+
+    # Modelos fijados en la configuración
+    for name in pinned or []:
+        try:
+            model_path = model_name_index.resolve(model_dir, name)
+        except ValueError as e:
+            logger.warning(f"Modelo fijado '{name}' ignorado: {str(e)}")
+            continue
+        if model_path and model_path not in selected:
+            selected.append(model_path)
+
+    # Modelos usados más recientemente
+    if count > 0:
+        for record in recently_used_models(model_dir, model_format, limit=count):
+            if record.path not in selected:
+                selected.append(record.path)
+
+    return selected
+
+def warm_up_tensorflow_model(model_path):
+    """
+    Carga un modelo CNN en la caché y ejecuta una inferencia con una imagen vacía
+    para que TensorFlow construya y trace las funciones de predicción
+
+    Args:
+        model_path: Ruta base del modelo (sin extensión)
+    """
+    # Importación local: solo se necesita TensorFlow si hay modelos CNN que precargar
+    from ml.cnn.model import predict_image
+
+    # La precarga no cuenta como uso: solo las predicciones ordenan los modelos recientes
+    model, metadata = model_cache.get_tensorflow_model(model_path, touch=False)
+    input_shape = (metadata or {}).get('model_params', {}).get('input_shape', (224, 224, 3))
+    predict_image(model, np.zeros(tuple(input_shape), dtype='float32'))
+
+def warm_up_sklearn_model(model_path):
+    """
+    Carga un modelo tabular en la caché y ejecuta una predicción con una fila vacía
+
+    Args:
+        model_path: Ruta base del modelo (sin extensión)
+    """
+    from ml.tabular.models import predict
+
+    model, metadata = model_cache.get_sklearn_model(model_path, touch=False)
+    metadata = metadata or {}
+    num_features = len(metadata['features']) if 'features' in metadata else metadata.get('num_features')
+    if num_features:
+        predict(model, np.zeros((1, num_features)))
+
+def run_warmup(app, state):
+    """
+    Precarga los modelos configurados de ambos directorios de modelos
+
+    Args:
+        app: Aplicación Flask
+        state: WarmupState donde se registra el progreso
+    """
+    state._update(status='running', started_at=datetime.datetime.now())
+
+    count = app.config.get('MODEL_PRELOAD_COUNT', 0)
+    pinned = app.config.get('MODEL_PRELOAD_PINNED', [])
+
+    plan = [
+        (app.config['CNN_MODELS_FOLDER'], 'tensorflow', warm_up_tensorflow_model),
+        (app.config['TABULAR_MODELS_FOLDER'], 'sklearn', warm_up_sklearn_model),
+    ]
+
+    with app.app_context():
+        for model_dir, model_format, warm_up in plan:
+            try:
+                model_paths = select_models_to_preload(model_dir, model_format, count, pinned)
+            except Exception as e:
+                logger.exception(f"Error al seleccionar modelos para precargar en '{model_dir}'")
+                state._add_error({'model_dir': model_dir, 'error': str(e)})
+                continue
+
+            for model_path in model_paths:
+                start = time.perf_counter()
+                try:
+                    warm_up(model_path)
+                    elapsed = time.perf_counter() - start
+                    logger.info(f"Modelo precargado '{model_path}' en {elapsed:.2f} s")
+                    state._add_model({'path': model_path, 'format': model_format, 'seconds': elapsed})
+                except Exception as e:
+                    logger.exception(f"Error al precargar el modelo '{model_path}'")
+                    state._add_error({'path': model_path, 'error': str(e)})
+
+    # Los errores de un modelo no impiden que el servicio quede disponible
+    state._update(status='ready', finished_at=datetime.datetime.now())
+
+def start_warmup(app):
+    """
+    Inicia la precarga de modelos en segundo plano según la configuración
+
+    Args:
+        app: Aplicación Flask
+    """
+    if not app.config.get('MODEL_PRELOAD_ENABLED', False):
+        warmup_state._update(status='disabled')
+        return None
+
+    thread = threading.Thread(target=run_warmup, args=(app, warmup_state), name='model-warmup', daemon=True)
+    thread.start()
+    return thread
+
+# Estado compartido de la precarga
+warmup_state = WarmupState()
@@ -0,0 +1,102 @@
+import time
+from tensorflow import keras
+
+# Intervalo mínimo entre publicaciones de progreso por lote (segundos)
+BATCH_PUBLISH_INTERVAL = 0.5
+
+class JobCancellationCallback(keras.callbacks.Callback):
+    """
+    Callback de Keras que detiene el entrenamiento cuando se cancela el trabajo.
+
+    La cancelación es cooperativa: se comprueba al final de cada lote y, si se
+    solicitó, se marca stop_training para que model.fit termine tras el lote actual.
+    """
+
+    def __init__(self, job):
+        super().__init__()
+        self.job = job
+
+    def on_train_batch_end(self, batch, logs=None):
+        if self.job.cancel_requested():
+            self.model.stop_training = True
+
+    def on_epoch_end(self, epoch, logs=None):
+        if self.job.cancel_requested():
+            self.model.stop_training = True
+
+class TrainingProgressCallback(keras.callbacks.Callback):
+    """
+    Callback de Keras que publica el progreso del entrenamiento de un trabajo.
+
+    Por lote publica la pérdida y la precisión, las muestras por segundo y el
+    tiempo restante estimado, como máximo cada BATCH_PUBLISH_INTERVAL segundos;
+    al final de cada época publica siempre sus métricas, incluidas las de
+    validación.
+    """
+
+    def __init__(self, job, num_samples=None, batch_size=None):
+        super().__init__()
+        self.job = job
+        self.num_samples = num_samples
+        self.batch_size = batch_size
+        self._train_start = None
+        self._epoch = 0
+        self._steps_done = 0
+        self._samples_done = 0
+        self._last_publish = 0.0
+
+    def on_train_begin(self, logs=None):
+        self._train_start = time.monotonic()
+        self.epochs = self.params.get('epochs') or 1
+        self.steps = self.params.get('steps') or 0
+        self.job.publish_progress(epochs=self.epochs, steps=self.steps)
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self._epoch = epoch
+
+    def on_train_batch_end(self, batch, logs=None):
+        self._steps_done += 1
+        self._samples_done += self._batch_samples(batch)
+
+        now = time.monotonic()
+        if now - self._last_publish < BATCH_PUBLISH_INTERVAL:
+            return
+        self._last_publish = now
+        self._publish(batch + 1, logs)
+
+    def on_epoch_end(self, epoch, logs=None):
+        metrics = {key: float(value) for key, value in (logs or {}).items()}
+        self.job.append_progress('history', {'epoch': epoch + 1, **metrics})
+        self._last_publish = time.monotonic()
+        self._publish(self.steps, logs)
+
+    def _batch_samples(self, batch):
+        if not self.batch_size:
+            return 0
+        if self.num_samples and self.steps and batch == self.steps - 1:
+            # El último lote de la época puede estar incompleto
+            return self.num_samples - self.batch_size * (self.steps - 1)
+        return self.batch_size
+
+    def _publish(self, step, logs):
+        elapsed = time.monotonic() - self._train_start
+        total_steps = self.steps * self.epochs
+        done_steps = self.steps * self._epoch + step if self.steps else self._steps_done
+
+        fields = {
+            'epoch': self._epoch + 1,
+            'step': step,
+            'elapsed_seconds': elapsed,
+            'samples_per_sec': self._samples_done / elapsed if elapsed > 0 and self._samples_done else None,
+            'eta_seconds': None,
+            'progress': None
+        }
+        if total_steps:
+            fields['progress'] = min(done_steps / total_steps, 1.0)
+            if done_steps:
+                fields['eta_seconds'] = elapsed / done_steps * (total_steps - done_steps)
+
+        for key, value in (logs or {}).items():
+            fields[key] = float(value)
+
+        self.job.publish_progress(**fields)
@@ -0,0 +1,416 @@
+import os
+import json
+import time
+import socket
+import uuid
+import datetime
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from auth.models import db
+from ml.common.model_storage import NumpyEncoder
+from .models import (
+    TrainingJob, JOB_QUEUED, JOB_RUNNING, JOB_SUCCEEDED, JOB_FAILED, JOB_CANCELLED
+)
+from .progress import progress_channel
+from .resources import resource_scheduler
+
+# Configurar logging para depuración
+logger = logging.getLogger(__name__)
+
+# Intervalo mínimo entre consultas a la base de datos para detectar cancelaciones
+# solicitadas desde otro proceso (segundos)
+CANCEL_POLL_INTERVAL = 2.0
+
+# Intervalo mínimo entre escrituras del progreso en la base de datos (segundos)
+PROGRESS_PERSIST_INTERVAL = 5.0
+
+def _worker_id():
+    """Identificador del proceso actual ('host:pid')"""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+def _worker_alive(worker):
+    """
+    Indica si el proceso que ejecuta un trabajo puede seguir vivo
+
+    Solo se puede comprobar para procesos de este mismo servidor; los de otros
+    servidores se consideran vivos.
+    """
+    if not worker:
+        return False
+    host, _, pid = worker.rpartition(':')
+    if host != socket.gethostname():
+        return True
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except (ValueError, PermissionError):
+        return True
+    return int(pid) != os.getpid()
+
+class JobCancelledError(Exception):
+    """Error lanzado dentro de un trabajo cuando se solicitó su cancelación"""
+
+class JobQueueFullError(Exception):
+    """Error lanzado cuando no se admiten más trabajos pendientes"""
+
+class JobContext:
+    """
+    Contexto que recibe la función de un trabajo para comprobar la cancelación
+    e informar de su progreso.
+
+    La cancelación solicitada en este proceso se detecta de inmediato; la
+    solicitada desde otro worker se lee de la base de datos como máximo cada
+    CANCEL_POLL_INTERVAL segundos. El progreso se publica en el canal en
+    memoria en cada llamada y se guarda en la base de datos (para los demás
+    workers) al cambiar de fase y como máximo cada PROGRESS_PERSIST_INTERVAL
+    segundos.
+    """
+
+    def __init__(self, manager, job_id):
+        self.manager = manager
+        self.job_id = job_id
+        self._last_poll = 0.0
+        self._last_persist = 0.0
+        self._progress = 0.0
+        self._message = None
+
+    def cancel_requested(self):
+        """Indica si se solicitó cancelar el trabajo"""
+        if self.manager._cancel_event(self.job_id).is_set():
+            return True
+
+        now = time.monotonic()
+        if now - self._last_poll >= CANCEL_POLL_INTERVAL:
+            self._last_poll = now
+            if self.manager._cancel_requested_in_db(self.job_id):
+                self.manager._cancel_event(self.job_id).set()
+                return True
+        return False
+
+    def check_cancelled(self):
+        """
+        Punto de control: lanza JobCancelledError si se solicitó la cancelación
+
+        Raises:
+            JobCancelledError: Si el trabajo fue cancelado
+        """
+        if self.cancel_requested():
+            raise JobCancelledError()
+
+    def set_phase(self, phase, message=None):
+        """
+        Informa del inicio de una fase del trabajo (carga de datos, entrenamiento...)
+
+        Args:
+            phase: Nombre de la fase (ver ml.jobs.progress)
+            message: Descripción legible de la fase
+        """
+        self.publish_progress(persist=True, phase=phase, message=message)
+
+    def publish_progress(self, persist=False, **fields):
+        """
+        Publica campos de progreso del trabajo sin esperar a los suscriptores
+
+        Args:
+            persist: Guarda el progreso en la base de datos sin esperar al intervalo
+            **fields: Campos a publicar; 'progress' (0 a 1) y 'message' también
+                se guardan en la base de datos
+        """
+        progress_channel.publish(self.job_id, **fields)
+
+        if fields.get('progress') is not None:
+            self._progress = fields['progress']
+        if fields.get('message') is not None:
+            self._message = fields['message']
+
+        now = time.monotonic()
+        if persist or now - self._last_persist >= PROGRESS_PERSIST_INTERVAL:
+            self._last_persist = now
+            self.manager._persist_progress(self.job_id, self._progress, self._message)
+
+    def append_progress(self, key, item):
+        """Añade un elemento a una lista del progreso (p. ej. métricas por época)"""
+        progress_channel.append(self.job_id, key, item)
+
+    def keras_callbacks(self, num_samples=None, batch_size=None):
+        """
+        Callbacks de Keras que aplican la cancelación y publican el progreso durante model.fit
+
+        Args:
+            num_samples: Número de muestras de entrenamiento (para muestras/segundo)
+            batch_size: Tamaño de lote del entrenamiento
+        """
+        # Importación local: solo los trabajos CNN necesitan TensorFlow
+        from .callbacks import JobCancellationCallback, TrainingProgressCallback
+        return [
+            JobCancellationCallback(self),
+            TrainingProgressCallback(self, num_samples=num_samples, batch_size=batch_size)
+        ]
+
+class JobManager:
+    """
+    Ejecuta los trabajos de entrenamiento en un grupo acotado de hilos.
+
+    El estado de cada trabajo se guarda en la tabla training_jobs, por lo que
+    cualquier worker puede consultarlo o solicitar su cancelación. Como máximo
+    se ejecutan max_workers trabajos a la vez en cada proceso y se admiten
+    max_pending trabajos pendientes (en cola o en ejecución).
+    """
+
+    def __init__(self, max_workers=1, max_pending=10):
+        self.app = None
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._executor = None
+        self._lock = threading.Lock()
+        self._pending = set()
+        self._futures = {}
+        self._hooks = {}
+        self._cancel_events = {}
+
+    def init_app(self, app):
+        """
+        Configura el gestor a partir de la configuración de la aplicación
+
+        Args:
+            app: Aplicación Flask
+        """
+        self.app = app
+        self.max_workers = app.config.get('TRAINING_MAX_CONCURRENT_JOBS', self.max_workers)
+        self.max_pending = app.config.get('TRAINING_MAX_PENDING_JOBS', self.max_pending)
+
+    def submit(self, job_type, data_type, fn, created_by=None, model_name=None, cleanup=None, resources=None,
+               on_cancel=None):
+        """
+        Crea un trabajo y lo encola para su ejecución en segundo plano
+
+        Args:
+            job_type: 'cnn' o 'tabular'
+            data_type: 'test' o 'real'
+            fn: Función que recibe un JobContext y devuelve el resultado (serializable a JSON)
+            created_by: Identidad del usuario que crea el trabajo
+            model_name: Nombre del modelo a entrenar
+            cleanup: Función sin argumentos que se ejecuta al terminar (p. ej. borrar temporales)
+            resources: Estimación validada por resource_scheduler.check; el trabajo
+                espera en cola hasta poder reservarla
+            on_cancel: Función sin argumentos que se ejecuta, antes de cleanup, si el
+                trabajo termina sin llegar a ejecutar fn (cancelado en cola o
+                mientras espera recursos)
+
+        Returns:
+            TrainingJob creado
+
+        Raises:
+            JobQueueFullError: Si se alcanzó el máximo de trabajos pendientes
+        """
+        with self._lock:
+            if len(self._pending) >= self.max_pending:
+                raise JobQueueFullError(
+                    f"Hay {len(self._pending)} entrenamientos pendientes; inténtelo más tarde"
+                )
+
+            job = TrainingJob(
+                id=uuid.uuid4().hex,
+                job_type=job_type,
+                data_type=data_type,
+                model_name=model_name,
+                status=JOB_QUEUED,
+                worker=_worker_id(),
+                memory_bytes=resources['memory_bytes'] if resources else None,
+                cpu_threads=resources['cpu_threads'] if resources else None,
+                created_by=str(created_by) if created_by is not None else None
+            )
+            db.session.add(job)
+            db.session.commit()
+
+            self._pending.add(job.id)
+            self._cancel_events[job.id] = threading.Event()
+            # Los ganchos se guardan con el futuro: si se cancela antes de empezar, _run no se ejecuta
+            self._hooks[job.id] = (cleanup, on_cancel)
+            self._futures[job.id] = self._get_executor().submit(self._run, job.id, fn, cleanup, on_cancel)
+
+        logger.info(f"Trabajo de entrenamiento {job.id} ({job_type}/{data_type}) encolado")
+        return job
+
+    def cancel(self, job_id):
+        """
+        Solicita la cancelación de un trabajo
+
+        Un trabajo en cola se cancela de inmediato; uno en ejecución se detiene
+        en el siguiente punto de control.
+
+        Args:
+            job_id: Identificador del trabajo
+
+        Returns:
+            TrainingJob actualizado o None si no existe
+        """
+        job = TrainingJob.query.get(job_id)
+        if job is None or job.finished:
+            return job
+
+        job.cancel_requested = True
+        db.session.commit()
+        self._cancel_event(job_id).set()
+
+        # Si el trabajo aún no empezó en este proceso, se descarta sin ejecutarlo
+        with self._lock:
+            future = self._futures.get(job_id)
+            cleanup, on_cancel = self._hooks.get(job_id, (None, None))
+        if future is not None and future.cancel():
+            self._finish(job_id, JOB_CANCELLED, message='Cancelado antes de iniciar')
+            self._run_hooks(job_id, cleanup, on_cancel)
+            self._forget(job_id)
+            resource_scheduler.release()
+
+        db.session.refresh(job)
+        return job
+
+    def recover_interrupted(self):
+        """
+        Marca como fallidos los trabajos que quedaron en cola o en ejecución
+        cuando se detuvo el proceso que los ejecutaba
+
+        Los trabajos de otros workers que siguen vivos no se modifican. Debe
+        llamarse al iniciar la aplicación, dentro de un contexto de aplicación.
+        """
+        unfinished = TrainingJob.query.filter(TrainingJob.status.in_((JOB_QUEUED, JOB_RUNNING))).all()
+        interrupted = [job for job in unfinished if not _worker_alive(job.worker)]
+        for job in interrupted:
+            job.status = JOB_FAILED
+            job.error = 'El entrenamiento se interrumpió al reiniciar el servicio'
+            job.finished_at = datetime.datetime.now()
+        if interrupted:
+            db.session.commit()
+            logger.warning(f"{len(interrupted)} trabajos de entrenamiento interrumpidos marcados como fallidos")
+
+    def stats(self):
+        """
+        Devuelve el estado del grupo de hilos de este proceso
+
+        Returns:
+            Diccionario con trabajos pendientes y límites
+        """
+        with self._lock:
+            return {
+                'max_workers': self.max_workers,
+                'max_pending': self.max_pending,
+                'pending': len(self._pending)
+            }
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='training-job')
+        return self._executor
+
+    def _cancel_event(self, job_id):
+        with self._lock:
+            return self._cancel_events.setdefault(job_id, threading.Event())
+
+    def _cancel_requested_in_db(self, job_id):
+        row = (
+            TrainingJob.query
+            .with_entities(TrainingJob.cancel_requested)
+            .filter_by(id=job_id)
+            .first()
+        )
+        db.session.rollback()
+        return bool(row and row.cancel_requested)
+
+    def _run(self, job_id, fn, cleanup, on_cancel):
+        with self.app.app_context():
+            started = False
+            try:
+                job = TrainingJob.query.get(job_id)
+                if job is None:
+                    return
+                if job.cancel_requested:
+                    self._finish(job_id, JOB_CANCELLED, message='Cancelado antes de iniciar')
+                    return
+
+                context = JobContext(self, job_id)
+                try:
+                    # Esperar en cola hasta que la memoria y los hilos estimados estén disponibles
+                    resource_scheduler.acquire(job_id, context)
+                    progress_channel.publish(job_id, status=JOB_RUNNING, message='Entrenamiento iniciado')
+                    logger.info(f"Trabajo de entrenamiento {job_id} iniciado")
+
+                    started = True
+                    result = fn(context)
+                    # Una cancelación que llegó durante el último tramo también se respeta
+                    context.check_cancelled()
+                except JobCancelledError:
+                    self._finish(job_id, JOB_CANCELLED, message='Cancelado por el usuario')
+                    logger.info(f"Trabajo de entrenamiento {job_id} cancelado")
+                except Exception as e:
+                    logger.exception(f"Error en el trabajo de entrenamiento {job_id}")
+                    self._finish(job_id, JOB_FAILED, error=str(e))
+                else:
+                    self._finish(job_id, JOB_SUCCEEDED, result=result, message='Entrenamiento completado')
+                    logger.info(f"Trabajo de entrenamiento {job_id} completado")
+            finally:
+                self._run_hooks(job_id, cleanup, None if started else on_cancel)
+                db.session.remove()
+                self._forget(job_id)
+                # La reserva termina con el estado 'running': avisar a los trabajos en espera
+                resource_scheduler.release()
+
+    def _run_hooks(self, job_id, cleanup, on_cancel=None):
+        # on_cancel solo se recibe si la función del trabajo no llegó a ejecutarse
+        if on_cancel is not None:
+            try:
+                on_cancel()
+            except Exception:
+                logger.exception(f"Error al procesar la cancelación del trabajo {job_id}")
+        if cleanup is not None:
+            try:
+                cleanup()
+            except Exception:
+                logger.exception(f"Error al limpiar los archivos del trabajo {job_id}")
+
+    def _persist_progress(self, job_id, progress, message):
+        try:
+            TrainingJob.query.filter_by(id=job_id).update(
+                {'progress': progress, 'message': message[:255] if message else message}
+            )
+            db.session.commit()
+        except Exception:
+            # El progreso es informativo: un fallo al guardarlo no detiene el entrenamiento
+            db.session.rollback()
+            logger.exception(f"Error al guardar el progreso del trabajo {job_id}")
+
+    def _finish(self, job_id, status, result=None, error=None, message=None):
+        db.session.rollback()
+        job = TrainingJob.query.get(job_id)
+        if job is None:
+            return
+        job.status = status
+        job.finished_at = datetime.datetime.now()
+        if status == JOB_SUCCEEDED:
+            job.progress = 1.0
+        if result is not None:
+            job.result_json = json.dumps(result, cls=NumpyEncoder)
+        if error is not None:
+            job.error = error
+        if message is not None:
+            job.message = message
+        db.session.commit()
+
+        # Se publica tras guardar, para que los suscriptores lean el estado final
+        fields = {'status': status, 'error': error, 'message': message}
+        if status == JOB_SUCCEEDED:
+            fields['progress'] = 1.0
+        progress_channel.publish(job_id, finished=True, **fields)
+
+    def _forget(self, job_id):
+        with self._lock:
+            self._pending.discard(job_id)
+            self._futures.pop(job_id, None)
+            self._hooks.pop(job_id, None)
+            self._cancel_events.pop(job_id, None)
+
+# Instancia compartida por los blueprints
+job_manager = JobManager()
@@ -0,0 +1,100 @@
+import json
+import datetime
+import logging
+
+from sqlalchemy import inspect, text
+
+from auth.models import db
+
+# Configurar logging para depuración
+logger = logging.getLogger(__name__)
+
+# Estados de un trabajo de entrenamiento
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_SUCCEEDED = 'succeeded'
+JOB_FAILED = 'failed'
+JOB_CANCELLED = 'cancelled'
+
+# Estados en los que el trabajo ya no cambia
+FINISHED_STATES = (JOB_SUCCEEDED, JOB_FAILED, JOB_CANCELLED)
+
+class TrainingJob(db.Model):
+    """Trabajo de entrenamiento ejecutado en segundo plano"""
+    __tablename__ = 'training_jobs'
+
+    id = db.Column(db.String(32), primary_key=True)
+    job_type = db.Column(db.String(20), nullable=False)
+    data_type = db.Column(db.String(20), nullable=False)
+    model_name = db.Column(db.String(255))
+    status = db.Column(db.String(20), nullable=False, default=JOB_QUEUED, index=True)
+    created_by = db.Column(db.String(50), index=True)
+    # Proceso que ejecuta el trabajo ('host:pid')
+    worker = db.Column(db.String(100))
+    # Recursos estimados y reservados mientras el trabajo está en ejecución
+    memory_bytes = db.Column(db.BigInteger)
+    cpu_threads = db.Column(db.Integer)
+    created_at = db.Column(db.DateTime, default=datetime.datetime.now, index=True)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    progress = db.Column(db.Float, default=0.0)
+    message = db.Column(db.String(255))
+    cancel_requested = db.Column(db.Boolean, default=False, nullable=False)
+    result_json = db.Column(db.Text)
+    error = db.Column(db.Text)
+
+    def __repr__(self):
+        return f'<TrainingJob {self.id} {self.status}>'
+
+    @property
+    def finished(self):
+        return self.status in FINISHED_STATES
+
+    def to_dict(self, include_result=True):
+        """Convierte el trabajo a un diccionario para la API"""
+        data = {
+            'id': self.id,
+            'job_type': self.job_type,
+            'data_type': self.data_type,
+            'model_name': self.model_name,
+            'status': self.status,
+            'created_by': self.created_by,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            'progress': self.progress,
+            'message': self.message,
+            'cancel_requested': self.cancel_requested,
+            'resources': {
+                'memory_bytes': self.memory_bytes,
+                'cpu_threads': self.cpu_threads
+            },
+            'error': self.error
+        }
+        if include_result:
+            data['result'] = json.loads(self.result_json) if self.result_json else None
+        return data
+
+def ensure_jobs_schema():
+    """
+    Agrega a la tabla de trabajos las columnas que falten
+
+    A diferencia del registro de modelos, la tabla guarda el historial de
+    entrenamientos y no se recrea: las columnas nuevas se añaden vacías.
+    """
+    table_name = TrainingJob.__tablename__
+    inspector = inspect(db.engine)
+    if not inspector.has_table(table_name):
+        TrainingJob.__table__.create(db.engine)
+        return
+
+    existing_columns = {column['name'] for column in inspector.get_columns(table_name)}
+    missing = [column for column in TrainingJob.__table__.columns if column.name not in existing_columns]
+    if not missing:
+        return
+
+    with db.engine.begin() as connection:
+        for column in missing:
+            column_type = column.type.compile(dialect=db.engine.dialect)
+            logger.info(f"Agregando la columna '{column.name}' a la tabla {table_name}")
+            connection.execute(text(f'ALTER TABLE {table_name} ADD COLUMN {column.name} {column_type}'))
@@ -0,0 +1,102 @@
+import copy
+import time
+import threading
+
+# Tiempo que se conserva el último estado de un trabajo terminado (segundos)
+FINISHED_RETENTION = 300
+
+# Fases que informa un trabajo de entrenamiento
+PHASE_LOADING = 'loading_data'
+PHASE_TRAINING = 'training'
+PHASE_EVALUATING = 'evaluating'
+PHASE_SAVING = 'saving'
+
+class ProgressChannel:
+    """
+    Canal en memoria con el progreso de los trabajos de entrenamiento del proceso.
+
+    Cada trabajo tiene un único estado, que cada publicación actualiza y
+    versiona. Publicar solo toma el candado el tiempo de combinar los campos y
+    avisar a los suscriptores, así que nunca espera a los clientes. Un
+    suscriptor lento no recibe cada actualización intermedia: al despertar lee
+    el estado más reciente (actualizaciones combinadas).
+    """
+
+    def __init__(self):
+        self._states = {}
+        self._versions = {}
+        self._finished_at = {}
+        self._condition = threading.Condition()
+
+    def publish(self, job_id, finished=False, **fields):
+        """
+        Combina los campos indicados con el estado del trabajo
+
+        Args:
+            job_id: Identificador del trabajo
+            finished: Indica que el trabajo terminó (no habrá más publicaciones)
+            **fields: Campos a actualizar (fase, época, métricas, mensaje...)
+        """
+        with self._condition:
+            state = self._states.setdefault(job_id, {'job_id': job_id})
+            state.update(fields)
+            state['updated_at'] = time.time()
+            self._versions[job_id] = self._versions.get(job_id, 0) + 1
+            if finished:
+                self._finished_at[job_id] = time.monotonic()
+            self._purge()
+            self._condition.notify_all()
+
+    def append(self, job_id, key, item):
+        """
+        Añade un elemento a una lista del estado (p. ej. las métricas de cada época)
+
+        A diferencia de los campos sueltos, los elementos añadidos no se pierden
+        al combinar actualizaciones.
+        """
+        with self._condition:
+            state = self._states.setdefault(job_id, {'job_id': job_id})
+            state.setdefault(key, []).append(item)
+
+    def snapshot(self, job_id):
+        """
+        Devuelve el estado actual de un trabajo
+
+        Returns:
+            Tupla (versión, copia del estado) o (0, None) si el trabajo no publicó nada
+        """
+        with self._condition:
+            if job_id not in self._states:
+                return 0, None
+            return self._versions[job_id], copy.deepcopy(self._states[job_id])
+
+    def wait(self, job_id, last_version, timeout):
+        """
+        Espera a que el estado de un trabajo cambie respecto a una versión
+
+        Args:
+            job_id: Identificador del trabajo
+            last_version: Última versión recibida por el suscriptor
+            timeout: Espera máxima en segundos
+
+        Returns:
+            Tupla (versión, copia del estado); el estado es None si no hubo cambios
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: self._versions.get(job_id, 0) != last_version, timeout)
+            version = self._versions.get(job_id, 0)
+            if version == last_version or job_id not in self._states:
+                return version, None
+            return version, copy.deepcopy(self._states[job_id])
+
+    def _purge(self):
+        # Llamado con el candado tomado
+        now = time.monotonic()
+        expired = [job_id for job_id, finished_at in self._finished_at.items() if now - finished_at > FINISHED_RETENTION]
+        for job_id in expired:
+            self._states.pop(job_id, None)
+            self._versions.pop(job_id, None)
+            self._finished_at.pop(job_id, None)
+
+# Instancia compartida por el gestor de trabajos y los endpoints
+progress_channel = ProgressChannel()
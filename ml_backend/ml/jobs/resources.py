@@ -0,0 +1,485 @@
+import os
+import datetime
+import threading
+import logging
+from collections import deque
+
+from sqlalchemy import func, select, or_, text
+from sqlalchemy.exc import OperationalError
+
+from auth.models import db
+from .models import TrainingJob, JOB_RUNNING
+
+# Configurar logging para depuración
+logger = logging.getLogger(__name__)
+
+_MB = 1024 * 1024
+
+# Espera máxima entre comprobaciones de recursos de un trabajo en cola (segundos).
+# Las liberaciones de este proceso despiertan a los trabajos en espera de inmediato;
+# las de otros workers se detectan al consultar la base de datos.
+ADMISSION_POLL_INTERVAL = 1.0
+
+# Modelos preentrenados: (parámetros de la base congelada, bytes de activaciones
+# por píxel de entrada en la pasada hacia delante). Son aproximaciones medidas a
+# 224x224 que se escalan con el tamaño de la imagen.
+_BACKBONE_PROFILES = {
+    'mobilenet': (2_257_984, 520),
+    'vgg16': (14_714_688, 1_200),
+    'resnet50': (23_587_712, 1_850)
+}
+
+# Algoritmos tabulares cuyo estimador paraleliza con n_jobs
+N_JOBS_ALGORITHMS = ('knn', 'random_forest')
+
+# Parámetros del optimizador Adam por peso entrenable: peso, gradiente y dos momentos
+_ADAM_COPIES = 4
+
+class ResourceRejectedError(Exception):
+    """Error lanzado cuando un entrenamiento no cabe en los recursos del servidor"""
+
+    def __init__(self, message, estimate):
+        super().__init__(message)
+        self.estimate = estimate
+
+def _custom_cnn_profile(input_shape, num_classes, filters, kernel_size, pool_size, dense_units):
+    """
+    Calcula parámetros y activaciones por muestra de la arquitectura personalizada
+
+    Reproduce las capas de create_cnn_model: hasta tres bloques Conv2D (padding
+    'valid') + MaxPooling2D, Flatten, Dense y la capa de salida.
+
+    Returns:
+        Tupla (parámetros, elementos de activación por muestra)
+    """
+    height, width, channels = (int(v) for v in input_shape)
+    kernel_h, kernel_w = (int(v) for v in kernel_size)
+    pool_h, pool_w = (int(v) for v in pool_size)
+
+    params = 0
+    activations = height * width * channels
+    for num_filters in list(filters)[:3]:
+        num_filters = int(num_filters)
+        params += kernel_h * kernel_w * channels * num_filters + num_filters
+        height, width = max(height - kernel_h + 1, 1), max(width - kernel_w + 1, 1)
+        activations += height * width * num_filters
+        height, width = max(height // pool_h, 1), max(width // pool_w, 1)
+        activations += height * width * num_filters
+        channels = num_filters
+
+    flat = height * width * channels
+    params += flat * dense_units + dense_units
+    params += dense_units * num_classes + num_classes
+    activations += flat + 2 * dense_units + num_classes
+    return params, activations
+
+def estimate_cnn_job(num_images, model_params, train_params, image_dtype_bytes=1, streaming_buffer=None):
+    """
+    Estima la memoria máxima de un entrenamiento CNN
+
+    Considera las imágenes preparadas (N x H x W x 3), sus copias al dividir en
+    entrenamiento y prueba y al convertirlas a tensores, los pesos con el estado
+    del optimizador y las activaciones de un lote durante el entrenamiento.
+
+    Args:
+        num_images: Número de imágenes del conjunto de datos
+        model_params: Parámetros de create_cnn_model
+        train_params: Parámetros de train_cnn_model (batch_size, data_augmentation)
+        image_dtype_bytes: Bytes por valor de las imágenes preparadas (uint8:
+            la normalización se hace dentro del modelo)
+        streaming_buffer: Imágenes en memoria a la vez con la entrada en
+            streaming (buffer de mezcla); None si se cargan todas
+
+    Returns:
+        Diccionario con 'memory_bytes', 'cpu_threads' (None: hilos de TensorFlow
+        configurados) y el desglose de la estimación
+    """
+    height, width = (int(v) for v in model_params['input_shape'][:2])
+    pixels = height * width * 3
+    batch_size = int(train_params.get('batch_size', 32))
+    architecture = model_params.get('architecture', 'custom')
+
+    if streaming_buffer is None:
+        # Conjunto completo, copia al dividir y copia al convertir a tensores
+        # (del mismo tipo: las imágenes llegan sin normalizar al modelo)
+        dataset_bytes = num_images * pixels * image_dtype_bytes
+        split_bytes = dataset_bytes
+        tensor_bytes = dataset_bytes
+    else:
+        # Buffer de mezcla y lotes precargados (float32 tras el aumento de datos);
+        # la caché de imágenes está en disco
+        dataset_bytes = min(streaming_buffer, num_images) * pixels * image_dtype_bytes
+        split_bytes = 0
+        tensor_bytes = 4 * batch_size * pixels * 4
+
+    if architecture in _BACKBONE_PROFILES:
+        frozen_params, bytes_per_pixel = _BACKBONE_PROFILES[architecture]
+        dense_units = int(model_params.get('dense_units', 128))
+        num_classes = int(model_params.get('num_classes', 2))
+        # La base está congelada: solo se entrenan las capas densas
+        feature_dim = 1280 if architecture == 'mobilenet' else 512 if architecture == 'vgg16' else 2048
+        trainable_params = feature_dim * dense_units + dense_units + dense_units * num_classes + num_classes
+        model_bytes = frozen_params * 4 + trainable_params * 4 * _ADAM_COPIES
+        # Sin gradientes hacia la base, basta la pasada hacia delante del lote
+        activation_bytes = batch_size * height * width * bytes_per_pixel
+    else:
+        params, activations = _custom_cnn_profile(
+            model_params['input_shape'],
+            int(model_params.get('num_classes', 2)),
+            model_params.get('filters', [32, 64, 128]),
+            model_params.get('kernel_size', (3, 3)),
+            model_params.get('pool_size', (2, 2)),
+            int(model_params.get('dense_units', 128))
+        )
+        model_bytes = params * 4 * _ADAM_COPIES
+        # Activaciones guardadas para la retropropagación y sus gradientes
+        activation_bytes = batch_size * activations * 4 * 2
+
+    # El generador de aumento de datos transforma cada lote en float32
+    if train_params.get('data_augmentation'):
+        activation_bytes += batch_size * pixels * 4 * 2
+
+    breakdown = {
+        'dataset_bytes': int(dataset_bytes + split_bytes + tensor_bytes),
+        'model_bytes': int(model_bytes),
+        'activation_bytes': int(activation_bytes)
+    }
+    return {
+        'memory_bytes': sum(breakdown.values()),
+        'cpu_threads': None,
+        'breakdown': breakdown
+    }
+
+def estimate_tabular_job(num_rows, num_features, algorithm, problem_type, model_params=None,
+                         num_classes=2, test_size=0.2):
+    """
+    Estima la memoria máxima y los hilos de un entrenamiento tabular
+
+    Args:
+        num_rows: Filas del conjunto de datos
+        num_features: Características (tras codificar)
+        algorithm: 'svm', 'knn', 'random_forest' o 'linear_regression'
+        problem_type: 'classification' o 'regression'
+        model_params: Parámetros del modelo (n_estimators, n_jobs, cache_size...)
+        num_classes: Número de clases (clasificación)
+        test_size: Proporción de filas de prueba
+
+    Returns:
+        Diccionario con 'memory_bytes', 'cpu_threads' (-1: todos los disponibles)
+        y el desglose de la estimación
+    """
+    model_params = model_params or {}
+    train_rows = int(num_rows * (1 - test_size))
+    test_rows = num_rows - train_rows
+    matrix_bytes = num_rows * num_features * 8
+
+    # DataFrame, matriz de características y copias al dividir
+    dataset_bytes = matrix_bytes * 3
+    # Sin n_jobs el estimador usa un solo hilo; los que no lo admiten, también
+    cpu_threads = 1
+    if algorithm in N_JOBS_ALGORITHMS:
+        cpu_threads = model_params.get('n_jobs') or 1
+
+    if algorithm == 'svm':
+        # Caché de kernel de libsvm y vectores de soporte (como máximo todas las filas)
+        cache_bytes = float(model_params.get('cache_size', 200)) * _MB
+        model_bytes = cache_bytes + train_rows * num_features * 8 + train_rows * 8 * max(num_classes - 1, 1)
+    elif algorithm == 'knn':
+        # Copia de los datos de entrenamiento con el índice, y distancias por bloques al evaluar
+        model_bytes = train_rows * num_features * 8 * 2 + min(test_rows * train_rows * 8, 1024 * _MB)
+    elif algorithm == 'random_forest':
+        n_estimators = int(model_params.get('n_estimators', 100))
+        min_samples_leaf = max(int(model_params.get('min_samples_leaf', 1)), 1)
+        max_depth = model_params.get('max_depth')
+        nodes = max(2 * train_rows // min_samples_leaf - 1, 1)
+        if max_depth:
+            nodes = min(nodes, 2 ** (int(max_depth) + 1) - 1)
+        outputs = num_classes if problem_type == 'classification' else 1
+        # Nodo de scikit-learn (64 bytes) más los valores de cada nodo
+        model_bytes = n_estimators * nodes * (64 + outputs * 8)
+        # Cada hilo mantiene los índices de su muestra bootstrap
+        model_bytes += abs(cpu_threads) * train_rows * 16
+    else:
+        # Matriz centrada y producto X^T X
+        model_bytes = train_rows * num_features * 8 + num_features * num_features * 8
+
+    breakdown = {
+        'dataset_bytes': int(dataset_bytes),
+        'model_bytes': int(model_bytes)
+    }
+    return {
+        'memory_bytes': sum(breakdown.values()),
+        'cpu_threads': int(cpu_threads),
+        'breakdown': breakdown
+    }
+
+def _physical_memory_bytes():
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+    except (ValueError, OSError, AttributeError):
+        return None
+
+def _available_cpus():
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+def _limit_tensorflow_threads(threads):
+    # Los grupos de hilos de TensorFlow son del proceso y solo pueden fijarse antes
+    # de ejecutar la primera operación. Las operaciones independientes se reparten
+    # en como mucho dos hilos y cada una usa el grupo intra-op
+    import tensorflow as tf
+    try:
+        tf.config.threading.set_intra_op_parallelism_threads(threads)
+        tf.config.threading.set_inter_op_parallelism_threads(min(threads, 2))
+    except RuntimeError as e:
+        logger.warning(f"No se pudo limitar los hilos de TensorFlow: {e}")
+
+class ResourceScheduler:
+    """
+    Control de admisión de entrenamientos según la memoria y los hilos del servidor.
+
+    Antes de encolar un trabajo se estima su memoria máxima y sus hilos de CPU:
+    si no caben en el presupuesto total se rechaza. Al empezar, cada trabajo
+    espera en cola hasta que su reserva cabe junto a las de los trabajos en
+    ejecución. Las reservas son las columnas memory_bytes y cpu_threads de los
+    trabajos en estado 'running', por lo que se comparten entre los workers que
+    usan la misma base de datos; la admisión es una única actualización
+    condicionada a que la reserva quepa, de modo que dos workers no pueden
+    admitir a la vez trabajos que juntos superen el presupuesto.
+    """
+
+    def __init__(self):
+        self.enabled = True
+        self.memory_budget = None
+        self.cpu_budget = _available_cpus()
+        self.cnn_threads = None
+        self.base_memory = 256 * _MB
+        self._condition = threading.Condition()
+        self._waiting = deque()
+
+    def init_app(self, app):
+        """
+        Configura los presupuestos a partir de la configuración de la aplicación
+
+        Args:
+            app: Aplicación Flask
+        """
+        self.enabled = app.config.get('TRAINING_ADMISSION_ENABLED', self.enabled)
+
+        budget_mb = app.config.get('TRAINING_MEMORY_BUDGET_MB', 0)
+        if budget_mb:
+            self.memory_budget = int(budget_mb * _MB)
+        else:
+            physical = _physical_memory_bytes()
+            fraction = app.config.get('TRAINING_MEMORY_BUDGET_FRACTION', 0.6)
+            self.memory_budget = int(physical * fraction) if physical else None
+
+        self.cpu_budget = app.config.get('TRAINING_CPU_BUDGET', 0) or _available_cpus()
+        self.base_memory = int(app.config.get('TRAINING_JOB_BASE_MEMORY_MB', 256) * _MB)
+
+        # Hilos que reserva cada trabajo CNN. Por defecto se reparte el presupuesto
+        # entre los trabajos concurrentes para que puedan ejecutarse a la vez;
+        # configure_tensorflow aplica el mismo límite a TensorFlow
+        configured_threads = app.config.get('TRAINING_CNN_CPU_THREADS', 0)
+        if configured_threads:
+            self.cnn_threads = min(configured_threads, self.cpu_budget)
+        else:
+            concurrent_jobs = max(app.config.get('TRAINING_MAX_CONCURRENT_JOBS', 1), 1)
+            self.cnn_threads = max(self.cpu_budget // concurrent_jobs, 1)
+
+    def configure_tensorflow(self):
+        """
+        Limita los hilos de TensorFlow a la reserva de un trabajo CNN
+
+        El límite es de todo el proceso, así que los trabajos CNN simultáneos y la
+        inferencia comparten esos hilos y nunca superan lo reservado. Debe llamarse
+        tras init_app y antes de ejecutar ninguna operación de TensorFlow.
+        """
+        _limit_tensorflow_threads(self.cnn_threads)
+
+    def check(self, estimate):
+        """
+        Normaliza una estimación y comprueba que cabe en el presupuesto total
+
+        Se suma la memoria fija por trabajo (sesión de TensorFlow, buffers). Los
+        trabajos CNN reservan los hilos de TensorFlow configurados; -1 reserva
+        todo el presupuesto de CPU.
+
+        Args:
+            estimate: Diccionario devuelto por estimate_cnn_job o estimate_tabular_job
+
+        Returns:
+            Nueva estimación con 'cpu_threads' resuelto y la memoria fija incluida
+
+        Raises:
+            ResourceRejectedError: Si la memoria o los hilos estimados superan el presupuesto
+        """
+        estimate = dict(estimate)
+        estimate['breakdown'] = dict(estimate.get('breakdown') or {}, base_bytes=self.base_memory)
+        estimate['memory_bytes'] = sum(estimate['breakdown'].values())
+
+        threads = estimate.get('cpu_threads')
+        if threads is None:
+            threads = self.cnn_threads
+        elif threads < 0:
+            threads = self.cpu_budget
+        threads = max(1, int(threads))
+        if self.enabled and threads > self.cpu_budget:
+            raise ResourceRejectedError(
+                f"El entrenamiento pide {threads} hilos de CPU y el servidor admite como máximo "
+                f"{self.cpu_budget}; reduzca n_jobs o use -1 para todos los disponibles",
+                dict(estimate, cpu_threads=threads)
+            )
+        estimate['cpu_threads'] = min(threads, self.cpu_budget)
+
+        if self.enabled and self.memory_budget and estimate['memory_bytes'] > self.memory_budget:
+            raise ResourceRejectedError(
+                f"El entrenamiento necesita unos {estimate['memory_bytes'] // _MB} MB y el servidor "
+                f"admite como máximo {self.memory_budget // _MB} MB por entrenamiento; reduzca el "
+                f"número de muestras, el tamaño de las imágenes o el tamaño de lote",
+                estimate
+            )
+        return estimate
+
+    def acquire(self, job_id, context):
+        """
+        Espera hasta que la reserva del trabajo cabe y lo marca como en ejecución
+
+        Los trabajos de este proceso se admiten en orden de llegada. Debe
+        llamarse dentro de un contexto de aplicación.
+
+        Args:
+            job_id: Identificador del trabajo
+            context: JobContext del trabajo (para atender cancelaciones en la espera)
+
+        Returns:
+            True si el trabajo quedó en ejecución
+
+        Raises:
+            JobCancelledError: Si se cancela mientras espera
+        """
+        with self._condition:
+            self._waiting.append(job_id)
+        announced = False
+        try:
+            while True:
+                with self._condition:
+                    if self._waiting[0] == job_id and self._try_reserve(job_id):
+                        return True
+                if not announced:
+                    announced = True
+                    context.publish_progress(persist=True, message='Esperando recursos disponibles')
+                    logger.info(f"Trabajo de entrenamiento {job_id} en espera de recursos")
+                context.check_cancelled()
+                with self._condition:
+                    self._condition.wait(ADMISSION_POLL_INTERVAL)
+        finally:
+            with self._condition:
+                self._waiting.remove(job_id)
+                self._condition.notify_all()
+
+    def release(self):
+        """Despierta a los trabajos en espera tras terminar un trabajo de este proceso"""
+        with self._condition:
+            self._condition.notify_all()
+
+    def reserved(self):
+        """
+        Recursos reservados por los trabajos en ejecución de todos los workers
+
+        Returns:
+            Tupla (bytes de memoria, hilos de CPU)
+        """
+        memory, threads = (
+            db.session.query(
+                func.coalesce(func.sum(TrainingJob.memory_bytes), 0),
+                func.coalesce(func.sum(TrainingJob.cpu_threads), 0)
+            )
+            .filter(TrainingJob.status == JOB_RUNNING)
+            .one()
+        )
+        return int(memory), int(threads)
+
+    def stats(self):
+        """
+        Devuelve los presupuestos y las reservas actuales
+
+        Returns:
+            Diccionario con presupuestos, reservas y trabajos en espera en este proceso
+        """
+        try:
+            memory, threads = self.reserved()
+        except Exception:
+            memory, threads = None, None
+        with self._condition:
+            waiting = len(self._waiting)
+        return {
+            'enabled': self.enabled,
+            'memory_budget_bytes': self.memory_budget,
+            'memory_reserved_bytes': memory,
+            'cpu_budget': self.cpu_budget,
+            'cpu_reserved': threads,
+            'cnn_cpu_threads': self.cnn_threads,
+            'waiting': waiting
+        }
+
+    def _try_reserve(self, job_id):
+        # Llamado con el candado del proceso tomado; el candado no protege frente
+        # a otros workers, así que la comprobación y la reserva son una sola sentencia
+        db.session.rollback()
+        job = TrainingJob.query.get(job_id)
+        if job is None:
+            return False
+
+        jobs = TrainingJob.__table__
+        conditions = [jobs.c.id == job_id]
+        if self.enabled:
+            # Reservas actuales como tabla derivada (MySQL no permite leer en una
+            # subconsulta la misma tabla que se actualiza)
+            running = (
+                select(
+                    func.coalesce(func.sum(jobs.c.memory_bytes), 0).label('memory'),
+                    func.coalesce(func.sum(jobs.c.cpu_threads), 0).label('threads')
+                )
+                .where(jobs.c.status == JOB_RUNNING)
+                .subquery()
+            )
+            reserved_memory = select(running.c.memory).scalar_subquery()
+            reserved_threads = select(running.c.threads).scalar_subquery()
+
+            # Sin trabajos en ejecución se admite siempre (check ya validó la estimación)
+            if self.memory_budget:
+                conditions.append(or_(
+                    reserved_memory == 0,
+                    reserved_memory + (job.memory_bytes or 0) <= self.memory_budget
+                ))
+            conditions.append(or_(
+                reserved_threads == 0,
+                reserved_threads + (job.cpu_threads or 1) <= self.cpu_budget
+            ))
+
+        try:
+            if db.engine.dialect.name == 'postgresql':
+                # En READ COMMITTED la subconsulta no ve las admisiones concurrentes
+                # sin confirmar; el bloqueo serializa las admisiones sin bloquear lecturas
+                db.session.execute(text(f"LOCK TABLE {jobs.name} IN SHARE ROW EXCLUSIVE MODE"))
+            result = db.session.execute(
+                jobs.update()
+                .where(*conditions)
+                .values(status=JOB_RUNNING, started_at=func.coalesce(jobs.c.started_at, datetime.datetime.now()))
+            )
+            db.session.commit()
+        except OperationalError as e:
+            # Base de datos bloqueada por otra admisión: se reintenta en la siguiente comprobación
+            db.session.rollback()
+            logger.debug(f"No se pudo reservar recursos para el trabajo {job_id}: {e}")
+            return False
+
+        # Descartar el estado en memoria del trabajo, actualizado fuera del ORM
+        db.session.expire_all()
+        return result.rowcount == 1
+
+# Instancia compartida por el gestor de trabajos y los endpoints
+resource_scheduler = ResourceScheduler()
@@ -0,0 +1,191 @@
+import json
+import time
+import logging
+from flask import Blueprint, request, jsonify, Response, stream_with_context
+from flask_jwt_extended import jwt_required, get_jwt_identity
+
+from auth.models import User, db
+from ml.common.model_storage import NumpyEncoder
+from .models import TrainingJob, FINISHED_STATES
+from .manager import job_manager
+from .progress import progress_channel
+
+# Crear blueprint para los trabajos de entrenamiento
+jobs_bp = Blueprint('jobs', __name__, url_prefix='/api/ml/jobs')
+
+# Configurar logging para depuración
+logger = logging.getLogger(__name__)
+
+# Espera máxima entre comprobaciones del estado en la base de datos durante un stream (segundos)
+EVENTS_POLL_INTERVAL = 2.0
+
+# Intervalo entre comentarios de keepalive cuando no hay novedades (segundos)
+EVENTS_KEEPALIVE_INTERVAL = 15.0
+
+def _get_visible_job(job_id):
+    """
+    Busca un trabajo visible para el usuario actual (su creador o un administrador)
+
+    Returns:
+        TrainingJob o None si no existe o el usuario no puede verlo
+    """
+    job = TrainingJob.query.get(job_id)
+    if job is None:
+        return None
+
+    identity = get_jwt_identity()
+    if job.created_by == str(identity):
+        return job
+
+    user = User.query.get(identity)
+    if user and user.has_role('Administrador'):
+        return job
+    return None
+
+@jobs_bp.route('', methods=['GET'])
+@jwt_required()
+def list_jobs():
+    """Endpoint para listar los trabajos de entrenamiento del usuario actual"""
+    try:
+        limit = min(int(request.args.get('limit', 50)), 200)
+        jobs = (
+            TrainingJob.query
+            .filter_by(created_by=str(get_jwt_identity()))
+            .order_by(TrainingJob.created_at.desc())
+            .limit(limit)
+            .all()
+        )
+
+        return jsonify({
+            'success': True,
+            'jobs': [job.to_dict(include_result=False) for job in jobs]
+        }), 200
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@jobs_bp.route('/<job_id>', methods=['GET'])
+@jwt_required()
+def get_job(job_id):
+    """Endpoint para consultar el estado y el resultado de un trabajo de entrenamiento"""
+    try:
+        job = _get_visible_job(job_id)
+        if job is None:
+            return jsonify({"error": f"Trabajo '{job_id}' no encontrado"}), 404
+
+        data = job.to_dict()
+
+        # Progreso detallado (época, métricas, ETA) si el trabajo se ejecuta en este proceso
+        _, data['live'] = progress_channel.snapshot(job_id)
+
+        return jsonify({
+            'success': True,
+            'job': data
+        }), 200
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+def _format_event(event, data, event_id=None):
+    """Formatea un evento de Server-Sent Events"""
+    lines = [f"event: {event}"]
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"data: {json.dumps(data, cls=NumpyEncoder)}")
+    return '\n'.join(lines) + '\n\n'
+
+@jobs_bp.route('/<job_id>/events', methods=['GET'])
+@jwt_required()
+def stream_job_events(job_id):
+    """Endpoint que transmite el progreso de un trabajo de entrenamiento con Server-Sent Events"""
+    job = _get_visible_job(job_id)
+    if job is None:
+        return jsonify({"error": f"Trabajo '{job_id}' no encontrado"}), 404
+
+    def generate():
+        last_version = 0
+        last_db_state = None
+        last_sent = time.monotonic()
+
+        while True:
+            # Estado publicado por este proceso (actualizaciones ya combinadas)
+            version, state = progress_channel.wait(job_id, last_version, EVENTS_POLL_INTERVAL)
+            last_version = version
+            if state is not None:
+                last_sent = time.monotonic()
+                yield _format_event('progress', state, version)
+                if state.get('status') in FINISHED_STATES:
+                    break
+                continue
+
+            # Sin novedades: el trabajo puede ejecutarse en otro worker o haber terminado
+            db.session.rollback()
+            current = TrainingJob.query.get(job_id)
+            if current is None or current.finished:
+                break
+
+            if version == 0:
+                db_state = {
+                    'job_id': job_id,
+                    'status': current.status,
+                    'progress': current.progress,
+                    'message': current.message
+                }
+                if db_state != last_db_state:
+                    last_db_state = db_state
+                    last_sent = time.monotonic()
+                    yield _format_event('progress', db_state)
+                    continue
+
+            if time.monotonic() - last_sent >= EVENTS_KEEPALIVE_INTERVAL:
+                last_sent = time.monotonic()
+                yield ': keepalive\n\n'
+
+        # Estado final con el resultado del entrenamiento
+        db.session.rollback()
+        final = TrainingJob.query.get(job_id)
+        if final is not None:
+            yield _format_event('done', final.to_dict())
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@jobs_bp.route('/<job_id>', methods=['DELETE'])
+@jwt_required()
+def cancel_job(job_id):
+    """Endpoint para cancelar un trabajo de entrenamiento"""
+    try:
+        job = _get_visible_job(job_id)
+        if job is None:
+            return jsonify({"error": f"Trabajo '{job_id}' no encontrado"}), 404
+
+        if job.finished:
+            return jsonify({
+                "error": f"El trabajo ya terminó con estado '{job.status}'",
+                "job": job.to_dict(include_result=False)
+            }), 409
+
+        job = job_manager.cancel(job_id)
+        logger.info(f"Cancelación solicitada para el trabajo {job_id}")
+
+        # Un trabajo en ejecución (o en cola en otro worker) se detiene en su siguiente punto de control
+        return jsonify({
+            'success': True,
+            'message': 'Trabajo cancelado' if job.finished else 'Cancelación solicitada',
+            'job': job.to_dict(include_result=False)
+        }), 200 if job.finished else 202
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
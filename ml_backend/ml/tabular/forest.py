@@ -0,0 +1,257 @@
+import os
+import struct
+import zipfile
+import logging
+
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
+
+# Configurar logging para depuración
+logger = logging.getLogger(__name__)
+
+# Extensión del archivo con el bosque compacto, junto al .pkl del modelo
+FOREST_EXTENSION = '.forest.npz'
+
+# Número máximo de elementos intermedios (filas x árboles x salidas) por bloque de predicción
+_MAX_CHUNK_ELEMENTS = 2 ** 22
+
+class CompactForest:
+    """
+    Random Forest ajustado almacenado como arreglos planos y contiguos.
+
+    Los nodos de todos los árboles se concatenan en arreglos paralelos: índice de
+    característica (int32, -1 en las hojas), umbral (float32) e hijos izquierdo y
+    derecho (int32, índices globales). En las hojas, el hijo izquierdo guarda el
+    índice de la fila de valores de la hoja. La predicción recorre todos los
+    árboles a la vez para un bloque de filas con operaciones vectorizadas.
+    """
+
+    def __init__(self, arrays):
+        self.feature = arrays['feature']
+        self.threshold = arrays['threshold']
+        self.left = arrays['left']
+        self.right = arrays['right']
+        self.values = arrays['values']
+        self.roots = np.asarray(arrays['roots'])
+        self.max_depth = int(arrays['max_depth'][0])
+        self.n_features_in_ = int(arrays['n_features'][0])
+        if 'feature_importances' in arrays:
+            self.feature_importances_ = np.asarray(arrays['feature_importances'])
+
+    @property
+    def n_estimators(self):
+        return len(self.roots)
+
+    @property
+    def node_count(self):
+        return len(self.feature)
+
+    @property
+    def nbytes(self):
+        return int(sum(a.nbytes for a in (self.feature, self.threshold, self.left, self.right, self.values, self.roots)))
+
+    def _leaf_values_mean(self, X):
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features_in_:
+            raise ValueError(
+                f"Se esperaban {self.n_features_in_} características, se recibieron "
+                f"{X.shape[1] if X.ndim == 2 else X.ndim}"
+            )
+
+        num_trees = len(self.roots)
+        num_outputs = self.values.shape[1]
+        rows_per_chunk = max(1, _MAX_CHUNK_ELEMENTS // (num_trees * num_outputs))
+
+        result = np.empty((len(X), num_outputs), dtype=np.float64)
+        for start in range(0, len(X), rows_per_chunk):
+            chunk = X[start:start + rows_per_chunk]
+            rows = np.arange(len(chunk))[:, None]
+            node = np.tile(self.roots, (len(chunk), 1))
+
+            # Avanzar un nivel por iteración en todos los árboles y filas a la vez
+            for _ in range(self.max_depth):
+                feature = self.feature[node]
+                internal = feature >= 0
+                if not internal.any():
+                    break
+                go_left = chunk[rows, np.where(internal, feature, 0)] <= self.threshold[node]
+                next_node = np.where(go_left, self.left[node], self.right[node])
+                node = np.where(internal, next_node, node)
+
+            result[start:start + len(chunk)] = self.values[self.left[node]].mean(axis=1, dtype=np.float64)
+
+        return result
+
+class CompactForestClassifier(CompactForest):
+    """Bosque compacto de clasificación con la interfaz predict/predict_proba de scikit-learn"""
+
+    def __init__(self, arrays):
+        super().__init__(arrays)
+        self.classes_ = np.asarray(arrays['classes'])
+
+    def predict_proba(self, X):
+        return self._leaf_values_mean(X)
+
+    def predict(self, X):
+        return self.classes_.take(np.argmax(self.predict_proba(X), axis=1))
+
+class CompactForestRegressor(CompactForest):
+    """Bosque compacto de regresión con la interfaz predict de scikit-learn"""
+
+    def predict(self, X):
+        return self._leaf_values_mean(X)[:, 0]
+
+def supports_compact_forest(model):
+    """
+    Indica si un modelo puede exportarse como bosque compacto
+
+    Solo se admiten Random Forest ajustados con una única salida y, en
+    clasificación, con etiquetas numéricas o de texto.
+    """
+    if not isinstance(model, (RandomForestClassifier, RandomForestRegressor)):
+        return False
+    if not hasattr(model, 'estimators_') or getattr(model, 'n_outputs_', 1) != 1:
+        return False
+    if isinstance(model, RandomForestClassifier):
+        classes = np.asarray(model.classes_)
+        if classes.dtype == object and not all(isinstance(c, str) for c in classes):
+            return False
+    return True
+
+def _float32_at_most(values):
+    """Convierte umbrales a float32 sin superar el valor original.
+
+    scikit-learn compara X en float32 con umbrales en float64; redondear hacia
+    abajo conserva exactamente las mismas decisiones en cada nodo.
+    """
+    rounded = values.astype(np.float32)
+    too_high = rounded.astype(np.float64) > values
+    rounded[too_high] = np.nextafter(rounded[too_high], np.float32(-np.inf))
+    return rounded
+
+def export_compact_forest(model, model_path):
+    """
+    Exporta los árboles de un Random Forest a un archivo .npz sin comprimir
+
+    Args:
+        model: RandomForestClassifier o RandomForestRegressor ajustado
+        model_path: Ruta base del modelo (sin extensión)
+
+    Returns:
+        Diccionario con información de la exportación
+    """
+    is_classifier = isinstance(model, RandomForestClassifier)
+
+    features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+    node_offset = 0
+    leaf_offset = 0
+    max_depth = 0
+
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        is_leaf = tree.children_left < 0
+        leaf_ids = np.cumsum(is_leaf) - 1 + leaf_offset
+
+        left = np.where(is_leaf, leaf_ids, tree.children_left + node_offset)
+        right = np.where(is_leaf, leaf_ids, tree.children_right + node_offset)
+
+        leaf_values = tree.value[is_leaf, 0, :].astype(np.float64)
+        if is_classifier:
+            # Probabilidades por hoja, como las promedia predict_proba
+            totals = leaf_values.sum(axis=1, keepdims=True)
+            leaf_values = np.divide(leaf_values, totals, out=np.zeros_like(leaf_values), where=totals > 0)
+
+        features.append(np.where(is_leaf, -1, tree.feature).astype(np.int32))
+        thresholds.append(_float32_at_most(tree.threshold))
+        lefts.append(left.astype(np.int32))
+        rights.append(right.astype(np.int32))
+        values.append(leaf_values.astype(np.float32))
+        roots.append(node_offset)
+
+        node_offset += tree.node_count
+        leaf_offset += int(is_leaf.sum())
+        max_depth = max(max_depth, tree.max_depth)
+
+    if node_offset > np.iinfo(np.int32).max:
+        raise ValueError("El bosque tiene demasiados nodos para índices int32")
+
+    arrays = {
+        'feature': np.concatenate(features),
+        'threshold': np.concatenate(thresholds),
+        'left': np.concatenate(lefts),
+        'right': np.concatenate(rights),
+        'values': np.concatenate(values),
+        'roots': np.asarray(roots, dtype=np.int32),
+        'max_depth': np.asarray([max_depth], dtype=np.int32),
+        'n_features': np.asarray([model.n_features_in_], dtype=np.int32),
+        'is_classifier': np.asarray([int(is_classifier)], dtype=np.int8),
+        'feature_importances': np.asarray(model.feature_importances_, dtype=np.float64)
+    }
+    if is_classifier:
+        classes = np.asarray(model.classes_)
+        arrays['classes'] = classes.astype(str) if classes.dtype == object else classes
+
+    forest_path = f"{model_path}{FOREST_EXTENSION}"
+    logger.info(f"Exportando bosque compacto ({len(roots)} árboles, {node_offset} nodos) en '{forest_path}'")
+
+    # Sin compresión para poder mapear cada arreglo directamente desde el archivo
+    np.savez(forest_path, **arrays)
+
+    return {
+        'trees': len(roots),
+        'nodes': int(node_offset),
+        'leaves': int(leaf_offset),
+        'max_depth': int(max_depth),
+        'size_bytes': os.path.getsize(forest_path)
+    }
+
+def _mmap_npz(path):
+    """
+    Mapea en memoria los arreglos de un .npz sin comprimir
+
+    np.load no admite mmap_mode para archivos .npz, así que se localiza el
+    inicio de los datos de cada miembro del ZIP y se crea un np.memmap.
+    """
+    arrays = {}
+    with zipfile.ZipFile(path) as zip_ref, open(path, 'rb') as f:
+        for info in zip_ref.infolist():
+            if info.compress_type != zipfile.ZIP_STORED:
+                raise ValueError(f"El miembro '{info.filename}' está comprimido y no puede mapearse")
+
+            # Cabecera local del ZIP: 30 bytes fijos más nombre y campo extra
+            f.seek(info.header_offset)
+            local_header = f.read(30)
+            name_length, extra_length = struct.unpack('<HH', local_header[26:30])
+            f.seek(info.header_offset + 30 + name_length + extra_length)
+
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+            else:
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+
+            name = info.filename[:-4] if info.filename.endswith('.npy') else info.filename
+            if int(np.prod(shape)) == 0:
+                arrays[name] = np.empty(shape, dtype=dtype)
+            else:
+                arrays[name] = np.memmap(
+                    path, dtype=dtype, mode='r', shape=shape, offset=f.tell(),
+                    order='F' if fortran_order else 'C'
+                )
+
+    return arrays
+
+def load_compact_forest(model_path):
+    """
+    Carga un bosque compacto mapeando sus arreglos en memoria
+
+    Args:
+        model_path: Ruta base del modelo (sin extensión)
+
+    Returns:
+        CompactForestClassifier o CompactForestRegressor
+    """
+    arrays = _mmap_npz(f"{model_path}{FOREST_EXTENSION}")
+    if arrays['is_classifier'][0]:
+        return CompactForestClassifier(arrays)
+    return CompactForestRegressor(arrays)
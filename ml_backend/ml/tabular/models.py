@@ -9,6 +9,9 @@ from sklearn.metrics import (
     classification_report, confusion_matrix
 )
 
+# Árboles añadidos entre puntos de control al entrenar un Random Forest por partes
+FOREST_CHECKPOINT_TREES = 10
+
 def create_svm_model(
     problem_type='classification',
     kernel='rbf',
@@ -147,7 +150,7 @@ def create_linear_model(
     else:  # classification
         return LogisticRegression(C=1/alpha if alpha > 0 else 1.0, **kwargs)
 
-def train_model(model, X_train, y_train):
+def train_model(model, X_train, y_train, checkpoint=None):
     """
     Entrena un modelo con los datos proporcionados
     
@@ -155,11 +158,36 @@ def train_model(model, X_train, y_train):
         model: Modelo a entrenar
         X_train: Datos de entrenamiento
         y_train: Etiquetas de entrenamiento
+        checkpoint: Función sin argumentos llamada entre partes del entrenamiento
+            (p. ej. para cancelarlo). Los Random Forest se entrenan por bloques de
+            FOREST_CHECKPOINT_TREES árboles con warm_start; el resto de modelos
+            solo la llaman antes de ajustar.
     
     Returns:
         Modelo entrenado
     """
-    model.fit(X_train, y_train)
+    if checkpoint is None:
+        model.fit(X_train, y_train)
+        return model
+    
+    checkpoint()
+    if not isinstance(model, (RandomForestClassifier, RandomForestRegressor)):
+        model.fit(X_train, y_train)
+        return model
+    
+    # Con warm_start cada llamada a fit añade árboles sin rehacer los anteriores;
+    # con random_state fijo el resultado es el mismo que con un único fit
+    total_trees = model.n_estimators
+    warm_start = model.warm_start
+    model.set_params(warm_start=True)
+    try:
+        for n_trees in range(min(FOREST_CHECKPOINT_TREES, total_trees), total_trees + FOREST_CHECKPOINT_TREES, FOREST_CHECKPOINT_TREES):
+            model.set_params(n_estimators=min(n_trees, total_trees))
+            model.fit(X_train, y_train)
+            if model.n_estimators < total_trees:
+                checkpoint()
+    finally:
+        model.set_params(warm_start=warm_start, n_estimators=total_trees)
     return model
 
 def evaluate_classification_model(model, X_test, y_test):
@@ -7,14 +7,23 @@ import logging
 import datetime
 import tempfile
 import math
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, request, jsonify, current_app, Response, stream_with_context
 from werkzeug.utils import secure_filename
 from flask_jwt_extended import jwt_required, get_jwt_identity
 
 from auth.models import User
 from auth.utils import testing_required, user_required, admin_required
-from ml.common.data import load_tabular_data, prepare_tabular_data, split_data
-from ml.common.model_storage import save_sklearn_model, load_sklearn_model, list_models, delete_model
+from ml.common.data import (
+    load_tabular_data, prepare_tabular_data, split_data, iter_tabular_chunks, encode_feature_frame
+)
+from ml.common.model_storage import save_sklearn_model, list_models, delete_model
+from ml.common.model_cache import model_cache
+from ml.common.name_index import model_name_index, AmbiguousModelNameError
+from ml.common.result_cache import prediction_cache, hash_array
+from ml.common.responses import parse_response_options, build_response, summarize_metadata
+from ml.jobs.manager import job_manager, JobQueueFullError
+from ml.jobs.resources import resource_scheduler, estimate_tabular_job, ResourceRejectedError, N_JOBS_ALGORITHMS
+from ml.jobs.progress import PHASE_LOADING, PHASE_TRAINING, PHASE_EVALUATING, PHASE_SAVING
 from .models import (
     create_svm_model, create_knn_model, create_random_forest_model, create_linear_model,
     train_model, evaluate_classification_model, evaluate_regression_model, predict,
@@ -28,6 +37,10 @@ logger = logging.getLogger(__name__)
 # Crear blueprint para rutas de algoritmos tabulares
 tabular_bp = Blueprint('tabular', __name__, url_prefix='/api/ml/tabular')
 
+# Campos incluidos por defecto (perfil 'compact') en las respuestas de predicción
+PREDICT_COMPACT_FIELDS = ('model_name', 'prediction', 'cached', 'model')
+TEST_PREDICT_COMPACT_FIELDS = ('model_name', 'prediction', 'features_used', 'model')
+
 # Función auxiliar para crear el modelo según el algoritmo
 def get_model_by_algorithm(algorithm, params, problem_type):
     """
@@ -59,7 +72,7 @@ def get_model_by_algorithm(algorithm, params, problem_type):
         
     elif algorithm == 'knn':
         # Parámetros válidos para k-NN
-        valid_params = ['n_neighbors', 'weights', 'algorithm']
+        valid_params = ['n_neighbors', 'weights', 'algorithm', 'n_jobs']
         for param in valid_params:
             if param in params:
                 filtered_params[param] = params[param]
@@ -69,7 +82,7 @@ def get_model_by_algorithm(algorithm, params, problem_type):
         
     elif algorithm == 'random_forest':
         # Parámetros válidos para Random Forest
-        valid_params = ['n_estimators', 'max_depth', 'min_samples_split', 'min_samples_leaf']
+        valid_params = ['n_estimators', 'max_depth', 'min_samples_split', 'min_samples_leaf', 'n_jobs']
         for param in valid_params:
             if param in params:
                 filtered_params[param] = params[param]
@@ -111,6 +124,37 @@ def clean_for_json(obj):
     else:
         return obj
 
+def _submit_training_job(data_type, model_name, created_by, run, estimate, algorithm, model_params):
+    """
+    Encola un entrenamiento tabular y construye la respuesta 202 con el trabajo creado
+
+    Args:
+        estimate: Estimación de recursos de estimate_tabular_job
+        algorithm: Algoritmo del modelo
+        model_params: Parámetros del modelo; si el estimador admite n_jobs se fija
+            a los hilos reservados
+
+    Raises:
+        ResourceRejectedError: Si el entrenamiento no cabe en los recursos del servidor
+        JobQueueFullError: Si no se admiten más trabajos pendientes
+    """
+    resources = resource_scheduler.check(estimate)
+    if algorithm in N_JOBS_ALGORITHMS:
+        model_params['n_jobs'] = resources['cpu_threads']
+
+    job = job_manager.submit(
+        'tabular', data_type, run, created_by=created_by, model_name=model_name, resources=resources
+    )
+    return jsonify({
+        'success': True,
+        'message': 'Entrenamiento encolado',
+        'job_id': job.id,
+        'status': job.status,
+        'model_name': model_name,
+        'resources': resources,
+        'status_url': f"/api/ml/jobs/{job.id}"
+    }), 202
+
 # Rutas para entrenamiento con datos de prueba (rol Testing)
 @tabular_bp.route('/train/test', methods=['POST'])
 @jwt_required()
@@ -159,64 +203,69 @@ def train_with_test_data():
         num_samples = int(data.get('num_samples', 100))
         num_features = int(data.get('num_features', 5))
         
-        logger.info(f"Generando datos de prueba: {num_samples} muestras, {num_features} características")
-        
-        # Crear datos de prueba aleatorios
-        X = np.random.rand(num_samples, num_features)
-        
-        # Etiquetas según el tipo de problema
-        if problem_type == 'classification':
-            num_classes = int(data.get('num_classes', 2))
-            y = np.random.randint(0, num_classes, size=num_samples)
-            logger.info(f"Generadas etiquetas de clasificación con {num_classes} clases")
-        else:  # regression
-            # Para regresión, crear una relación lineal simple con ruido
-            coefficients = np.random.rand(num_features)
-            y = np.dot(X, coefficients) + np.random.normal(0, 0.1, num_samples)
-            logger.info("Generadas etiquetas de regresión")
-        
-        # Dividir datos en entrenamiento y prueba
-        X_train, X_test, y_train, y_test = split_data(X, y, test_size=test_size)
-        logger.info(f"Datos divididos: {X_train.shape[0]} muestras de entrenamiento, {X_test.shape[0]} muestras de prueba")
-        
-        # Crear el modelo según el algoritmo
-        model = get_model_by_algorithm(algorithm, model_params, problem_type)
-        
-        # Entrenar el modelo
-        trained_model = train_model(model, X_train, y_train)
-        logger.info("Modelo entrenado correctamente")
-        
-        # Evaluar el modelo según el tipo de problema
-        if problem_type == 'classification':
-            evaluation = evaluate_classification_model(trained_model, X_test, y_test)
-            logger.info(f"Evaluación de clasificación: Precisión = {evaluation['accuracy']}")
-        else:
-            evaluation = evaluate_regression_model(trained_model, X_test, y_test)
-            logger.info(f"Evaluación de regresión: R² = {evaluation['r2']}")
-        
-        # Obtener importancia de características si está disponible
-        feature_importance = get_feature_importance(trained_model)
-        
-        # Guardar el modelo si se proporciona un nombre
+        num_classes = int(data.get('num_classes', 2))
         model_name = data.get('model_name', f'{algorithm}_{problem_type}_{uuid.uuid4().hex[:8]}')
+        created_by = get_jwt_identity()
         
-        # Metadatos del modelo
-        metadata = {
-            'model_name': model_name,
-            'algorithm': algorithm,
-            'problem_type': problem_type,
-            'model_params': model_params,
-            'test_size': test_size,
-            'num_samples': num_samples,
-            'num_features': num_features,
-            'evaluation': evaluation,
-            'feature_importance': feature_importance,
-            'created_by': get_jwt_identity(),
-            'data_type': 'test'
-        }
-        
-        try:
+        def run(job):
+            job.set_phase(PHASE_LOADING, 'Generando datos de prueba')
+            logger.info(f"Generando datos de prueba: {num_samples} muestras, {num_features} características")
+            
+            # Crear datos de prueba aleatorios
+            X = np.random.rand(num_samples, num_features)
+            
+            # Etiquetas según el tipo de problema
+            if problem_type == 'classification':
+                y = np.random.randint(0, num_classes, size=num_samples)
+                logger.info(f"Generadas etiquetas de clasificación con {num_classes} clases")
+            else:  # regression
+                # Para regresión, crear una relación lineal simple con ruido
+                coefficients = np.random.rand(num_features)
+                y = np.dot(X, coefficients) + np.random.normal(0, 0.1, num_samples)
+                logger.info("Generadas etiquetas de regresión")
+            
+            # Dividir datos en entrenamiento y prueba
+            X_train, X_test, y_train, y_test = split_data(X, y, test_size=test_size)
+            logger.info(f"Datos divididos: {X_train.shape[0]} muestras de entrenamiento, {X_test.shape[0]} muestras de prueba")
+            
+            # Crear el modelo según el algoritmo
+            model = get_model_by_algorithm(algorithm, model_params, problem_type)
+            
+            # Entrenar el modelo comprobando la cancelación entre bloques
+            job.set_phase(PHASE_TRAINING, 'Entrenando el modelo')
+            trained_model = train_model(model, X_train, y_train, checkpoint=job.check_cancelled)
+            job.check_cancelled()
+            logger.info("Modelo entrenado correctamente")
+            
+            # Evaluar el modelo según el tipo de problema
+            job.set_phase(PHASE_EVALUATING, 'Evaluando el modelo')
+            if problem_type == 'classification':
+                evaluation = evaluate_classification_model(trained_model, X_test, y_test)
+                logger.info(f"Evaluación de clasificación: Precisión = {evaluation['accuracy']}")
+            else:
+                evaluation = evaluate_regression_model(trained_model, X_test, y_test)
+                logger.info(f"Evaluación de regresión: R² = {evaluation['r2']}")
+            
+            # Obtener importancia de características si está disponible
+            feature_importance = get_feature_importance(trained_model)
+            
+            # Metadatos del modelo
+            metadata = {
+                'model_name': model_name,
+                'algorithm': algorithm,
+                'problem_type': problem_type,
+                'model_params': model_params,
+                'test_size': test_size,
+                'num_samples': num_samples,
+                'num_features': num_features,
+                'evaluation': evaluation,
+                'feature_importance': feature_importance,
+                'created_by': created_by,
+                'data_type': 'test'
+            }
+            
             # Guardar el modelo
+            job.set_phase(PHASE_SAVING, 'Guardando el modelo')
             model_path = save_sklearn_model(
                 trained_model, 
                 model_name, 
@@ -226,22 +275,35 @@ def train_with_test_data():
             
             logger.info(f"Modelo guardado en: {model_path}")
             
-            # Devolver resultados
-            return jsonify({
+            return {
                 'success': True,
                 'message': 'Modelo entrenado correctamente',
                 'model_name': model_name,
                 'model_path': model_path,
                 'evaluation': evaluation,
                 'feature_importance': feature_importance
-            }), 200
-        except ValueError as e:
-            logger.error(f"Error al guardar el modelo: {str(e)}")
-            return jsonify({
-                'success': False,
-                'error': str(e)
-            }), 400
+            }
+        
+        # Entrenar en segundo plano si los recursos estimados caben en el servidor
+        estimate = estimate_tabular_job(
+            num_samples, num_features, algorithm, problem_type, model_params,
+            num_classes=num_classes, test_size=test_size
+        )
+        return _submit_training_job('test', model_name, created_by, run, estimate, algorithm, model_params)
     
+    except ResourceRejectedError as e:
+        logger.warning(str(e))
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'resources': e.estimate
+        }), 413
+    except JobQueueFullError as e:
+        logger.warning(str(e))
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 503
     except Exception as e:
         logger.exception(f"Error al entrenar modelo: {str(e)}")
         return jsonify({
@@ -249,7 +311,6 @@ def train_with_test_data():
             'error': str(e)
         }), 500
 
-# Función adaptada para list_models que hace el mismo trabajo que en model_storage.py pero con más logs
 @tabular_bp.route('/models', methods=['GET'])
 @jwt_required()
 def list_tabular_models():
@@ -260,51 +321,8 @@ def list_tabular_models():
         
         logger.info(f"Listando modelos tabulares en: {model_dir}")
         
-        # Verificar si el directorio existe
-        if not os.path.exists(model_dir):
-            logger.warning(f"El directorio de modelos tabulares no existe: {model_dir}")
-            return jsonify({
-                'success': True,
-                'models': []
-            }), 200
-        
-        # Buscar archivos .pkl
-        pkl_files = []
-        for root, _, files in os.walk(model_dir):
-            for file in files:
-                if file.endswith('.pkl'):
-                    pkl_files.append(os.path.join(root, file))
-        
-        logger.info(f"Encontrados {len(pkl_files)} archivos .pkl")
-        
-        # Construir lista de modelos
-        models = []
-        for model_file in pkl_files:
-            # Obtener la ruta base sin extensión
-            model_path = model_file.rsplit('.', 1)[0]
-            
-            # Cargar metadatos
-            metadata_file = f"{model_path}.json"
-            
-            if os.path.exists(metadata_file):
-                with open(metadata_file, 'r') as f:
-                    metadata = json.load(f)
-            else:
-                metadata = {}
-                logger.warning(f"No se encontraron metadatos para: {model_file}")
-            
-            # Extraer el nombre del archivo
-            file_name = os.path.basename(model_path)
-            
-            models.append({
-                "id": file_name,
-                "path": model_path,
-                "created_at": datetime.datetime.fromtimestamp(os.path.getctime(model_file)).isoformat(),
-                "metadata": metadata
-            })
-        
-        # Ordenar por fecha de creación (más reciente primero)
-        models.sort(key=lambda x: x["created_at"], reverse=True)
+        # Consultar los modelos scikit-learn registrados
+        models = list_models(model_dir, model_type='sklearn')
         
         logger.info(f"Total de modelos tabulares listados: {len(models)}")
         
@@ -402,15 +420,26 @@ def train_with_real_data():
             return jsonify({"error": "test_size debe estar entre 0 y 1"}), 400
         
         try:
-            # Cargar el dataset
+            # Cargar el dataset; el archivo temporal ya no se necesita después
             df = load_tabular_data(temp_path)
-            
-            # Verificar que las columnas existen
-            missing_columns = [col for col in [target_column] + features if col not in df.columns]
-            if missing_columns:
-                return jsonify({"error": f"Columnas no encontradas: {', '.join(missing_columns)}"}), 400
-            
+        finally:
+            # Limpiar archivos temporales
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            if os.path.exists(temp_dir):
+                os.rmdir(temp_dir)
+        
+        # Verificar que las columnas existen
+        missing_columns = [col for col in [target_column] + features if col not in df.columns]
+        if missing_columns:
+            return jsonify({"error": f"Columnas no encontradas: {', '.join(missing_columns)}"}), 400
+        
+        model_name = request.form.get('model_name', f'{algorithm}_{problem_type}_{uuid.uuid4().hex[:8]}')
+        created_by = get_jwt_identity()
+        
+        def run(job):
             # Preparar datos
+            job.set_phase(PHASE_LOADING, 'Preparando los datos')
             X, y, used_features, encoded_columns = prepare_tabular_data(
                 df, target_column, features, categorical_columns
             )
@@ -425,15 +454,16 @@ def train_with_real_data():
                 model = create_knn_model(problem_type=problem_type, **model_params)
             elif algorithm == 'random_forest':
                 model = create_random_forest_model(problem_type=problem_type, **model_params)
-            elif algorithm == 'linear_regression':
-                model = create_linear_model(problem_type=problem_type, **model_params)
             else:
-                return jsonify({"error": f"Algoritmo no soportado: {algorithm}"}), 400
+                model = create_linear_model(problem_type=problem_type, **model_params)
             
-            # Entrenar el modelo
-            trained_model = train_model(model, X_train, y_train)
+            # Entrenar el modelo comprobando la cancelación entre bloques
+            job.set_phase(PHASE_TRAINING, 'Entrenando el modelo')
+            trained_model = train_model(model, X_train, y_train, checkpoint=job.check_cancelled)
+            job.check_cancelled()
             
             # Evaluar el modelo según el tipo de problema
+            job.set_phase(PHASE_EVALUATING, 'Evaluando el modelo')
             if problem_type == 'classification':
                 evaluation = evaluate_classification_model(trained_model, X_test, y_test)
             else:
@@ -445,9 +475,6 @@ def train_with_real_data():
             # Obtener importancia de características si está disponible
             feature_importance = get_feature_importance(trained_model, used_features)
             
-            # Guardar el modelo
-            model_name = request.form.get('model_name', f'{algorithm}_{problem_type}_{uuid.uuid4().hex[:8]}')
-            
             # Metadatos del modelo
             metadata = {
                 'model_name': model_name,
@@ -461,11 +488,12 @@ def train_with_real_data():
                 'encoded_columns': encoded_columns,
                 'evaluation': evaluation,
                 'feature_importance': feature_importance,
-                'created_by': get_jwt_identity(),
+                'created_by': created_by,
                 'data_type': 'real'
             }
             
             # Guardar el modelo
+            job.set_phase(PHASE_SAVING, 'Guardando el modelo')
             model_path = save_sklearn_model(
                 trained_model, 
                 model_name, 
@@ -473,12 +501,7 @@ def train_with_real_data():
                 metadata
             )
             
-            # Limpiar archivos temporales
-            os.remove(temp_path)
-            os.rmdir(temp_dir)
-            
-            # Devolver resultados
-            return jsonify({
+            return {
                 'success': True,
                 'message': 'Modelo entrenado correctamente',
                 'model_name': model_name,
@@ -487,21 +510,29 @@ def train_with_real_data():
                 'problem_type': problem_type,
                 'evaluation': evaluation,
                 'feature_importance': feature_importance
-            }), 200
-            
-        except Exception as e:
-            # Limpiar archivos temporales en caso de error
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
-            if os.path.exists(temp_dir):
-                os.rmdir(temp_dir)
-            
-            logging.exception(f"Error al entrenar modelo tabular con datos reales: {str(e)}")
-            return jsonify({
-                'success': False,
-                'error': str(e)
-            }), 500
+            }
+        
+        # Entrenar en segundo plano si los recursos estimados caben en el servidor
+        num_classes = int(df[target_column].nunique()) if problem_type == 'classification' else 1
+        estimate = estimate_tabular_job(
+            len(df), len(features), algorithm, problem_type, model_params,
+            num_classes=num_classes, test_size=test_size
+        )
+        return _submit_training_job('real', model_name, created_by, run, estimate, algorithm, model_params)
     
+    except ResourceRejectedError as e:
+        logger.warning(str(e))
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'resources': e.estimate
+        }), 413
+    except JobQueueFullError as e:
+        logger.warning(str(e))
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 503
     except Exception as e:
         logging.exception(f"Error general en train_with_real_data: {str(e)}")
         return jsonify({
@@ -532,17 +563,22 @@ def predict_with_real_data():
         if not features_data:
             return jsonify({"error": "No se proporcionaron características para la predicción"}), 400
         
-        # Listar modelos disponibles
-        models = list_models(current_app.config['TABULAR_MODELS_FOLDER'])
+        # Opciones de la respuesta: perfil, campos seleccionados y codificación de imágenes
+        try:
+            response_options = parse_response_options(data)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
         
-        # Buscar el modelo por nombre
-        model_info = next((m for m in models if m['id'].startswith(model_name)), None)
-        if not model_info:
+        # Resolver el nombre del modelo con el índice de nombres
+        try:
+            model_path = model_name_index.resolve(current_app.config['TABULAR_MODELS_FOLDER'], model_name)
+        except AmbiguousModelNameError as e:
+            return jsonify({"error": str(e), "matches": e.matches}), 409
+        if not model_path:
             return jsonify({"error": f"Modelo '{model_name}' no encontrado"}), 404
         
         # Cargar el modelo
-        model_path = model_info['path']
-        model, metadata = load_sklearn_model(model_path)
+        model, metadata = model_cache.get_sklearn_model(model_path)
         
         # Verificar que el modelo tiene los metadatos necesarios
         if not metadata or 'features' not in metadata:
@@ -559,51 +595,36 @@ def predict_with_real_data():
             return jsonify({"error": f"Faltan características requeridas: {', '.join(missing_features)}"}), 400
         
         # Preparar datos para la predicción
-        X_pred = []
-        feature_values = []
-        
-        for feature in model_features:
-            value = features_data.get(feature)
-            
-            # Codificar columnas categóricas si es necesario
-            if feature in categorical_columns and encoded_columns and feature in encoded_columns:
-                # Buscar el código correspondiente a la categoría
-                category_mappings = encoded_columns[feature]
-                if isinstance(category_mappings, dict):
-                    # Convertir a entero (código de categoría)
-                    found = False
-                    for code, category in category_mappings.items():
-                        if str(category) == str(value):
-                            value = int(code)
-                            found = True
-                            break
-                    
-                    if not found:
-                        return jsonify({"error": f"Valor '{value}' no reconocido para la característica categórica '{feature}'"}), 400
-            
-            # Convertir a número si es posible
-            if not isinstance(value, (int, float)) and isinstance(value, str):
-                try:
-                    value = float(value)
-                except ValueError:
-                    pass  # Mantener como string si no se puede convertir
-            
-            feature_values.append(value)
-        
-        # Crear matriz de características
-        X_pred.append(feature_values)
-        
-        # Realizar predicción
-        prediction_result = predict(model, np.array(X_pred))
-        
-        # Devolver resultados
-        return jsonify({
-            'success': True,
+        try:
+            X_pred = encode_feature_frame(
+                pd.DataFrame([features_data]), model_features, categorical_columns, encoded_columns
+            )
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        
+        # Realizar predicción, reutilizando el resultado si el mismo vector ya se predijo
+        cache_key = prediction_cache.make_key(model_path, f"{model_path}.pkl", hash_array(X_pred))
+        prediction_result = prediction_cache.get(cache_key)
+        cached = prediction_result is not None
+        if not cached:
+            prediction_result = predict(model, X_pred)
+            prediction_cache.put(cache_key, prediction_result)
+        
+        # Devolver resultados; los metadatos completos solo si se solicitan
+        payload = {
             'model_name': model_name,
             'prediction': prediction_result,
+            'cached': cached,
+            'model': summarize_metadata(metadata),
             'metadata': metadata,
             'feature_importance': metadata.get('feature_importance')
-        }), 200
+        }
+        try:
+            response = build_response(payload, response_options, PREDICT_COMPACT_FIELDS)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        
+        return jsonify(response), 200
     
     except Exception as e:
         logging.exception(f"Error en predict_with_real_data: {str(e)}")
@@ -612,6 +633,198 @@ def predict_with_real_data():
             'error': str(e)
         }), 500
     
+# Funciones auxiliares para la predicción por lotes
+def _format_ndjson_chunk(prediction_result, first_row):
+    """Convierte el resultado de un bloque en líneas NDJSON"""
+    probabilities = prediction_result.get('probabilities')
+    lines = []
+    for offset, value in enumerate(prediction_result['predictions']):
+        record = {'row': first_row + offset, 'prediction': value}
+        if probabilities is not None:
+            record['probabilities'] = probabilities[offset]
+        lines.append(json.dumps(clean_for_json(record)))
+    return '\n'.join(lines) + '\n'
+
+def _format_csv_chunk(prediction_result, first_row):
+    """Convierte el resultado de un bloque en filas CSV (sin encabezado)"""
+    probabilities = prediction_result.get('probabilities')
+    frame = pd.DataFrame({
+        'row': np.arange(first_row, first_row + len(prediction_result['predictions'])),
+        'prediction': prediction_result['predictions']
+    })
+    if probabilities is not None:
+        probabilities = np.asarray(probabilities)
+        for i in range(probabilities.shape[1]):
+            frame[f'probability_{i}'] = probabilities[:, i]
+    return frame.to_csv(index=False, header=False)
+
+def _csv_header(model):
+    """Encabezado CSV para los resultados de un modelo"""
+    columns = ['row', 'prediction']
+    if hasattr(model, 'predict_proba') and hasattr(model, 'classes_'):
+        columns += [f'probability_{i}' for i in range(len(model.classes_))]
+    return ','.join(columns) + '\n'
+
+@tabular_bp.route('/predict/batch', methods=['POST'])
+@jwt_required()
+@user_required
+def predict_batch_with_real_data():
+    """Endpoint para predecir por lotes con un modelo tabular (Usuario)"""
+    temp_dir = None
+    temp_path = None
+    
+    def cleanup():
+        # Limpiar archivos temporales
+        try:
+            if temp_path and os.path.exists(temp_path):
+                os.remove(temp_path)
+            if temp_dir and os.path.exists(temp_dir):
+                os.rmdir(temp_dir)
+        except OSError as e:
+            logger.warning(f"Error al limpiar archivos temporales: {e}")
+    
+    try:
+        chunk_size = current_app.config['TABULAR_PREDICT_CHUNK_SIZE']
+        
+        if 'file' in request.files:
+            # Modo archivo: CSV o Excel subido como formulario multipart
+            file = request.files['file']
+            
+            if file.filename == '':
+                return jsonify({"error": "No se seleccionó un archivo"}), 400
+            
+            allowed_extensions = current_app.config['ALLOWED_TABULAR_EXTENSIONS']
+            file_ext = file.filename.rsplit('.', 1)[1].lower() if '.' in file.filename else ''
+            if file_ext not in allowed_extensions:
+                return jsonify({
+                    "error": f"Formato de archivo no soportado. Formatos permitidos: {', '.join(allowed_extensions)}"
+                }), 400
+            
+            params = request.form
+            temp_dir = tempfile.mkdtemp()
+            temp_path = os.path.join(temp_dir, secure_filename(file.filename))
+            file.save(temp_path)
+        else:
+            # Modo JSON columnar: {"columns": {"característica": [valores]}}
+            params = request.get_json(silent=True)
+            if not params:
+                return jsonify({"error": "No se proporcionaron datos"}), 400
+            
+            columns = params.get('columns')
+            if not isinstance(columns, dict) or not columns:
+                return jsonify({"error": "Se debe proporcionar 'columns' con listas de valores por característica"}), 400
+            
+            lengths = {len(values) for values in columns.values() if isinstance(values, list)}
+            if len(lengths) != 1 or len(columns) != sum(isinstance(v, list) for v in columns.values()):
+                return jsonify({"error": "Todas las columnas deben ser listas con la misma longitud"}), 400
+        
+        # Obtener el modelo a utilizar
+        model_name = params.get('model_name')
+        if not model_name:
+            cleanup()
+            return jsonify({"error": "No se proporcionó un nombre de modelo"}), 400
+        
+        output_format = params.get('format', 'ndjson')
+        if output_format not in ['ndjson', 'csv']:
+            cleanup()
+            return jsonify({"error": "Formato de salida no válido. Opciones: ndjson, csv"}), 400
+        
+        try:
+            chunk_size = int(params.get('chunk_size', chunk_size))
+        except (TypeError, ValueError):
+            cleanup()
+            return jsonify({"error": "chunk_size debe ser un número entero"}), 400
+        if chunk_size <= 0:
+            cleanup()
+            return jsonify({"error": "chunk_size debe ser mayor que 0"}), 400
+        
+        # Acotar el tamaño de bloque para limitar la memoria de cada bloque
+        chunk_size = min(chunk_size, current_app.config['TABULAR_PREDICT_MAX_CHUNK_SIZE'])
+        
+        # Resolver el nombre del modelo con el índice de nombres
+        try:
+            model_path = model_name_index.resolve(current_app.config['TABULAR_MODELS_FOLDER'], model_name)
+        except AmbiguousModelNameError as e:
+            cleanup()
+            return jsonify({"error": str(e), "matches": e.matches}), 409
+        if not model_path:
+            cleanup()
+            return jsonify({"error": f"Modelo '{model_name}' no encontrado"}), 404
+        
+        # Cargar el modelo
+        model, metadata = model_cache.get_sklearn_model(model_path)
+        
+        if not metadata or 'features' not in metadata:
+            cleanup()
+            return jsonify({"error": "Modelo incompleto, falta información de características"}), 400
+        
+        model_features = metadata.get('features', [])
+        categorical_columns = metadata.get('categorical_columns', [])
+        encoded_columns = metadata.get('encoded_columns', {})
+        
+        # Fuente de bloques de datos
+        if temp_path:
+            chunks = iter_tabular_chunks(temp_path, chunk_size)
+        else:
+            frame = pd.DataFrame(params['columns'])
+            chunks = (frame.iloc[start:start + chunk_size] for start in range(0, len(frame), chunk_size))
+        
+        # Codificar y predecir el primer bloque antes de empezar a responder,
+        # para poder devolver errores de validación con el código HTTP adecuado
+        try:
+            first_chunk = next(chunks, None)
+            first_X = None
+            if first_chunk is not None:
+                first_X = encode_feature_frame(first_chunk, model_features, categorical_columns, encoded_columns)
+        except ValueError as e:
+            cleanup()
+            return jsonify({"error": str(e)}), 400
+        
+        format_chunk = _format_ndjson_chunk if output_format == 'ndjson' else _format_csv_chunk
+        
+        def generate():
+            try:
+                if output_format == 'csv':
+                    yield _csv_header(model)
+                
+                if first_X is None:
+                    return
+                
+                row = 0
+                X = first_X
+                while True:
+                    # Realizar predicción sobre el bloque completo
+                    yield format_chunk(predict(model, X), row)
+                    row += len(X)
+                    
+                    chunk = next(chunks, None)
+                    if chunk is None:
+                        break
+                    X = encode_feature_frame(chunk, model_features, categorical_columns, encoded_columns)
+                
+                logger.info(f"Predicción por lotes completada: {row} filas con el modelo '{model_name}'")
+            except Exception as e:
+                # La respuesta ya comenzó: informar el error dentro del flujo
+                logger.exception(f"Error durante la predicción por lotes: {str(e)}")
+                if output_format == 'ndjson':
+                    yield json.dumps({'error': str(e)}) + '\n'
+            finally:
+                cleanup()
+        
+        mimetype = 'application/x-ndjson' if output_format == 'ndjson' else 'text/csv'
+        response = Response(stream_with_context(generate()), mimetype=mimetype)
+        if output_format == 'csv':
+            response.headers['Content-Disposition'] = 'attachment; filename=predicciones.csv'
+        return response
+    
+    except Exception as e:
+        cleanup()
+        logging.exception(f"Error en predict_batch_with_real_data: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
 @tabular_bp.route('/preview', methods=['POST'])
 @jwt_required()
 @user_required
@@ -706,17 +919,17 @@ def preview_tabular_data():
 def delete_tabular_model(model_name):
     """Endpoint para eliminar un modelo tabular específico (solo administradores)"""
     try:
-        # Listar modelos disponibles
-        models = list_models(current_app.config['TABULAR_MODELS_FOLDER'])
-        
-        # Buscar el modelo por nombre
-        model_info = next((m for m in models if m['id'].startswith(model_name)), None)
-        if not model_info:
+        # Resolver el nombre del modelo con el índice de nombres
+        try:
+            model_path = model_name_index.resolve(current_app.config['TABULAR_MODELS_FOLDER'], model_name)
+        except AmbiguousModelNameError as e:
+            return jsonify({"error": str(e), "matches": e.matches}), 409
+        if not model_path:
             return jsonify({"error": f"Modelo '{model_name}' no encontrado"}), 404
         
         # Eliminar el modelo
-        model_path = model_info['path']
         result = delete_model(model_path)
+        model_cache.invalidate(model_path)
         
         if result:
             return jsonify({
@@ -754,17 +967,22 @@ def predict_with_test_data():
         if not model_name:
             return jsonify({"error": "No se proporcionó un nombre de modelo"}), 400
         
-        # Listar modelos disponibles
-        models = list_models(current_app.config['TABULAR_MODELS_FOLDER'])
+        # Opciones de la respuesta: perfil, campos seleccionados y codificación de imágenes
+        try:
+            response_options = parse_response_options(data)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
         
-        # Buscar el modelo por nombre
-        model_info = next((m for m in models if m['id'].startswith(model_name)), None)
-        if not model_info:
+        # Resolver el nombre del modelo con el índice de nombres
+        try:
+            model_path = model_name_index.resolve(current_app.config['TABULAR_MODELS_FOLDER'], model_name)
+        except AmbiguousModelNameError as e:
+            return jsonify({"error": str(e), "matches": e.matches}), 409
+        if not model_path:
             return jsonify({"error": f"Modelo '{model_name}' no encontrado"}), 404
         
         # Cargar el modelo
-        model_path = model_info['path']
-        model, metadata = load_sklearn_model(model_path)
+        model, metadata = model_cache.get_sklearn_model(model_path)
         
         # Generar datos de prueba aleatorios
         problem_type = metadata.get('problem_type', 'classification')
@@ -804,17 +1022,24 @@ def predict_with_test_data():
         feature_importance = metadata.get('feature_importance')
         
         # Devolver resultados
-        return jsonify({
-            'success': True,
+        payload = {
             'model_name': model_name,
             'prediction': prediction_result,
             'features_used': features_dict,
+            'model': summarize_metadata(metadata),
+            'feature_importance': feature_importance,
             'metadata': {
                 'algorithm': metadata.get('algorithm'),
                 'problem_type': problem_type,
                 'feature_importance': feature_importance
             }
-        }), 200
+        }
+        try:
+            response = build_response(payload, response_options, TEST_PREDICT_COMPACT_FIELDS)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        
+        return jsonify(response), 200
     
     except Exception as e:
         logging.exception(f"Error en predict_with_test_data: {str(e)}")
@@ -0,0 +1 @@
+# Este archivo permite que el directorio tests sea reconocido como un paquete de Python
\ No newline at end of file
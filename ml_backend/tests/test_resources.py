@@ -0,0 +1,97 @@
+import threading
+
+import pytest
+from flask import Flask
+
+from auth.models import db
+from ml.jobs.models import TrainingJob, JOB_QUEUED, JOB_RUNNING
+from ml.jobs.resources import ResourceScheduler
+
+_MB = 1024 * 1024
+
+@pytest.fixture
+def app(tmp_path):
+    """Aplicación mínima con la tabla de trabajos en una base SQLite en archivo"""
+    app = Flask(__name__)
+    app.config.update(
+        SQLALCHEMY_DATABASE_URI=f"sqlite:///{tmp_path / 'jobs.db'}",
+        SQLALCHEMY_TRACK_MODIFICATIONS=False,
+        TRAINING_MEMORY_BUDGET_MB=1000,
+        TRAINING_CPU_BUDGET=8,
+        TRAINING_JOB_BASE_MEMORY_MB=0
+    )
+    db.init_app(app)
+    with app.app_context():
+        TrainingJob.__table__.create(db.engine)
+    yield app
+    with app.app_context():
+        db.engine.dispose()
+
+def _create_jobs(app, memory_mb, count=2):
+    with app.app_context():
+        job_ids = []
+        for index in range(count):
+            job = TrainingJob(
+                id=f'job{index}', job_type='cnn', data_type='test', status=JOB_QUEUED,
+                memory_bytes=memory_mb * _MB, cpu_threads=1
+            )
+            db.session.add(job)
+            job_ids.append(job.id)
+        db.session.commit()
+        return job_ids
+
+def _reset_jobs(app):
+    with app.app_context():
+        TrainingJob.query.update({'status': JOB_QUEUED, 'started_at': None})
+        db.session.commit()
+
+def _running_jobs(app):
+    with app.app_context():
+        return TrainingJob.query.filter_by(status=JOB_RUNNING).count()
+
+def _reserve_concurrently(app, job_ids):
+    """Reserva cada trabajo desde un planificador distinto, como si fueran workers separados"""
+    schedulers = []
+    for _ in job_ids:
+        scheduler = ResourceScheduler()
+        scheduler.init_app(app)
+        schedulers.append(scheduler)
+
+    barrier = threading.Barrier(len(job_ids))
+    results = [None] * len(job_ids)
+
+    def reserve(position):
+        with app.app_context():
+            barrier.wait()
+            results[position] = schedulers[position]._try_reserve(job_ids[position])
+
+    threads = [threading.Thread(target=reserve, args=(position,)) for position in range(len(job_ids))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+def test_concurrent_reservations_do_not_exceed_memory_budget(app):
+    # Cada trabajo cabe solo, pero los dos juntos superan el presupuesto de 1000 MB
+    job_ids = _create_jobs(app, memory_mb=600)
+
+    for _ in range(20):
+        results = _reserve_concurrently(app, job_ids)
+        assert results.count(True) == 1
+        assert _running_jobs(app) == results.count(True)
+        _reset_jobs(app)
+
+def test_concurrent_reservations_admit_jobs_that_fit_together(app):
+    job_ids = _create_jobs(app, memory_mb=400)
+
+    results = _reserve_concurrently(app, job_ids)
+
+    # Con SQLite una admisión puede encontrar la base bloqueada y reintentar después
+    for position, reserved in enumerate(results):
+        if not reserved:
+            scheduler = ResourceScheduler()
+            scheduler.init_app(app)
+            with app.app_context():
+                assert scheduler._try_reserve(job_ids[position])
+    assert _running_jobs(app) == 2